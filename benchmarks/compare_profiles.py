@@ -0,0 +1,234 @@
+"""
+Compare the memory and startup cost of the intents profiles of bot.py.
+
+Synthetic guilds are fed to a discord.py `ConnectionState` configured like the bot under each
+profile, the way the gateway would deliver them: the GUILD_CREATE payload, then, when the profile
+chunks guilds at startup, every member in GUILD_MEMBERS_CHUNK payloads of 1000. Presences are only
+sent when the presences intent is enabled. The report gives the data received at startup, the
+time spent decoding and building the cache, and the memory the cache keeps.
+
+Network latency isn't simulated, so the startup time is a lower bound: a real chunked startup
+also waits for a round trip per chunk request.
+
+Usage:
+    python benchmarks/compare_profiles.py --guilds 20 --members 20000
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import discord
+from discord.state import ConnectionState
+
+from utils.intents import PROFILES, build_profile
+
+COGS_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), "..", "cogs"))
+BOT_ID = 1_000_000_000_000_000_000
+CHUNK_SIZE = 1000
+
+
+def user_payload(user_id: int, rng: random.Random) -> dict:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id % 1_000_000}",
+        "global_name": f"User {rng.randrange(1_000_000)}",
+        "discriminator": "0",
+        "avatar": f"{rng.getrandbits(128):032x}",
+        "public_flags": 0,
+    }
+
+
+def member_payload(user_id: int, roles: list, rng: random.Random) -> dict:
+    return {
+        "user": user_payload(user_id, rng),
+        "roles": rng.sample(roles, k=min(len(roles), rng.randrange(4))),
+        "joined_at": "2024-01-01T00:00:00.000000+00:00",
+        "nick": None,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def presence_payload(user_id: int, guild_id: int, rng: random.Random) -> dict:
+    return {
+        "user": {"id": str(user_id)},
+        "guild_id": str(guild_id),
+        "status": rng.choice(("online", "idle", "dnd")),
+        "client_status": {"desktop": "online"},
+        "activities": [{"name": "Some Game", "type": 0, "created_at": 1700000000000}],
+    }
+
+
+def guild_payloads(
+    guild_id: int, members: int, online: float, intents: discord.Intents, chunk: bool, seed: int
+) -> list:
+    """
+    Build the gateway payloads of a guild, as JSON strings.
+
+    :return: A list of (event, JSON payload) pairs.
+    """
+    rng = random.Random(seed)
+    roles = [str(guild_id + index) for index in range(1, 31)]
+    member_ids = [BOT_ID] + [guild_id * 100_000 + index for index in range(1, members)]
+    online_ids = [user_id for user_id in member_ids if rng.random() < online]
+    guild = {
+        "id": str(guild_id),
+        "name": f"Guild {guild_id}",
+        "owner_id": str(member_ids[-1]),
+        "member_count": members,
+        "large": True,
+        "roles": [
+            {"id": str(guild_id), "name": "@everyone", "permissions": "1071698660929", "position": 0}
+        ]
+        + [
+            {"id": role_id, "name": f"role {index}", "permissions": "0", "position": index}
+            for index, role_id in enumerate(roles, start=1)
+        ],
+        "channels": [
+            {"id": str(guild_id + 100 + index), "type": 0, "name": f"channel-{index}", "position": index}
+            for index in range(50)
+        ],
+        "members": [member_payload(BOT_ID, [], rng)],
+        "presences": [],
+    }
+    if intents.presences:
+        # Large guilds only come with their online members
+        guild["members"] += [member_payload(user_id, roles, rng) for user_id in online_ids[1:]]
+        guild["presences"] = [presence_payload(user_id, guild_id, rng) for user_id in online_ids]
+    payloads = [("GUILD_CREATE", json.dumps(guild))]
+    if chunk:
+        for start in range(0, len(member_ids), CHUNK_SIZE):
+            chunk_ids = member_ids[start : start + CHUNK_SIZE]
+            data = {
+                "guild_id": str(guild_id),
+                "members": [member_payload(user_id, roles, rng) for user_id in chunk_ids],
+            }
+            if intents.presences:
+                online_set = set(online_ids)
+                data["presences"] = [
+                    presence_payload(user_id, guild_id, rng)
+                    for user_id in chunk_ids
+                    if user_id in online_set
+                ]
+            payloads.append(("GUILD_MEMBERS_CHUNK", json.dumps(data)))
+    return payloads
+
+
+def make_state(intents: discord.Intents, member_cache: discord.MemberCacheFlags, chunk: bool):
+    state = ConnectionState(
+        dispatch=lambda *args, **kwargs: None,
+        handlers={},
+        hooks={},
+        http=None,
+        intents=intents,
+        member_cache_flags=member_cache,
+        chunk_guilds_at_startup=chunk,
+    )
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID, random.Random(0)))
+    return state
+
+
+def load(state: ConnectionState, payloads: list) -> list:
+    """
+    Decode the payloads and build the cache the way discord.py does on startup.
+
+    :return: The guilds, which hold the cache.
+    """
+    guilds = []
+    guild = None
+    for event, raw in payloads:
+        data = json.loads(raw)
+        if event == "GUILD_CREATE":
+            guild = discord.Guild(data=data, state=state)
+            guilds.append(guild)
+            continue
+        members = [discord.Member(data=member, guild=guild, state=state) for member in data["members"]]
+        # Chunked members are cached even when only the bot's own member would be otherwise
+        for member in members:
+            guild._add_member(member)
+        for presence in data.get("presences", []):
+            member = guild.get_member(int(presence["user"]["id"]))
+            if member is not None:
+                raw_presence = discord.RawPresenceUpdateEvent(data=presence, state=state)
+                member._presence_update(raw_presence, ())
+    return guilds
+
+
+def run_profile(profile: str, arguments: argparse.Namespace) -> dict:
+    intents, member_cache, chunk = build_profile(profile, COGS_PATH)
+    payloads = []
+    for index in range(arguments.guilds):
+        payloads += guild_payloads(
+            (index + 1) * 10_000_000,
+            arguments.members,
+            arguments.online,
+            intents,
+            chunk,
+            arguments.seed + index,
+        )
+
+    # Time without tracing, then measure the retained memory with tracing
+    state = make_state(intents, member_cache, chunk)
+    gc.collect()
+    started = time.perf_counter()
+    guilds = load(state, payloads)
+    elapsed = time.perf_counter() - started
+    cached_members = sum(len(guild._members) for guild in guilds)
+    del guilds, state
+    gc.collect()
+
+    state = make_state(intents, member_cache, chunk)
+    tracemalloc.start()
+    guilds = load(state, payloads)
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del guilds, state
+
+    return {
+        "profile": profile,
+        "intents": intents.value,
+        "member_cache": member_cache.value,
+        "chunk": chunk,
+        "payloads": len(payloads),
+        "received_mb": sum(len(raw) for _, raw in payloads) / 1024 / 1024,
+        "startup_s": elapsed,
+        "cached_members": cached_members,
+        "memory_mb": memory / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--members", type=int, default=20_000, help="Members per guild.")
+    parser.add_argument("--online", type=float, default=0.2, help="Fraction of members online.")
+    parser.add_argument("--seed", type=int, default=1)
+    arguments = parser.parse_args()
+
+    print(
+        f"{arguments.guilds} guilds x {arguments.members} members, {arguments.online:.0%} online\n"
+    )
+    print(
+        f"{'profile':<9} {'chunked':>7} {'payloads':>8} {'received':>10} {'startup':>9} {'members':>9} {'memory':>10}"
+    )
+    for profile in PROFILES:
+        result = run_profile(profile, arguments)
+        print(
+            f"{result['profile']:<9} {str(result['chunk']):>7} {result['payloads']:>8} "
+            f"{result['received_mb']:>8.1f}MB {result['startup_s']:>8.2f}s "
+            f"{result['cached_members']:>9} {result['memory_mb']:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
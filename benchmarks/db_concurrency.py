@@ -0,0 +1,170 @@
+"""
+Benchmark concurrent warn reads and writes with the old single connection and the tuned pool.
+
+Both setups run the same workload on a prefilled database: writer tasks keep adding and removing
+warns while reader tasks list warnings, as `warning list` does. The single-connection setup is the
+database manager the bot started from: the default rollback journal, every query through one
+aiosqlite thread, a commit per write and no cache. The pooled setup is the current
+`DatabaseManager.open` (WAL, tuned pragmas, one writer plus read-only connections, group commit
+and the warnings cache).
+
+Usage:
+    python benchmarks/db_concurrency.py --rows 200000 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import aiosqlite
+
+from database import DatabaseManager, run_migrations
+
+GUILDS = 20
+USERS = 50_000
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def prepare(path: str, rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    async with aiosqlite.connect(path) as connection:
+        await run_migrations(connection)
+        next_id = {}
+        batch = []
+        for _ in range(rows):
+            key = (rng.randrange(USERS), rng.randrange(GUILDS))
+            next_id[key] = next_id.get(key, 0) + 1
+            batch.append((next_id[key], key[0], key[1], 1, "Benchmark warn"))
+        await connection.executemany(
+            "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+        await connection.commit()
+        # Leave the file in the default rollback journal mode for the baseline
+        await connection.execute("PRAGMA journal_mode = DELETE")
+
+
+class SingleConnection:
+    """
+    The queries of the original database manager, on one connection and committing every write.
+    """
+
+    def __init__(self, connection: aiosqlite.Connection) -> None:
+        self.connection = connection
+
+    async def add_warn(self, user_id: int, server_id: int, moderator_id: int, reason: str) -> tuple:
+        async with self.connection.execute(
+            "SELECT id FROM warns WHERE user_id=? AND server_id=? ORDER BY id DESC LIMIT 1",
+            (user_id, server_id),
+        ) as cursor:
+            result = await cursor.fetchone()
+        warn_id = result[0] + 1 if result is not None else 1
+        await self.connection.execute(
+            "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+            (warn_id, user_id, server_id, moderator_id, reason),
+        )
+        await self.connection.commit()
+        return warn_id, None
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
+        await self.connection.execute(
+            "DELETE FROM warns WHERE id=? AND user_id=? AND server_id=?",
+            (warn_id, user_id, server_id),
+        )
+        await self.connection.commit()
+        async with self.connection.execute(
+            "SELECT COUNT(*) FROM warns WHERE user_id=? AND server_id=?", (user_id, server_id)
+        ) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def get_warnings(self, user_id: int, server_id: int) -> list:
+        async with self.connection.execute(
+            "SELECT user_id, server_id, moderator_id, reason, strftime('%s', created_at), id FROM warns WHERE user_id=? AND server_id=?",
+            (user_id, server_id),
+        ) as cursor:
+            return list(await cursor.fetchall())
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+async def workload(manager, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    read_latencies = []
+    write_latencies = []
+    deadline = time.perf_counter() + args.duration
+
+    async def reader() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await manager.get_warnings(rng.randrange(USERS), rng.randrange(GUILDS))
+            read_latencies.append(time.perf_counter() - start)
+
+    async def writer() -> None:
+        while time.perf_counter() < deadline:
+            user_id, server_id = rng.randrange(USERS), rng.randrange(GUILDS)
+            start = time.perf_counter()
+            warn_id, _ = await manager.add_warn(user_id, server_id, 1, "Benchmark")
+            await manager.remove_warn(warn_id, user_id, server_id)
+            write_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[reader() for _ in range(args.readers)],
+        *[writer() for _ in range(args.writers)],
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "reads/s": len(read_latencies) / elapsed,
+        "writes/s": len(write_latencies) / elapsed,
+        "read mean": sum(read_latencies) / max(1, len(read_latencies)) * 1000,
+        "read p50": percentile(read_latencies, 50) * 1000,
+        "read p99": percentile(read_latencies, 99) * 1000,
+        "write p50": percentile(write_latencies, 50) * 1000,
+        "write p99": percentile(write_latencies, 99) * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        await prepare(path, args.rows, args.seed)
+
+        single = SingleConnection(await aiosqlite.connect(path))
+        baseline = await workload(single, args)
+        await single.close()
+
+        pooled = await DatabaseManager.open(path, readers=args.pool_readers)
+        tuned = await workload(pooled, args)
+        await pooled.close()
+
+    print(
+        f"{args.rows:,} warns, {args.readers} reader tasks, {args.writers} writer tasks, {args.duration}s each"
+    )
+    print(f"{'metric':<12}{'single conn':>14}{'WAL + pool':>14}")
+    for name in baseline:
+        unit = "" if name.endswith("/s") else "ms"
+        print(f"{name:<12}{baseline[name]:>12.2f}{unit:<2}{tuned[name]:>12.2f}{unit:<2}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=16, help="Concurrent reader tasks.")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent writer tasks.")
+    parser.add_argument("--pool-readers", type=int, default=3, help="Read-only connections in the pool.")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
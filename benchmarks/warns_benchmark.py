@@ -0,0 +1,114 @@
+"""
+Benchmark warn operations on a large `warns` table, before and after the schema migrations.
+
+A temporary database is filled with the legacy (version 1) schema, the `DatabaseManager` warn
+operations are timed, then the remaining migrations are applied and the same operations are timed again.
+
+Usage:
+    python benchmarks/warns_benchmark.py --rows 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import aiosqlite
+
+from database import DatabaseManager, run_migrations
+
+GUILDS = 50
+
+
+async def fill(connection: aiosqlite.Connection, rows: int, users: int, seed: int) -> list:
+    """
+    Insert `rows` warns spread over `users` users and `GUILDS` guilds.
+
+    :return: A sample of (user_id, server_id) pairs that have warns.
+    """
+    rng = random.Random(seed)
+    next_id = {}
+    sample = []
+    batch = []
+    for _ in range(rows):
+        user_id = 100_000_000_000_000_000 + rng.randrange(users)
+        server_id = 900_000_000_000_000_000 + rng.randrange(GUILDS)
+        warn_id = next_id.get((user_id, server_id), 0) + 1
+        next_id[(user_id, server_id)] = warn_id
+        batch.append((warn_id, user_id, server_id, 1, "Benchmark warn"))
+        if len(sample) < 1000:
+            sample.append((user_id, server_id))
+        if len(batch) >= 50_000:
+            await connection.executemany(
+                "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        await connection.executemany(
+            "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+    await connection.commit()
+    return sample
+
+
+async def time_operations(manager: DatabaseManager, sample: list, operations: int) -> dict:
+    """
+    Time add/list/remove of warns for users picked from the sample.
+
+    :return: Mean latency in milliseconds per operation name.
+    """
+    timings = {"add_warn": [], "get_warnings": [], "remove_warn": []}
+    for user_id, server_id in sample[:operations]:
+        start = time.perf_counter()
+        warn_id, _ = await manager.add_warn(user_id, server_id, 1, "Benchmark")
+        timings["add_warn"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await manager.get_warnings(user_id, server_id)
+        timings["get_warnings"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await manager.remove_warn(warn_id, user_id, server_id)
+        timings["remove_warn"].append(time.perf_counter() - start)
+    return {name: statistics.mean(values) * 1000 for name, values in timings.items()}
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        async with aiosqlite.connect(path) as connection:
+            await run_migrations(connection, target=1)
+            start = time.perf_counter()
+            sample = await fill(connection, args.rows, args.users, args.seed)
+            print(f"Inserted {args.rows:,} warns in {time.perf_counter() - start:.1f}s")
+
+            manager = DatabaseManager(connection=connection)
+            before = await time_operations(manager, sample, args.operations)
+
+            start = time.perf_counter()
+            version = await run_migrations(connection)
+            print(f"Migrated to version {version} in {time.perf_counter() - start:.1f}s")
+            after = await time_operations(manager, sample, args.operations)
+
+    print()
+    print(f"{'operation':<14}{'version 1':>12}{'latest':>12}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<14}{before[name]:>10.3f}ms{after[name]:>10.3f}ms{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
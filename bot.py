@@ -1,18 +1,34 @@
 
+import argparse
+import asyncio
+import collections
 import json
 import logging
+import multiprocessing
 import os
 import platform
 import random
 import sys
+import time
 
+# The start of the startup timing report, most of the import time is discord.py's
+IMPORTS_STARTED = time.perf_counter()
+
+import aiohttp
 import aiosqlite
 import discord
 from discord.ext import commands, tasks
 from discord.ext.commands import Context
 from dotenv import load_dotenv
 
-from database import DatabaseManager
+from database import DatabaseManager, run_migrations
+from utils.escalation import EscalationEngine
+from utils.http import HTTPClient
+from utils.intents import PROFILES, build_profile
+from utils.logs import setup_logging
+from utils.metrics import REGISTRY, MetricsServer
+from utils.pipeline import CHEAP_FILTERS, COMMANDS, MessageContext, MessagePipeline
+from utils.watchdog import LoopWatchdog
 
 if not os.path.isfile(f"{os.path.realpath(os.path.dirname(__file__))}/config.json"):
     sys.exit("'config.json' not found! Please add it and try again.")
@@ -53,73 +69,68 @@ intents.message_content = True
 intents.presences = True
 """
 
-intents = discord.Intents.all()
 """
-Uncomment this if you want to use prefix (normal) commands.
-It is recommended to use slash commands and therefore not use prefix commands.
+The intents are chosen by the runtime profile, `intents_profile` in the config or `--profile`:
+- `full` enables every intent, caches every member and chunks every guild at startup.
+- `minimal` enables only the intents the cogs declare in their `REQUIRED_INTENTS`, caches no
+  members besides the bot's own and doesn't chunk guilds, members are fetched when needed.
+  Use it for large deployments, presences and member lists are most of the memory of big guilds.
 
-If you want to use prefix commands, make sure to also enable the intent below in the Discord developer portal.
+Either way, `message_content` and `members` must be enabled in the Discord developer portal.
 """
-# intents.message_content = True
-
-# Setup both of the loggers
-
-
-class LoggingFormatter(logging.Formatter):
-    # Colors
-    black = "\x1b[30m"
-    red = "\x1b[31m"
-    green = "\x1b[32m"
-    yellow = "\x1b[33m"
-    blue = "\x1b[34m"
-    gray = "\x1b[38m"
-    # Styles
-    reset = "\x1b[0m"
-    bold = "\x1b[1m"
-
-    COLORS = {
-        logging.DEBUG: gray + bold,
-        logging.INFO: blue + bold,
-        logging.WARNING: yellow + bold,
-        logging.ERROR: red,
-        logging.CRITICAL: red + bold,
-    }
-
-    def format(self, record):
-        log_color = self.COLORS[record.levelno]
-        format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
-        format = format.replace("(black)", self.black + self.bold)
-        format = format.replace("(reset)", self.reset)
-        format = format.replace("(levelcolor)", log_color)
-        format = format.replace("(green)", self.green + self.bold)
-        formatter = logging.Formatter(format, "%Y-%m-%d %H:%M:%S", style="{")
-        return formatter.format(record)
-
-
-logger = logging.getLogger("discord_bot")
-logger.setLevel(logging.INFO)
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(LoggingFormatter())
-# File handler
-file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
-file_handler_formatter = logging.Formatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
+COGS_PATH = f"{os.path.realpath(os.path.dirname(__file__))}/cogs"
+DATABASE_PATH = f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
+
+# Setup the logging, records are written by a background thread, one rotating file per cluster process
+cluster_env = os.getenv("BOT_CLUSTER_ID")
+log_listener = setup_logging(
+    "discord.log" if cluster_env is None else f"discord.cluster{cluster_env}.log",
+    level=logging.getLevelName(config.get("log_level", "INFO").upper()),
+    max_bytes=config.get("log_max_bytes", 10 * 1024 * 1024),
+    backup_count=config.get("log_backups", 5),
+    sampling=config.get("log_sampling"),
 )
-file_handler.setFormatter(file_handler_formatter)
+logger = logging.getLogger("discord_bot")
 
-# Add the handlers
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+COMMAND_SECONDS = REGISTRY.histogram(
+    "bot_command_seconds", "Execution time of the successful commands.", ("command",)
+)
+COMMANDS_TOTAL = REGISTRY.counter(
+    "bot_commands_total", "Commands executed, by outcome.", ("command", "outcome")
+)
+GATEWAY_EVENTS = REGISTRY.counter(
+    "bot_gateway_events_total", "Gateway events received.", ("event",)
+)
 
 
-class DiscordBot(commands.Bot):
-    def __init__(self) -> None:
+class DiscordBot(commands.AutoShardedBot):
+    def __init__(
+        self,
+        *,
+        cluster_id: int = 0,
+        cluster_count: int = 1,
+        shard_ids: list = None,
+        shard_count: int = None,
+        profile: str = "full",
+    ) -> None:
+        """
+        :param cluster_id: The ID of the process in a clustered deployment. Default is 0.
+        :param cluster_count: The number of processes of the deployment. Default is 1.
+        :param shard_ids: The shards this process runs. Default is None, which runs every shard.
+        :param shard_count: The total number of shards. Default is None, which uses the count recommended by Discord.
+        :param profile: The intents profile, `full` or `minimal`. Default is "full".
+        """
+        intents, member_cache_flags, chunk_guilds = build_profile(profile, COGS_PATH)
         super().__init__(
             command_prefix=commands.when_mentioned_or(config["prefix"]),
             intents=intents,
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=chunk_guilds,
             help_command=None,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            # Needed for `on_socket_event_type`, which feeds the event rates of the health reports
+            enable_debug_events=True,
         )
         """
         This creates custom bot variables so that we can access these variables in cogs more easily.
@@ -132,32 +143,103 @@ class DiscordBot(commands.Bot):
         self.logger = logger
         self.config = config
         self.database = None
+        self.escalation = None
+        self.profile = profile
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.started_at = int(time.time())
+        self.event_counts = collections.Counter()
+        self.last_health_report = time.monotonic()
+        self.pipeline = MessagePipeline(self.logger)
+        self.pipeline.add_stage("filters", self.filter_message, order=CHEAP_FILTERS)
+        self.pipeline.add_stage("commands", self.command_stage, order=COMMANDS)
+        self.http_client = HTTPClient(
+            limit_per_host=self.config.get("http_limit_per_host", 10)
+        )
+        self.metrics = REGISTRY
+        self.metrics_server = None
+        self.watchdog = None
+        self.startup_timings = {}
+        self.extension_timings = {}
+        self.last_startup_phase = IMPORTS_STARTED
+        # Imported at the top of this file, then the bot is created
+        self.startup_phase("imports")
+        self.metrics.gauge("bot_guilds", "Guilds of the cluster.").set_function(
+            lambda: len(self.guilds)
+        )
+        self.metrics.gauge(
+            "bot_latency_seconds", "Average heartbeat latency of the shards of the cluster."
+        ).set_function(lambda: self.latency)
+        self.before_invoke(self.start_command_timer)
 
     async def init_db(self) -> None:
-        async with aiosqlite.connect(
-            f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
-        ) as db:
-            with open(
-                f"{os.path.realpath(os.path.dirname(__file__))}/database/schema.sql"
-            ) as file:
-                await db.executescript(file.read())
-            await db.commit()
+        """
+        Open the database and bring its schema up to date through the writer connection, before the cogs use it.
+        """
+        self.database = await DatabaseManager.open(
+            DATABASE_PATH,
+            readers=self.config.get("database_readers", 3),
+        )
+        version = await self.database.migrate()
+        self.logger.info("Database schema is at version %s", version)
 
     async def load_cogs(self) -> None:
         """
         The code in this function is executed whenever the bot will start.
+
+        The extensions don't depend on each other, so they are loaded concurrently: while one waits
+        on the database or a file in its `cog_load`, the next one is imported.
+        """
+        extensions = sorted(file[:-3] for file in os.listdir(COGS_PATH) if file.endswith(".py"))
+        await asyncio.gather(*(self.load_cog(extension) for extension in extensions))
+
+    async def load_cog(self, extension: str) -> None:
+        started = time.perf_counter()
+        try:
+            await self.load_extension(f"cogs.{extension}")
+        except Exception as e:
+            exception = f"{type(e).__name__}: {e}"
+            self.logger.error(
+                "Failed to load extension %s\n%s", extension, exception
+            )
+            return
+        # Wall time, which overlaps with the other extensions loading meanwhile
+        self.extension_timings[extension] = time.perf_counter() - started
+        self.logger.info(
+            "Loaded extension '%s' in %.0fms", extension, self.extension_timings[extension] * 1000
+        )
+
+    def startup_phase(self, phase: str) -> None:
         """
-        for file in os.listdir(f"{os.path.realpath(os.path.dirname(__file__))}/cogs"):
-            if file.endswith(".py"):
-                extension = file[:-3]
-                try:
-                    await self.load_extension(f"cogs.{extension}")
-                    self.logger.info(f"Loaded extension '{extension}'")
-                except Exception as e:
-                    exception = f"{type(e).__name__}: {e}"
-                    self.logger.error(
-                        f"Failed to load extension {extension}\n{exception}"
-                    )
+        End a phase of the startup, which lasted since the end of the previous one.
+
+        :param phase: The name of the phase.
+        """
+        now = time.perf_counter()
+        self.startup_timings[phase] = now - self.last_startup_phase
+        self.last_startup_phase = now
+
+    def log_startup_timings(self) -> None:
+        total = sum(self.startup_timings.values())
+        self.logger.info(
+            "Started in %.2fs: %s",
+            total,
+            " | ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items()),
+        )
+        self.logger.info(
+            "Extensions: %s",
+            ", ".join(
+                f"{extension} {seconds * 1000:.0f}ms"
+                for extension, seconds in sorted(
+                    self.extension_timings.items(), key=lambda item: item[1], reverse=True
+                )
+            ),
+        )
+        phases = self.metrics.gauge(
+            "bot_startup_seconds", "Duration of each phase of the startup.", ("phase",)
+        )
+        for phase, seconds in self.startup_timings.items():
+            phases.labels(phase).set(seconds)
 
     @tasks.loop(minutes=1.0)
     async def status_task(self) -> None:
@@ -174,35 +256,193 @@ class DiscordBot(commands.Bot):
         """
         await self.wait_until_ready()
 
+    @tasks.loop(seconds=30.0)
+    async def health_task(self) -> None:
+        """
+        Report the health of this cluster to the database, where every cluster can read it.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self.last_health_report, 1e-6)
+        counts, self.event_counts = self.event_counts, collections.Counter()
+        self.last_health_report = now
+        events_per_second = sum(counts.values()) / elapsed
+        top_events = {
+            event: round(count / elapsed, 2) for event, count in counts.most_common(5)
+        }
+        latency = self.latency if self.latency == self.latency else None  # NaN before the first heartbeat
+        try:
+            await self.database.report_cluster_health(
+                self.cluster_id,
+                sorted(self.shards),
+                len(self.guilds),
+                latency,
+                events_per_second,
+                top_events,
+                self.started_at,
+            )
+        except Exception as e:
+            self.logger.error("Failed to report the cluster health: %s", e)
+        self.logger.debug(
+            "Cluster %s: %s guilds, %.1f events/s",
+            self.cluster_id,
+            len(self.guilds),
+            events_per_second,
+        )
+
+    @health_task.before_loop
+    async def before_health_task(self) -> None:
+        await self.wait_until_ready()
+        self.event_counts.clear()
+        self.last_health_report = time.monotonic()
+
+    async def on_socket_event_type(self, event_type: str) -> None:
+        """
+        The code in this event is executed for every gateway event received, it only counts them.
+
+        :param event_type: The type of the event.
+        """
+        self.event_counts[event_type] += 1
+        GATEWAY_EVENTS.labels(event_type).inc()
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        self.logger.info("Cluster %s: shard %s is ready", self.cluster_id, shard_id)
+
     async def setup_hook(self) -> None:
         """
         This will just be executed when the bot starts the first time.
         """
-        self.logger.info(f"Logged in as {self.user.name}")
-        self.logger.info(f"discord.py API version: {discord.__version__}")
-        self.logger.info(f"Python version: {platform.python_version()}")
+        self.startup_phase("login")
+        self.logger.info("Logged in as %s", self.user.name)
+        self.logger.info("discord.py API version: %s", discord.__version__)
+        self.logger.info("Python version: %s", platform.python_version())
+        self.logger.info(
+            "Running on: %s %s (%s)", platform.system(), platform.release(), os.name
+        )
         self.logger.info(
-            f"Running on: {platform.system()} {platform.release()} ({os.name})"
+            "Intents profile: %s (intents %s, member cache %s)",
+            self.profile,
+            self.intents.value,
+            self.member_cache_flags.value,
+        )
+        self.logger.info(
+            "Cluster %s/%s running shards %s",
+            self.cluster_id + 1,
+            self.cluster_count,
+            self.shard_ids if self.shard_ids is not None else "all",
         )
         self.logger.info("-------------------")
+        threshold = self.config.get("watchdog_threshold", 0.5)
+        if threshold is not None:
+            self.watchdog = LoopWatchdog(self.logger, threshold=threshold)
+            self.watchdog.start(slow_callback_duration=self.config.get("slow_callback_duration"))
+        # Cogs load their state from the database, so it is opened first
         await self.init_db()
+        self.startup_phase("database")
+        self.metrics.gauge(
+            "bot_db_pending_writes", "Writes queued for the next database commit."
+        ).set_function(lambda: self.database.pending_writes)
+        warnings_cache = self.database.warnings_cache
+        self.metrics.gauge(
+            "bot_warnings_cache_entries", "Users whose warnings are cached."
+        ).set_function(lambda: len(warnings_cache))
+        lookups = self.metrics.gauge(
+            "bot_warnings_cache_lookups", "Lookups of the warnings cache since start, by result.", ("result",)
+        )
+        lookups.labels("hit").set_function(lambda: warnings_cache.hits)
+        lookups.labels("miss").set_function(lambda: warnings_cache.misses)
+        self.escalation = EscalationEngine(self.database)
         await self.load_cogs()
+        self.startup_phase("extensions")
         self.status_task.start()
-        self.database = DatabaseManager(
-            connection=await aiosqlite.connect(
-                f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
-            )
+        self.health_task.start()
+        await self.start_metrics_server()
+        self.startup_phase("services")
+
+    async def on_ready(self) -> None:
+        """
+        The code in this event is executed when every shard is ready, again after a reconnection.
+        """
+        if "gateway" not in self.startup_timings:
+            # Connecting, identifying every shard and receiving the guilds
+            self.startup_phase("gateway")
+            self.log_startup_timings()
+
+    async def start_metrics_server(self) -> None:
+        """
+        Serve the metrics in the Prometheus format, on `metrics_port` plus the cluster ID so the clusters of a host don't collide.
+        """
+        port = self.config.get("metrics_port", 9108)
+        if port is None:
+            return
+        self.metrics_server = MetricsServer(
+            self.metrics,
+            host=self.config.get("metrics_host", "127.0.0.1"),
+            port=port + self.cluster_id,
+        )
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            self.logger.warning("Could not serve the metrics on port %s: %s", port + self.cluster_id, e)
+            self.metrics_server = None
+            return
+        self.logger.info(
+            "Serving the metrics on http://%s:%s/metrics",
+            self.metrics_server.host,
+            self.metrics_server.port,
         )
 
+    async def close(self) -> None:
+        """
+        This will be executed when the bot shuts down, after which pending database writes are committed.
+        """
+        await super().close()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        await self.http_client.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        if self.database is not None:
+            await self.database.close()
+
     async def on_message(self, message: discord.Message) -> None:
         """
         The code in this event is executed every time someone sends a message, with or without the prefix
 
+        Messages go through the message pipeline, where the cogs register their stages.
+
         :param message: The message that was sent.
         """
-        if message.author == self.user or message.author.bot:
-            return
-        await self.process_commands(message)
+        await self.pipeline.process(message)
+
+    async def filter_message(self, context: MessageContext) -> None:
+        """
+        The first stage of the message pipeline, dropping the messages no stage should see.
+
+        :param context: The context of the message.
+        """
+        if context.message.author.bot or context.author_id == self.user.id:
+            context.stop("bot")
+        elif not context.content and not context.message.attachments:
+            context.stop("empty")
+
+    async def command_stage(self, context: MessageContext) -> None:
+        """
+        The stage of the message pipeline running the prefix commands, after the link scan.
+
+        :param context: The context of the message.
+        """
+        command_context = await self.get_context(context.message)
+        if command_context.command is not None:
+            await self.invoke(command_context)
+            context.stop("command")
+
+    async def start_command_timer(self, context: Context) -> None:
+        """
+        The global before invoke hook, it notes when the command started for its metrics.
+
+        :param context: The context of the command about to be executed.
+        """
+        context.started = time.perf_counter()
 
     async def on_command_completion(self, context: Context) -> None:
         """
@@ -211,15 +451,27 @@ class DiscordBot(commands.Bot):
         :param context: The context of the command that has been executed.
         """
         full_command_name = context.command.qualified_name
+        COMMANDS_TOTAL.labels(full_command_name, "success").inc()
+        started = getattr(context, "started", None)
+        if started is not None:
+            COMMAND_SECONDS.labels(full_command_name).observe(time.perf_counter() - started)
         split = full_command_name.split(" ")
         executed_command = str(split[0])
         if context.guild is not None:
             self.logger.info(
-                f"Executed {executed_command} command in {context.guild.name} (ID: {context.guild.id}) by {context.author} (ID: {context.author.id})"
+                "Executed %s command in %s (ID: %s) by %s (ID: %s)",
+                executed_command,
+                context.guild.name,
+                context.guild.id,
+                context.author,
+                context.author.id,
             )
         else:
             self.logger.info(
-                f"Executed {executed_command} command by {context.author} (ID: {context.author.id}) in DMs"
+                "Executed %s command by %s (ID: %s) in DMs",
+                executed_command,
+                context.author,
+                context.author.id,
             )
 
     async def on_command_error(self, context: Context, error) -> None:
@@ -229,6 +481,9 @@ class DiscordBot(commands.Bot):
         :param context: The context of the normal command that failed executing.
         :param error: The error that has been faced.
         """
+        COMMANDS_TOTAL.labels(
+            context.command.qualified_name if context.command is not None else "unknown", "error"
+        ).inc()
         if isinstance(error, commands.CommandOnCooldown):
             minutes, seconds = divmod(error.retry_after, 60)
             hours, minutes = divmod(minutes, 60)
@@ -245,11 +500,17 @@ class DiscordBot(commands.Bot):
             await context.send(embed=embed)
             if context.guild:
                 self.logger.warning(
-                    f"{context.author} (ID: {context.author.id}) tried to execute an owner only command in the guild {context.guild.name} (ID: {context.guild.id}), but the user is not an owner of the bot."
+                    "%s (ID: %s) tried to execute an owner only command in the guild %s (ID: %s), but the user is not an owner of the bot.",
+                    context.author,
+                    context.author.id,
+                    context.guild.name,
+                    context.guild.id,
                 )
             else:
                 self.logger.warning(
-                    f"{context.author} (ID: {context.author.id}) tried to execute an owner only command in the bot's DMs, but the user is not an owner of the bot."
+                    "%s (ID: %s) tried to execute an owner only command in the bot's DMs, but the user is not an owner of the bot.",
+                    context.author,
+                    context.author.id,
                 )
         elif isinstance(error, commands.MissingPermissions):
             embed = discord.Embed(
@@ -279,7 +540,166 @@ class DiscordBot(commands.Bot):
             raise error
 
 
-load_dotenv()
+def shard_ranges(shard_count: int, clusters: int) -> list:
+    """
+    This function will split the shards into contiguous ranges, one per cluster.
+
+    :param shard_count: The total number of shards.
+    :param clusters: The number of clusters.
+    :return: A list of lists of shard IDs.
+    """
+    size, extra = divmod(shard_count, clusters)
+    ranges = []
+    start = 0
+    for cluster_id in range(clusters):
+        end = start + size + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def fetch_recommended_shards(token: str) -> int:
+    """
+    This function will ask Discord how many shards the bot should run.
+
+    :param token: The token of the bot.
+    :return: The recommended number of shards.
+    """
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"]
+
+
+async def migrate() -> None:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        version = await run_migrations(db)
+    logger.info("Database schema is at version %s", version)
+
+
+def run_cluster(
+    cluster_id: int, cluster_count: int, shard_ids: list, shard_count: int, profile: str
+) -> None:
+    """
+    This function will run one cluster of the bot, it is the entry point of the cluster processes.
+    """
+    load_dotenv()
+    bot = DiscordBot(
+        cluster_id=cluster_id,
+        cluster_count=cluster_count,
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        profile=profile,
+    )
+    try:
+        # The logging is already set up, discord.py would otherwise add a synchronous handler to the root logger
+        bot.run(os.getenv("TOKEN"), log_handler=None)
+    finally:
+        # Cluster processes exit without running the `atexit` hooks, flush the pending records here
+        log_listener.stop()
+
+
+def launch_clusters(arguments: argparse.Namespace) -> None:
+    """
+    This function will start one process per cluster, each running a range of shards, and restart the ones that crash.
+
+    Clusters are started one after the other, waiting `identify_delay` seconds per shard in between,
+    since Discord only lets a bot identify one shard every 5 seconds.
+    """
+    token = os.getenv("TOKEN")
+    shard_count = arguments.shards or asyncio.run(fetch_recommended_shards(token))
+    clusters = max(1, min(arguments.clusters, shard_count))
+    ranges = shard_ranges(shard_count, clusters)
+    # Migrate once, before the clusters race each other for it
+    asyncio.run(migrate())
+
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+
+    def start(cluster_id: int) -> None:
+        # The cluster ID is read at import time to pick the log file of the process
+        os.environ["BOT_CLUSTER_ID"] = str(cluster_id)
+        process = context.Process(
+            target=run_cluster,
+            args=(cluster_id, clusters, ranges[cluster_id], shard_count, arguments.profile),
+            name=f"cluster-{cluster_id}",
+        )
+        process.start()
+        processes[cluster_id] = process
+        logger.info(
+            "Started cluster %s (PID %s) with shards %s",
+            cluster_id,
+            process.pid,
+            ranges[cluster_id],
+        )
 
-bot = DiscordBot()
-bot.run(os.getenv("TOKEN"))
+    try:
+        for cluster_id in range(clusters):
+            start(cluster_id)
+            if cluster_id < clusters - 1:
+                time.sleep(arguments.identify_delay * len(ranges[cluster_id]))
+        while processes:
+            time.sleep(1)
+            for cluster_id, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[cluster_id]
+                if process.exitcode == 0:
+                    # Stopped on purpose, e.g. with the shutdown command
+                    logger.info("Cluster %s stopped", cluster_id)
+                    continue
+                logger.error(
+                    "Cluster %s exited with code %s, restarting it",
+                    cluster_id,
+                    process.exitcode,
+                )
+                time.sleep(arguments.identify_delay * len(ranges[cluster_id]))
+                start(cluster_id)
+    except KeyboardInterrupt:
+        logger.info("Stopping the clusters")
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the bot, optionally as several processes.")
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=config.get("clusters", 1),
+        help="The number of processes to run, each owning a range of shards.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=config.get("shards"),
+        help="The total number of shards. Defaults to the number recommended by Discord.",
+    )
+    parser.add_argument(
+        "--identify-delay",
+        type=float,
+        default=5.0,
+        help="Seconds waited per shard before starting the next cluster.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILES,
+        default=config.get("intents_profile", "full"),
+        help="The intents profile: every intent and member, or only what the cogs need.",
+    )
+    arguments = parser.parse_args()
+    load_dotenv()
+    if arguments.clusters <= 1:
+        run_cluster(0, 1, None, arguments.shards, arguments.profile)
+    else:
+        launch_clusters(arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,42 +4,77 @@ import discord
 import json
 import os
 import asyncio
-from openai import OpenAI
+import time
 from discord.ext.commands import Context
 from dotenv import load_dotenv
 
+from utils.metrics import REGISTRY, SLOW_BUCKETS
+from utils.pipeline import LLM, MessageContext
+
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url="https://api.deepseek.com"
-)
+# OpenAI client, built on first use: importing openai takes longer than the rest of the bot's startup
+client = None
+
+
+def get_client():
+    """Return the OpenAI client, importing openai and building it the first time"""
+    global client
+    if client is None:
+        from openai import OpenAI
+
+        client = OpenAI(
+            api_key=os.getenv('DEEPSEEK_API_KEY'),
+            base_url=os.getenv('DEEPSEEK_BASE_URL', "https://api.deepseek.com")
+        )
+    return client
 
 # Cost configuration (update with your rates)
 DEEPSEEK_INPUT_COST = 0.01  # $ per 1k tokens
 DEEPSEEK_OUTPUT_COST = 0.02  # $ per 1k tokens
 
+# Rolling summary configuration
+SUMMARY_THRESHOLD = 16  # History entries before older turns get folded
+SUMMARY_KEEP_RECENT = 6  # Most recent turns that are always sent verbatim
+HISTORY_HARD_LIMIT = 40  # Safety cap if summarization keeps failing
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
 # Persistent storage files
 DATA_FILE = "active_channels.json"
 HISTORY_FILE = "message_history.json"
 COST_FILE = "cost_tracking.json"
 
+LLM_SECONDS = REGISTRY.histogram(
+    "bot_llm_request_seconds", "Duration of the chat completion requests.", ("kind",), SLOW_BUCKETS
+)
+LLM_ERRORS = REGISTRY.counter("bot_llm_errors_total", "Failed chat completion requests.", ("kind",))
+LLM_TOKENS = REGISTRY.counter(
+    "bot_llm_tokens_total", "Tokens used by the chat completions.", ("kind", "type")
+)
+LLM_COST = REGISTRY.counter("bot_llm_cost_dollars_total", "Cost of the chat completions.", ("kind",))
+
+REQUIRED_INTENTS = ("guild_messages", "message_content")
+
 class ChatCog(commands.Cog, name="chat"):
     def __init__(self, bot):
         self.bot = bot
         self.active_channels = {}
+        # The IDs of the active channels of every guild, as ints, for the message pipeline
+        self.active_channel_ids = set()
         self.message_history = {}
         self.thread_costs = {}
+        self.thread_token_savings = {}
         self.total_costs = {
             "decisions": 0.0,
-            "responses": 0.0
+            "responses": 0.0,
+            "summaries": 0.0
         }
 
-        # Load persistent data
-        self.load_data()
-        
+        # Threads with a summarization in flight and the tasks running them
+        self._summarizing = set()
+        self._summary_tasks = set()
+
         # Start auto-save task
         self.save_task = self.bot.loop.create_task(self.auto_save())
 
@@ -49,29 +84,114 @@ class ChatCog(commands.Cog, name="chat"):
             if os.path.exists(DATA_FILE):
                 with open(DATA_FILE, "r") as f:
                     self.active_channels = json.load(f).get("guilds", {})
+                self.index_active_channels()
             
-            if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, "r") as f:
+            if os.path.exists(self._cluster_file(HISTORY_FILE)):
+                with open(self._cluster_file(HISTORY_FILE), "r") as f:
                     self.message_history = json.load(f)
             
-            if os.path.exists(COST_FILE):
-                with open(COST_FILE, "r") as f:
+            if os.path.exists(self._cluster_file(COST_FILE)):
+                with open(self._cluster_file(COST_FILE), "r") as f:
                     cost_data = json.load(f)
-                    self.thread_costs = cost_data.get("thread_costs", {})
-                    self.total_costs = cost_data.get("total_costs", self.total_costs)
+                    self.thread_token_savings = cost_data.get("thread_token_savings", {})
                     
         except Exception as e:
-            self.bot.logger.error(f"Error loading data: {e}")
+            self.bot.logger.error("Error loading data: %s", e)
+
+    def index_active_channels(self):
+        """Rebuild the int index of the active channels from `active_channels`"""
+        self.active_channel_ids = {
+            int(channel_id)
+            for guild in self.active_channels.values()
+            for channel_id in guild.get("channels", [])
+        }
+
+    def _cluster_file(self, path):
+        """Per-cluster file name, so processes of a sharded deployment don't overwrite each other's threads"""
+        if getattr(self.bot, "cluster_count", 1) <= 1:
+            return path
+        name, extension = os.path.splitext(path)
+        return f"{name}.cluster{self.bot.cluster_id}{extension}"
+
+    async def cog_load(self):
+        """Load the persistent data, and the costs, which are shared by every cluster through the database"""
+        # Read off the event loop, the other extensions keep loading meanwhile
+        await asyncio.to_thread(self.load_data)
+        try:
+            await self._import_json_costs()
+            await self.refresh_costs()
+        except Exception as e:
+            self.bot.logger.error("Error loading costs: %s", e)
+        self.bot.pipeline.add_stage("chat", self.process_message, order=LLM)
+
+    async def _import_json_costs(self):
+        """Move the costs of the former JSON storage into the database, once"""
+        if not os.path.exists(COST_FILE):
+            return
+        with open(COST_FILE, "r") as f:
+            cost_data = json.load(f)
+        if "total_costs" not in cost_data:
+            return
+        # Only the first process to rewrite the file imports it
+        try:
+            os.rename(COST_FILE, f"{COST_FILE}.importing")
+        except FileNotFoundError:
+            return
+        # The old thread costs mixed responses and summaries, only the totals of each kind are kept
+        costs = [(kind, "", cost) for kind, cost in cost_data["total_costs"].items()]
+        await self.bot.database.add_chat_costs(costs)
+        with open(self._cluster_file(COST_FILE), "w") as f:
+            json.dump({"thread_token_savings": cost_data.get("thread_token_savings", {})}, f, indent=4)
+        os.remove(f"{COST_FILE}.importing")
+        self.bot.logger.info("Imported chat cost totals from %s", COST_FILE)
+
+    async def refresh_costs(self):
+        """Reload the costs, including the ones added by the other clusters"""
+        totals, threads = await self.bot.database.get_chat_costs()
+        self.total_costs.update(totals)
+        self.thread_costs.update(threads)
+
+    def _create_completion(self, kind, messages):
+        """Request a chat completion, recording its duration and tokens in the metrics"""
+        started = time.perf_counter()
+        try:
+            response = get_client().chat.completions.create(
+                model="deepseek-chat",
+                messages=messages,
+                stream=False
+            )
+        except Exception:
+            LLM_ERRORS.labels(kind).inc()
+            raise
+        finally:
+            LLM_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        LLM_TOKENS.labels(kind, "prompt").inc(response.usage.prompt_tokens)
+        LLM_TOKENS.labels(kind, "completion").inc(response.usage.completion_tokens)
+        return response
+
+    async def _add_cost(self, kind, thread_id, cost):
+        """Account a cost in memory and in the shared database"""
+        LLM_COST.labels(kind).inc(cost)
+        self.total_costs[kind] = self.total_costs.get(kind, 0.0) + cost
+        if thread_id:
+            self.thread_costs[thread_id] = self.thread_costs.get(thread_id, 0) + cost
+        try:
+            await self.bot.database.add_chat_costs([(kind, thread_id, cost)])
+        except Exception as e:
+            self.bot.logger.error("Failed to store cost: %s", e)
 
     async def auto_save(self):
         """Periodically save all data"""
         await self.bot.wait_until_ready()
+        # Import openai once started, in a worker thread, rather than on the loop at the first message
+        await asyncio.to_thread(get_client)
         while not self.bot.is_closed():
             try:
                 self.save_data()
+                await self.refresh_costs()
                 self.bot.logger.info("Auto-saved persistent data")
             except Exception as e:
-                self.bot.logger.error(f"Auto-save failed: {e}")
+                self.bot.logger.error("Auto-save failed: %s", e)
             await asyncio.sleep(300)  # Save every 5 minutes
 
     def save_data(self):
@@ -82,18 +202,17 @@ class ChatCog(commands.Cog, name="chat"):
                 json.dump({"guilds": self.active_channels}, f, indent=4)
             
             # Save message history
-            with open(HISTORY_FILE, "w") as f:
+            with open(self._cluster_file(HISTORY_FILE), "w") as f:
                 json.dump(self.message_history, f, indent=4)
             
-            # Save cost tracking
-            with open(COST_FILE, "w") as f:
+            # Save token savings, the costs themselves are stored in the database
+            with open(self._cluster_file(COST_FILE), "w") as f:
                 json.dump({
-                    "thread_costs": self.thread_costs,
-                    "total_costs": self.total_costs
+                    "thread_token_savings": self.thread_token_savings
                 }, f, indent=4)
                 
         except Exception as e:
-            self.bot.logger.error(f"Save failed: {e}")
+            self.bot.logger.error("Save failed: %s", e)
 
     def _calculate_cost(self, usage):
         """Calculate cost from API usage"""
@@ -101,26 +220,122 @@ class ChatCog(commands.Cog, name="chat"):
         output_cost = (usage.completion_tokens / 1000) * DEEPSEEK_OUTPUT_COST
         return round(input_cost + output_cost, 4)
 
+    def _estimate_tokens(self, text):
+        """Rough token estimate (~4 characters per token)"""
+        return max(1, len(text) // 4)
+
+    def _history_head(self, history):
+        """Number of leading entries (system prompt and rolling summary) that are never folded"""
+        if len(history) > 1 and history[1]["role"] == "system" and history[1]["content"].startswith(SUMMARY_PREFIX):
+            return 2
+        return 1
+
+    def _schedule_summary(self, thread_id):
+        """Start a background summarization for a thread if it needs one and none is running"""
+        history = self.message_history.get(thread_id, [])
+        if thread_id in self._summarizing or len(history) <= SUMMARY_THRESHOLD:
+            return
+        self._summarizing.add(thread_id)
+        task = self.bot.loop.create_task(self.summarize_thread(thread_id))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    async def summarize_thread(self, thread_id):
+        """Fold the older turns of a thread into its rolling summary message"""
+        try:
+            history = self.message_history.get(thread_id)
+            if not history:
+                return
+            head = self._history_head(history)
+            fold_count = len(history) - head - SUMMARY_KEEP_RECENT
+            if fold_count <= 0:
+                return
+
+            previous_summary = history[1]["content"][len(SUMMARY_PREFIX):] if head == 2 else ""
+            folded = history[head:head + fold_count]
+            transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in folded)
+            summary_messages = [
+                {
+                    "role": "system",
+                    "content": "Update the running summary of a support conversation. Keep every fact, "
+                               "question and answer that may matter later. Reply with the summary only."
+                },
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+                }
+            ]
+
+            # The client is synchronous, so run it in a worker thread to keep replies flowing
+            response = await asyncio.to_thread(
+                self._create_completion, "summaries", summary_messages
+            )
+            summary = response.choices[0].message.content.strip()
+
+            cost = self._calculate_cost(response.usage)
+            await self._add_cost("summaries", thread_id, cost)
+
+            # Replies may have appended to the history meanwhile, but only at the end.
+            # If the list was replaced (hard limit, reset) the folded slice is stale.
+            if self.message_history.get(thread_id) is not history or self._history_head(history) != head:
+                return
+            summary_message = {"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"}
+            del history[head:head + fold_count]
+            if head == 2:
+                history[1] = summary_message
+            else:
+                history.insert(1, summary_message)
+
+            savings = self.thread_token_savings.setdefault(
+                thread_id, {"folded_tokens": 0, "summary_tokens": 0, "tokens_saved": 0}
+            )
+            savings["folded_tokens"] += sum(self._estimate_tokens(turn["content"]) for turn in folded)
+            savings["summary_tokens"] = self._estimate_tokens(summary)
+
+            self.bot.logger.info(
+                "Thread %s summarized %s turns | Summary cost: $%.4f | Folded tokens: %s -> %s",
+                thread_id,
+                fold_count,
+                cost,
+                savings["folded_tokens"],
+                savings["summary_tokens"],
+            )
+        except Exception as e:
+            self.bot.logger.error("Summarization failed for thread %s: %s", thread_id, e)
+        finally:
+            self._summarizing.discard(thread_id)
+
+    def _record_token_savings(self, thread_id):
+        """Account the input tokens a request did not send thanks to the rolling summary"""
+        savings = self.thread_token_savings.get(thread_id)
+        if savings is None:
+            return
+        saved = savings["folded_tokens"] - savings["summary_tokens"]
+        if saved > 0:
+            savings["tokens_saved"] += saved
+
     async def cog_unload(self):
         """Save data when cog unloads"""
+        self.bot.pipeline.remove_stage("chat")
         self.save_task.cancel()
+        for task in self._summary_tasks:
+            task.cancel()
         self.save_data()
         self.bot.logger.info("Saved data before shutdown")
 
     # ... Keep your existing add_channel/remove_channel commands unchanged ...
 
-    @commands.Cog.listener()
-    async def on_message(self, message: Message):
-        if message.author == self.bot.user:
-            return
+    async def process_message(self, context: MessageContext):
+        """Message pipeline stage answering in help threads and active channels, the last and costliest one"""
+        message = context.message
 
         # System message and existing thread handling
         system_msg = "Your name is CryptoExpert..."  # Your full system message
 
         # Thread message handling
-        if isinstance(message.channel, Thread):
+        if context.is_thread:
             thread = message.channel
-            thread_id = str(thread.id)
+            thread_id = str(context.channel_id)
 
             # Initialize history if not exists
             if thread_id not in self.message_history:
@@ -131,21 +346,19 @@ class ChatCog(commands.Cog, name="chat"):
 
             try:
                 # Generate response
-                response = client.chat.completions.create(
-                    model="deepseek-chat",
-                    messages=self.message_history[thread_id],
-                    stream=False
-                )
+                response = self._create_completion("responses", self.message_history[thread_id])
                 
                 # Calculate and track cost
+                self._record_token_savings(thread_id)
                 cost = self._calculate_cost(response.usage)
-                self.total_costs["responses"] += cost
-                self.thread_costs[thread_id] = self.thread_costs.get(thread_id, 0) + cost
+                await self._add_cost("responses", thread_id, cost)
                 
                 self.bot.logger.info(
-                    f"Thread {thread_id} cost: ${cost:.4f} | "
-                    f"Thread total: ${self.thread_costs[thread_id]:.4f} | "
-                    f"Global total: ${self.total_costs['responses']:.4f}"
+                    "Thread %s cost: $%.4f | Thread total: $%.4f | Global total: $%.4f",
+                    thread_id,
+                    cost,
+                    self.thread_costs[thread_id],
+                    self.total_costs["responses"],
                 )
 
                 # Send response and update history
@@ -153,19 +366,21 @@ class ChatCog(commands.Cog, name="chat"):
                 await thread.send(bot_response)
                 self.message_history[thread_id].append({"role": "assistant", "content": bot_response})
 
-                # Maintain history limit
-                if len(self.message_history[thread_id]) > 10:
-                    self.message_history[thread_id] = self.message_history[thread_id][-10:]
+                # Fold older turns into the rolling summary in the background
+                self._schedule_summary(thread_id)
+
+                # Maintain history limit, keeping the system prompt and summary
+                history = self.message_history[thread_id]
+                if len(history) > HISTORY_HARD_LIMIT:
+                    head = self._history_head(history)
+                    self.message_history[thread_id] = history[:head] + history[-(HISTORY_HARD_LIMIT - head):]
 
             except Exception as e:
                 await thread.send(f"Error generating response: {e}")
 
         else:
             # Existing channel handling with decision API
-            guild_id = str(message.guild.id)
-            channel_id = str(message.channel.id)
-
-            if guild_id in self.active_channels and channel_id in self.active_channels[guild_id]["channels"]:
+            if context.channel_id in self.active_channel_ids:
                 # Decision logic with retries
                 decision_system = "Respond EXACTLY 'YES' or 'NO' if help is needed..."
                 decision_messages = [
@@ -179,23 +394,20 @@ class ChatCog(commands.Cog, name="chat"):
                     total_cost = 0.0
                     
                     for attempt in range(max_attempts):
-                        response = client.chat.completions.create(
-                            model="deepseek-chat",
-                            messages=decision_messages,
-                            stream=False
-                        )
+                        response = self._create_completion("decisions", decision_messages)
                         
                         cost = self._calculate_cost(response.usage)
                         total_cost += cost
-                        self.total_costs["decisions"] += cost
+                        await self._add_cost("decisions", "", cost)
                         
                         decision = response.choices[0].message.content.strip().upper()
                         if decision in ['YES', 'NO']:
                             break
 
                     self.bot.logger.info(
-                        f"Decision cost: ${total_cost:.4f} | "
-                        f"Total decision costs: ${self.total_costs['decisions']:.4f}"
+                        "Decision cost: $%.4f | Total decision costs: $%.4f",
+                        total_cost,
+                        self.total_costs["decisions"],
                     )
 
                     if decision == 'YES':
@@ -208,7 +420,7 @@ class ChatCog(commands.Cog, name="chat"):
                             await message.channel.send("Failed to create thread")
 
                 except Exception as e:
-                    self.bot.logger.error(f"Decision error: {e}")
+                    self.bot.logger.error("Decision error: %s", e)
 
 async def setup(bot):
     await bot.add_cog(ChatCog(bot))
\ No newline at end of file
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import aiohttp
 import discord
@@ -5,6 +6,9 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 
+REQUIRED_INTENTS = ()
+
+
 class Choice(discord.ui.View):
     def __init__(self) -> None:
         super().__init__()
@@ -95,21 +99,22 @@ class Fun(commands.Cog, name="fun"):
 
         :param context: The hybrid command context.
         """
-        # This will prevent your bot from stopping everything when doing a web request - see: https://discordpy.readthedocs.io/en/stable/faq.html#how-do-i-make-a-web-request
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                "https://uselessfacts.jsph.pl/random.json?language=en"
-            ) as request:
-                if request.status == 200:
-                    data = await request.json()
-                    embed = discord.Embed(description=data["text"], color=0xD75BF4)
-                else:
-                    embed = discord.Embed(
-                        title="Error!",
-                        description="There is something wrong with the API, please try again later",
-                        color=0xE02B2B,
-                    )
-                await context.send(embed=embed)
+        # Facts are random, so they are not cached, but the connection is reused
+        try:
+            status, data = await self.bot.http_client.get_json(
+                "https://uselessfacts.jsph.pl/random.json", params={"language": "en"}
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status, data = None, None
+        if status == 200:
+            embed = discord.Embed(description=data["text"], color=0xD75BF4)
+        else:
+            embed = discord.Embed(
+                title="Error!",
+                description="There is something wrong with the API, please try again later",
+                color=0xE02B2B,
+            )
+        await context.send(embed=embed)
 
     @commands.hybrid_command(
         name="coinflip", description="Make a coin flip, but give your bet before."
@@ -1,5 +1,6 @@
 
 
+import asyncio
 import platform
 import random
 
@@ -9,6 +10,15 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
+from utils.paginator import StaticPaginator
+
+# Discord limits: 1024 characters per field value, 25 fields and 6000 characters per embed
+FIELD_MAX_LENGTH = 1024
+PAGE_MAX_FIELDS = 25
+PAGE_MAX_LENGTH = 5500
+
+REQUIRED_INTENTS = ()
+
 
 class FeedbackForm(discord.ui.Modal, title="Feeedback"):
     feedback = discord.ui.TextInput(
@@ -36,6 +46,8 @@ class General(commands.Cog, name="general"):
             name="Remove spoilers", callback=self.remove_spoilers
         )
         self.bot.tree.add_command(self.context_menu_message)
+        # The help pages of the public and owner variants, built on first use
+        self.help_pages = {}
 
     # Message context menu command
     async def remove_spoilers(
@@ -81,24 +93,76 @@ class General(commands.Cog, name="general"):
         name="help", description="List all commands the bot has loaded."
     )
     async def help(self, context: Context) -> None:
+        """
+        List all commands the bot has loaded.
+
+        :param context: The hybrid command context.
+        """
+        owner = await self.bot.is_owner(context.author)
+        pages = self.help_pages.get(owner)
+        if pages is None:
+            pages = self.help_pages[owner] = self.build_help_pages(owner)
+        await StaticPaginator(pages, context.author.id).start(context)
+
+    @commands.Cog.listener()
+    async def on_extensions_changed(self) -> None:
+        """
+        Drop the help pages when an extension was loaded, unloaded or reloaded.
+        """
+        self.help_pages.clear()
+
+    def build_help_pages(self, owner: bool) -> list:
+        """
+        This function will build the help embeds, split so that each one stays within the embed limits.
+
+        :param owner: Whether the commands of the owner cog are listed.
+        :return: The embeds of the pages.
+        """
         prefix = self.bot.config["prefix"]
-        embed = discord.Embed(
-            title="Help", description="List of available commands:", color=0xBEBEFE
-        )
-        for i in self.bot.cogs:
-            if i == "owner" and not (await self.bot.is_owner(context.author)):
+        fields = []
+        for name, cog in self.bot.cogs.items():
+            if name == "owner" and not owner:
                 continue
-            cog = self.bot.get_cog(i.lower())
-            commands = cog.get_commands()
-            data = []
-            for command in commands:
+            lines = []
+            for command in cog.get_commands():
                 description = command.description.partition("\n")[0]
-                data.append(f"{prefix}{command.name} - {description}")
-            help_text = "\n".join(data)
-            embed.add_field(
-                name=i.capitalize(), value=f"```{help_text}```", inline=False
+                lines.append(f"{prefix}{command.name} - {description}")
+            # Split the commands of a cog into code blocks fitting in a field
+            chunk = []
+            for line in lines:
+                line = line[: FIELD_MAX_LENGTH - 7]
+                if chunk and len("\n".join(chunk + [line])) + 6 > FIELD_MAX_LENGTH:
+                    fields.append((name, chunk))
+                    chunk = []
+                chunk.append(line)
+            if chunk:
+                fields.append((name, chunk))
+
+        pages = []
+        embed = None
+        previous_name = None
+        for name, chunk in fields:
+            title = name.capitalize() if name != previous_name else f"{name.capitalize()} (continued)"
+            value = "```{}```".format("\n".join(chunk))
+            previous_name = name
+            if (
+                embed is None
+                or len(embed.fields) >= PAGE_MAX_FIELDS
+                or len(embed) + len(title) + len(value) > PAGE_MAX_LENGTH
+            ):
+                embed = discord.Embed(
+                    title="Help", description="List of available commands:", color=0xBEBEFE
+                )
+                pages.append(embed)
+            embed.add_field(name=title, value=value, inline=False)
+        if not pages:
+            pages.append(
+                discord.Embed(title="Help", description="No commands are loaded.", color=0xBEBEFE)
             )
-        await context.send(embed=embed)
+        if len(pages) > 1:
+            for index, page in enumerate(pages, start=1):
+                page.set_footer(text=f"Page {index}/{len(pages)}")
+        return pages
 
     @commands.hybrid_command(
         name="botinfo",
@@ -267,25 +331,26 @@ class General(commands.Cog, name="general"):
 
         :param context: The hybrid command context.
         """
-        # This will prevent your bot from stopping everything when doing a web request - see: https://discordpy.readthedocs.io/en/stable/faq.html#how-do-i-make-a-web-request
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                "https://api.coindesk.com/v1/bpi/currentprice/BTC.json"
-            ) as request:
-                if request.status == 200:
-                    data = await request.json()
-                    embed = discord.Embed(
-                        title="Bitcoin price",
-                        description=f"The current price is {data['bpi']['USD']['rate']} :dollar:",
-                        color=0xBEBEFE,
-                    )
-                else:
-                    embed = discord.Embed(
-                        title="Error!",
-                        description="There is something wrong with the API, please try again later",
-                        color=0xE02B2B,
-                    )
-                await context.send(embed=embed)
+        # The price is cached for 30 seconds, concurrent invocations share a single request
+        try:
+            status, data = await self.bot.http_client.get_json(
+                "https://api.coindesk.com/v1/bpi/currentprice/BTC.json", ttl=30
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status, data = None, None
+        if status == 200:
+            embed = discord.Embed(
+                title="Bitcoin price",
+                description=f"The current price is {data['bpi']['USD']['rate']} :dollar:",
+                color=0xBEBEFE,
+            )
+        else:
+            embed = discord.Embed(
+                title="Error!",
+                description="There is something wrong with the API, please try again later",
+                color=0xE02B2B,
+            )
+        await context.send(embed=embed)
 
     @app_commands.command(
         name="feedback", description="Submit a feedback for the owners of the bot"
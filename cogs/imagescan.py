@@ -0,0 +1,384 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import time
+
+import aiohttp
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+from discord.ext.commands import Context
+
+from utils.images import BKTree, dhash
+from utils.metrics import REGISTRY
+from utils.pipeline import SPAM_DETECTION, MessageContext
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_INTENTS = ("guild_messages", "message_content")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp")
+# Samples of this server ID apply to every server
+GLOBAL = 0
+
+IMAGES = REGISTRY.counter(
+    "bot_images_scanned_total", "Image attachments scanned, by result.", ("result",)
+)
+HASH_CACHE_HITS = REGISTRY.counter(
+    "bot_image_hash_cache_hits_total", "Image attachments whose hash was already cached."
+)
+HASH_SECONDS = REGISTRY.histogram(
+    "bot_image_hash_seconds", "Time spent downloading and hashing an image attachment."
+)
+
+
+def is_image(attachment: discord.Attachment) -> bool:
+    if attachment.content_type:
+        return attachment.content_type.startswith("image/")
+    return attachment.filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class ImageScan(commands.Cog, name="imagescan"):
+    """
+    Deletes the images resembling known scams, such as fake giveaway screenshots or "support" cards.
+
+    The image attachments of a message are downloaded through the bot's HTTP client, a few at a
+    time, and their difference hash is computed in a worker thread. Hashes are cached by the
+    SHA-256 of the file, so an image reposted by a raid is only decoded once. Samples are indexed
+    in one BK-tree per server plus one for every server, which find the hashes within
+    `image_scan_distance` bits of an image without comparing it to every sample.
+    """
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+        self.logger = logger
+        self.max_distance = bot.config.get("image_scan_distance", 10)
+        self.max_bytes = bot.config.get("image_scan_max_bytes", 8 * 1024 * 1024)
+        self.max_attachments = 4
+        self.downloads = asyncio.Semaphore(bot.config.get("image_download_concurrency", 4))
+        # {sample ID: (server ID, hash, label)}
+        self.samples = {}
+        self.trees = {}
+        # {SHA-256 of a file: its hash, None if it isn't a readable image}
+        self.hashes = collections.OrderedDict()
+        self.max_cached = 10_000
+        self.result_counters = {
+            result: IMAGES.labels(result) for result in ("match", "clean", "error", "skipped")
+        }
+
+    async def cog_load(self) -> None:
+        try:
+            self.index(await self.bot.database.get_scam_images())
+            self.logger.info("Loaded %s scam image samples from the database", len(self.samples))
+        except Exception as e:
+            self.logger.critical("Failed to load scam image samples: %s", str(e), exc_info=True)
+        if getattr(self.bot, "cluster_count", 1) > 1:
+            self.refresh_samples.start()
+        self.bot.pipeline.add_stage("images", self.scan_message, order=SPAM_DETECTION)
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.remove_stage("images")
+        self.refresh_samples.cancel()
+
+    @tasks.loop(seconds=60)
+    async def refresh_samples(self) -> None:
+        """Pick up the samples other cluster processes added or removed."""
+        try:
+            self.index(await self.bot.database.get_scam_images())
+        except Exception as e:
+            self.logger.error("Failed to refresh scam image samples: %s", str(e), exc_info=True)
+
+    def index(self, samples: list) -> None:
+        """
+        This function will rebuild the BK-trees from the samples.
+
+        :param samples: A list of (ID, server ID, hash, label) tuples.
+        """
+        trees = {}
+        self.samples = {}
+        for sample_id, server_id, image_hash, label in samples:
+            self.samples[sample_id] = (server_id, image_hash, label)
+            trees.setdefault(server_id, BKTree()).add(image_hash, sample_id)
+        self.trees = trees
+
+    def add_sample(self, sample_id: int, server_id: int, image_hash: int, label: str) -> None:
+        self.samples[sample_id] = (server_id, image_hash, label)
+        self.trees.setdefault(server_id, BKTree()).add(image_hash, sample_id)
+
+    def match(self, guild_id: int, image_hash: int):
+        """
+        This function will find the closest sample to an image among the server's and the global ones.
+
+        :param guild_id: The ID of the server.
+        :param image_hash: The hash of the image.
+        :return: A tuple of the distance and the sample ID, or None if no sample is close enough.
+        """
+        best = None
+        for server_id in (guild_id, GLOBAL):
+            tree = self.trees.get(server_id)
+            if tree is None:
+                continue
+            matches = tree.search(image_hash, self.max_distance)
+            if matches and (best is None or matches[0][0] < best[0]):
+                best = matches[0]
+        return best
+
+    async def hash_attachment(self, attachment: discord.Attachment):
+        """
+        This function will download an image attachment and compute its hash, or take it from the cache.
+
+        :param attachment: The attachment.
+        :return: The hash, or None if the image is too large or can't be read.
+        """
+        if attachment.size > self.max_bytes:
+            self.result_counters["skipped"].inc()
+            return None
+        started = time.perf_counter()
+        try:
+            async with self.downloads:
+                status, data = await self.bot.http_client.get_bytes(attachment.url, max_bytes=self.max_bytes)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning("Failed to download attachment %s: %s", attachment.id, e)
+            self.result_counters["error"].inc()
+            return None
+        if data is None:
+            self.logger.warning("Failed to download attachment %s: HTTP %s", attachment.id, status)
+            self.result_counters["error"].inc()
+            return None
+        digest = hashlib.sha256(data).digest()
+        if digest in self.hashes:
+            self.hashes.move_to_end(digest)
+            HASH_CACHE_HITS.inc()
+            return self.hashes[digest]
+        try:
+            image_hash = await asyncio.to_thread(dhash, data)
+        except Exception as e:
+            # Not an image after all, or one Pillow can't decode: cached too, a raid reposts the same file
+            self.logger.debug("Failed to hash attachment %s: %s", attachment.id, e)
+            self.result_counters["error"].inc()
+            image_hash = None
+        self.hashes[digest] = image_hash
+        if len(self.hashes) > self.max_cached:
+            self.hashes.popitem(last=False)
+        HASH_SECONDS.observe(time.perf_counter() - started)
+        return image_hash
+
+    async def scan_message(self, context: MessageContext) -> None:
+        """Message pipeline stage matching the images of messages against the scam samples."""
+        message = context.message
+        if context.guild_id is None or not message.attachments:
+            return
+        if context.guild_id not in self.trees and GLOBAL not in self.trees:
+            return
+        attachments = [attachment for attachment in message.attachments if is_image(attachment)]
+        if not attachments:
+            return
+        image_hashes = await asyncio.gather(
+            *(self.hash_attachment(attachment) for attachment in attachments[: self.max_attachments])
+        )
+        for image_hash in image_hashes:
+            if image_hash is None:
+                continue
+            found = self.match(context.guild_id, image_hash)
+            if found is not None:
+                self.result_counters["match"].inc()
+                distance, sample_id = found
+                label = self.samples[sample_id][2] or f"sample #{sample_id}"
+                self.logger.warning(
+                    "Found scam image %s (distance %s) in message from %s", label, distance, message.author
+                )
+                # The message is deleted, the next stages must not answer it
+                context.stop("scam_image")
+                await self.handle_scam_image(message, sample_id, label, distance)
+                return
+            self.result_counters["clean"].inc()
+
+    async def handle_scam_image(self, message: discord.Message, sample_id: int, label: str, distance: int) -> None:
+        """
+        This function will delete a message with a scam image, report it and warn its author.
+
+        :param message: The message.
+        :param sample_id: The ID of the sample the image matched.
+        :param label: What the sample is.
+        :param distance: The number of bits between the image and the sample.
+        """
+        try:
+            await message.delete()
+            self.bot.database.log_action(
+                message.guild.id,
+                "image_delete",
+                target_id=message.author.id,
+                reason=f"Scam image {label} in #{message.channel}",
+            )
+            # Counted before notifying, a report or warning that fails must not spare the offender
+            warn_id, total = await self.bot.database.add_warn(
+                message.author.id, message.guild.id, self.bot.user.id, f"Posted scam image {label}"
+            )
+            try:
+                policy = await self.bot.escalation.escalate(
+                    message.guild, message.author.id, warn_id, "Repeated scam images"
+                )
+            except discord.HTTPException as e:
+                # The warn is counted, only the sanction failed, the report and warning still go out
+                self.logger.error("Failed to escalate %s (ID: %s): %s", message.author, message.author.id, str(e))
+                policy = None
+            if policy is not None:
+                self.logger.warning(
+                    "Escalated %s (ID: %s): %s", message.author, message.author.id, policy.describe()
+                )
+            report_channel = discord.utils.get(message.guild.text_channels, name="reports")
+            if report_channel is not None:
+                embed = discord.Embed(title="Scam Image Detected", color=0xE02B2B)
+                embed.add_field(name="User", value=f"{message.author.mention}\n{message.author}", inline=False)
+                embed.add_field(name="Channel", value=message.channel.mention, inline=False)
+                embed.add_field(
+                    name="Sample", value=f"{label} (#{sample_id}, {distance} bits apart)", inline=False
+                )
+                if message.content:
+                    embed.add_field(name="Message Content", value=f"```{message.content[:500]}```", inline=False)
+                embed.set_footer(text=f"User ID: {message.author.id}")
+                await report_channel.send(embed=embed)
+            embed = discord.Embed(
+                description=f"{message.author.mention}, your image was removed: it matches a known scam.",
+                color=0xE02B2B,
+            )
+            await message.channel.send(embed=embed, delete_after=10)
+        except discord.Forbidden:
+            self.logger.error("Missing permissions in %s (ID: %s)", message.guild.name, message.guild.id)
+        except Exception as e:
+            self.logger.error("Scam image handling failed: %s", str(e), exc_info=True)
+
+    @commands.hybrid_command(
+        name="addscamimage",
+        description="Adds an image to the known scams, the images resembling it will be deleted.",
+    )
+    @commands.has_permissions(administrator=True)
+    @app_commands.describe(
+        image="The scam image.",
+        label="What the image is, shown in the reports.",
+        everywhere="Whether the sample applies to every server, bot owner only.",
+    )
+    async def addscamimage(
+        self,
+        context: Context,
+        image: discord.Attachment,
+        label: str = None,
+        everywhere: bool = False,
+    ) -> None:
+        """
+        Adds an image to the known scams, the images resembling it will be deleted.
+
+        :param context: The hybrid command context.
+        :param image: The scam image.
+        :param label: What the image is, shown in the reports. Default is None.
+        :param everywhere: Whether the sample applies to every server, bot owner only. Default is False.
+        """
+        if everywhere and not await self.bot.is_owner(context.author):
+            embed = discord.Embed(
+                description="Only the owner of the bot can add samples for every server.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        if not is_image(image):
+            embed = discord.Embed(description="The attachment isn't an image.", color=0xE02B2B)
+            await context.send(embed=embed)
+            return
+        await context.defer()
+        image_hash = await self.hash_attachment(image)
+        if image_hash is None:
+            embed = discord.Embed(
+                description="The image couldn't be downloaded or read, or is too large.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        server_id = GLOBAL if everywhere else context.guild.id
+        duplicate = self.trees.get(server_id, BKTree()).search(image_hash, 0)
+        if duplicate:
+            embed = discord.Embed(
+                description=f"This image is already known as sample #{duplicate[0][1]}.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        label = label[:100] if label else None
+        sample_id = await self.bot.database.add_scam_image(server_id, image_hash, label, context.author.id)
+        self.add_sample(sample_id, server_id, image_hash, label)
+        self.bot.database.log_action(
+            context.guild.id,
+            "scam_image_add",
+            moderator_id=context.author.id,
+            reason=f"Sample #{sample_id} {label or ''}".strip(),
+        )
+        embed = discord.Embed(
+            description=(
+                f"Added sample #{sample_id} (hash `{image_hash:016x}`) "
+                f"{'for every server' if everywhere else 'for this server'}."
+            ),
+            color=0xBEBEFE,
+        )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="removescamimage",
+        description="Removes a sample from the known scam images.",
+    )
+    @commands.has_permissions(administrator=True)
+    @app_commands.describe(sample_id="The ID of the sample, shown by `scamimages`.")
+    async def removescamimage(self, context: Context, sample_id: int) -> None:
+        """
+        Removes a sample from the known scam images.
+
+        :param context: The hybrid command context.
+        :param sample_id: The ID of the sample, shown by `scamimages`.
+        """
+        sample = self.samples.get(sample_id)
+        server_id = sample[0] if sample is not None else context.guild.id
+        if server_id == GLOBAL and not await self.bot.is_owner(context.author):
+            embed = discord.Embed(
+                description="Only the owner of the bot can remove samples of every server.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        if server_id not in (GLOBAL, context.guild.id) or not await self.bot.database.remove_scam_image(
+            sample_id, server_id
+        ):
+            embed = discord.Embed(description=f"There is no sample #{sample_id}.", color=0xE02B2B)
+            await context.send(embed=embed)
+            return
+        # BK-trees can't remove an item, they are rebuilt
+        self.index([(known_id, *known) for known_id, known in self.samples.items() if known_id != sample_id])
+        embed = discord.Embed(description=f"Removed sample #{sample_id}.", color=0xBEBEFE)
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="scamimages",
+        description="Lists the known scam images of the server.",
+    )
+    @commands.has_permissions(administrator=True)
+    async def scamimages(self, context: Context) -> None:
+        """
+        Lists the known scam images of the server.
+
+        :param context: The hybrid command context.
+        """
+        samples = sorted(
+            (sample_id, server_id, label)
+            for sample_id, (server_id, _, label) in self.samples.items()
+            if server_id in (GLOBAL, context.guild.id)
+        )
+        embed = discord.Embed(title="Known Scam Images", color=0xBEBEFE)
+        if not samples:
+            embed.description = "No samples yet, add some with `addscamimage`."
+        else:
+            embed.description = "\n".join(
+                f"#{sample_id} {label or 'unlabelled'}{' (every server)' if server_id == GLOBAL else ''}"
+                for sample_id, server_id, label in samples[:50]
+            )
+        embed.set_footer(
+            text=f"{len(self.hashes)} images cached | matching up to {self.max_distance} bits apart"
+        )
+        await context.send(embed=embed)
+
+
+async def setup(bot) -> None:
+    await bot.add_cog(ImageScan(bot))
@@ -1,23 +1,33 @@
+import asyncio
+import hashlib
+import io
 import json
 import re
 import logging
 from pathlib import Path
 from urllib.parse import urlparse
-from datetime import datetime
+from datetime import datetime, timedelta
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Context
 
+from utils.pipeline import LINK_SCAN, MessageContext
+from utils.purge import BackfillEngine
+
 # Configure logger for this cog
 logger = logging.getLogger(__name__)
 
+REQUIRED_INTENTS = ("guild_messages", "message_content")
+
 class LinkManager(commands.Cog, name="linkmanager"):
     def __init__(self, bot) -> None:
         self.bot = bot
         self.logger = logger
         self.JSON_PATH = Path(__file__).parent / "forbidden_links.json"
-        self.forbidden_links = self.load_links()
+        self.forbidden_links = {}
         self.url_regex = re.compile(r"https?://\S+|www\.\S+")
+        self.backfills = set()
         self.logger.info("LinkManager cog initialized successfully")
 
     def normalize_domain(self, url: str) -> str:
@@ -29,46 +39,57 @@ class LinkManager(commands.Cog, name="linkmanager"):
             domain = parsed.netloc.lower()
             if domain.startswith('www.'):
                 domain = domain[4:]
-            self.logger.debug(f"Normalized domain: {url} -> {domain}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Normalized domain: %s -> %s", url, domain)
             return domain
         except Exception as e:
-            self.logger.error(f"Domain normalization failed for {url}: {str(e)}", exc_info=True)
+            self.logger.error("Domain normalization failed for %s: %s", url, str(e), exc_info=True)
             raise
 
-    def load_links(self):
-        """Load forbidden links from JSON file with guild-specific storage."""
+    async def cog_load(self) -> None:
+        """Load forbidden links from the database, shared by every cluster process."""
         try:
-            if self.JSON_PATH.exists():
-                with open(self.JSON_PATH, 'r') as f:
-                    data = json.load(f)
-                    self.logger.info(f"Loaded forbidden links from {self.JSON_PATH}")
-                    return {int(k): set(v) for k, v in data.items()}
-            self.logger.info("No existing forbidden links file found, starting fresh")
-            return {}
+            await self.import_json_links()
+            self.forbidden_links = await self.bot.database.get_forbidden_links()
+            self.logger.info("Loaded forbidden links of %s guilds from the database", len(self.forbidden_links))
         except Exception as e:
-            self.logger.critical(f"Failed to load links: {str(e)}", exc_info=True)
-            return {}
-
-    def save_links(self):
-        """Save forbidden links to JSON file with guild-specific storage."""
+            self.logger.critical("Failed to load links: %s", str(e), exc_info=True)
+        if getattr(self.bot, "cluster_count", 1) > 1:
+            self.refresh_links.start()
+        self.bot.pipeline.add_stage("links", self.scan_message, order=LINK_SCAN)
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.remove_stage("links")
+        self.refresh_links.cancel()
+
+    @tasks.loop(seconds=60)
+    async def refresh_links(self):
+        """Pick up the links other cluster processes changed, e.g. while importing the JSON storage."""
         try:
-            with open(self.JSON_PATH, 'w') as f:
-                json.dump(
-                    {str(k): list(v) for k, v in self.forbidden_links.items()},
-                    f,
-                    indent=2
-                )
-            self.logger.info(f"Successfully saved links to {self.JSON_PATH}")
+            self.forbidden_links = await self.bot.database.get_forbidden_links()
         except Exception as e:
-            self.logger.error(f"Failed to save links: {str(e)}", exc_info=True)
-            raise
+            self.logger.error("Failed to refresh links: %s", str(e), exc_info=True)
+
+    async def import_json_links(self):
+        """Move the links of the former JSON storage into the database, once."""
+        imported = self.JSON_PATH.with_suffix(".json.imported")
+        try:
+            # Only the first cluster process to rename the file imports it
+            self.JSON_PATH.rename(imported)
+        except FileNotFoundError:
+            return
+        with open(imported, 'r') as f:
+            data = json.load(f)
+        for guild_id, domains in data.items():
+            await self.bot.database.add_forbidden_links(int(guild_id), list(domains))
+        self.logger.info("Imported forbidden links of %s guilds from %s", len(data), self.JSON_PATH)
 
     async def send_report(self, guild: discord.Guild, message: discord.Message, domain: str):
         """Send violation report to the designated reports channel."""
         try:
             report_channel = discord.utils.get(guild.text_channels, name='reports')
             if not report_channel:
-                self.logger.warning(f"Reports channel not found in {guild.name} (ID: {guild.id})")
+                self.logger.warning("Reports channel not found in %s (ID: %s)", guild.name, guild.id)
                 return
 
             embed = discord.Embed(
@@ -85,9 +106,9 @@ class LinkManager(commands.Cog, name="linkmanager"):
             embed.set_footer(text=f"User ID: {message.author.id}")
 
             await report_channel.send(embed=embed)
-            self.logger.info(f"Sent violation report for {domain} in {guild.name} (ID: {guild.id})")
+            self.logger.info("Sent violation report for %s in %s (ID: %s)", domain, guild.name, guild.id)
         except Exception as e:
-            self.logger.error(f"Failed to send report: {str(e)}", exc_info=True)
+            self.logger.error("Failed to send report: %s", str(e), exc_info=True)
             raise
 
     @commands.hybrid_command(name="addlink", description="Add a domain to the forbidden list")
@@ -97,32 +118,29 @@ class LinkManager(commands.Cog, name="linkmanager"):
         try:
             guild_id = context.guild.id
             normalized = self.normalize_domain(link)
-            self.logger.info(f"Addlink command invoked by {context.author} (ID: {context.author.id}) for domain: {normalized}")
-
-            if guild_id not in self.forbidden_links:
-                self.forbidden_links[guild_id] = set()
-                self.logger.debug(f"Created new entry for guild ID: {guild_id}")
+            self.logger.info("Addlink command invoked by %s (ID: %s) for domain: %s", context.author, context.author.id, normalized)
 
-            if normalized in self.forbidden_links[guild_id]:
+            if normalized in self.forbidden_links.get(guild_id, ()):
                 embed = discord.Embed(
                     description=f"⚠️ `{normalized}` is already forbidden!",
                     color=discord.Color.orange()
                 )
-                self.logger.warning(f"Duplicate domain attempt: {normalized} in guild ID: {guild_id}")
+                self.logger.warning("Duplicate domain attempt: %s in guild ID: %s", normalized, guild_id)
                 return await context.send(embed=embed, ephemeral=True)
 
-            self.forbidden_links[guild_id].add(normalized)
-            self.save_links()
+            await self.bot.database.add_forbidden_links(guild_id, [normalized])
+            # The sets may have been reloaded while the write was pending
+            self.forbidden_links.setdefault(guild_id, set()).add(normalized)
 
             embed = discord.Embed(
                 description=f"✅ Added `{normalized}` to forbidden domains",
                 color=discord.Color.green()
             )
-            self.logger.info(f"Successfully added domain: {normalized} to guild ID: {guild_id}")
+            self.logger.info("Successfully added domain: %s to guild ID: %s", normalized, guild_id)
             await context.send(embed=embed, ephemeral=True)
 
         except Exception as e:
-            self.logger.error(f"Addlink command failed: {str(e)}", exc_info=True)
+            self.logger.error("Addlink command failed: %s", str(e), exc_info=True)
             await context.send("❌ An error occurred while processing your request.", ephemeral=True)
 
     @commands.hybrid_command(name="removelink", description="Remove a domain from the forbidden list")
@@ -132,28 +150,28 @@ class LinkManager(commands.Cog, name="linkmanager"):
         try:
             guild_id = context.guild.id
             normalized = self.normalize_domain(link)
-            self.logger.info(f"Removelink command invoked by {context.author} (ID: {context.author.id}) for domain: {normalized}")
+            self.logger.info("Removelink command invoked by %s (ID: %s) for domain: %s", context.author, context.author.id, normalized)
 
             if guild_id not in self.forbidden_links or normalized not in self.forbidden_links[guild_id]:
                 embed = discord.Embed(
                     description=f"⚠️ `{normalized}` isn't in the forbidden list!",
                     color=discord.Color.orange()
                 )
-                self.logger.warning(f"Domain not found attempt: {normalized} in guild ID: {guild_id}")
+                self.logger.warning("Domain not found attempt: %s in guild ID: %s", normalized, guild_id)
                 return await context.send(embed=embed, ephemeral=True)
 
-            self.forbidden_links[guild_id].remove(normalized)
-            self.save_links()
+            await self.bot.database.remove_forbidden_link(guild_id, normalized)
+            self.forbidden_links[guild_id].discard(normalized)
 
             embed = discord.Embed(
                 description=f"❌ Removed `{normalized}` from forbidden domains",
                 color=discord.Color.red()
             )
-            self.logger.info(f"Successfully removed domain: {normalized} from guild ID: {guild_id}")
+            self.logger.info("Successfully removed domain: %s from guild ID: %s", normalized, guild_id)
             await context.send(embed=embed, ephemeral=True)
 
         except Exception as e:
-            self.logger.error(f"Removelink command failed: {str(e)}", exc_info=True)
+            self.logger.error("Removelink command failed: %s", str(e), exc_info=True)
             await context.send("❌ An error occurred while processing your request.", ephemeral=True)
 
     @commands.hybrid_command(name="listlinks", description="Show all forbidden domains for this server")
@@ -161,7 +179,7 @@ class LinkManager(commands.Cog, name="linkmanager"):
         """List all forbidden domains for the current server."""
         try:
             guild_id = context.guild.id
-            self.logger.info(f"Listlinks command invoked by {context.author} (ID: {context.author.id})")
+            self.logger.info("Listlinks command invoked by %s (ID: %s)", context.author, context.author.id)
 
             domains = self.forbidden_links.get(guild_id, set())
             if not domains:
@@ -169,7 +187,7 @@ class LinkManager(commands.Cog, name="linkmanager"):
                     description="ℹ️ No forbidden domains set for this server!",
                     color=discord.Color.blue()
                 )
-                self.logger.debug(f"No domains found for guild ID: {guild_id}")
+                self.logger.debug("No domains found for guild ID: %s", guild_id)
                 return await context.send(embed=embed, ephemeral=True)
 
             embed = discord.Embed(
@@ -178,53 +196,251 @@ class LinkManager(commands.Cog, name="linkmanager"):
                 color=discord.Color.red()
             )
             embed.set_footer(text=f"Total domains: {len(domains)}")
-            self.logger.debug(f"Displayed {len(domains)} domains for guild ID: {guild_id}")
+            self.logger.debug("Displayed %s domains for guild ID: %s", len(domains), guild_id)
             await context.send(embed=embed, ephemeral=True)
 
         except Exception as e:
-            self.logger.error(f"Listlinks command failed: {str(e)}", exc_info=True)
+            self.logger.error("Listlinks command failed: %s", str(e), exc_info=True)
             await context.send("❌ An error occurred while fetching the domain list.", ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
-        """Automatically scan messages for forbidden domains."""
+    @commands.hybrid_command(
+        name="backfill",
+        description="Scan the history of the server for messages linking forbidden domains",
+    )
+    @commands.has_permissions(administrator=True)
+    @commands.bot_has_guild_permissions(manage_messages=True, read_message_history=True)
+    @app_commands.describe(
+        link="Only look for this forbidden domain, e.g. one just added. Default is every forbidden domain.",
+        days="Only scan the messages of the last days, 0 for the whole history.",
+        dry_run="Only list the messages that would be deleted.",
+        restart="Scan the channels from the start again instead of resuming the previous backfill.",
+    )
+    async def backfill(
+        self,
+        context: Context,
+        link: str = None,
+        days: int = 0,
+        dry_run: bool = False,
+        restart: bool = False,
+    ) -> None:
+        """
+        Delete the messages sent before a domain was forbidden, which the message scan never saw.
+
+        Every text channel and active thread is scanned a few at a time. Progress is stored per
+        channel, so running the command again resumes an interrupted backfill. A backfill of every
+        forbidden domain only resumes one made with the same domains: once a domain is added, the
+        history is scanned again, unless the backfill is limited to the new domain with `link`.
+        """
+        guild = context.guild
+        domains = self.forbidden_links.get(guild.id, set())
+        scope = self.normalize_domain(link) if link else "*"
+        if link and scope not in domains:
+            embed = discord.Embed(
+                description=f"⚠️ `{scope}` isn't in the forbidden list, add it with `addlink` first!",
+                color=discord.Color.orange()
+            )
+            return await context.send(embed=embed, ephemeral=True)
+        if not domains:
+            embed = discord.Embed(
+                description="ℹ️ No forbidden domains set for this server!",
+                color=discord.Color.blue()
+            )
+            return await context.send(embed=embed, ephemeral=True)
+        if guild.id in self.backfills:
+            embed = discord.Embed(
+                description="⚠️ A backfill is already running in this server!",
+                color=discord.Color.orange()
+            )
+            return await context.send(embed=embed, ephemeral=True)
+
+        self.backfills.add(guild.id)
         try:
-            if message.author.bot or not message.guild:
-                return
+            self.logger.info(
+                "Backfill invoked by %s (ID: %s) in guild ID: %s for %s (dry run: %s)",
+                context.author, context.author.id, guild.id, scope, dry_run,
+            )
+            if restart and not dry_run:
+                await self.bot.database.clear_backfill_checkpoints(guild.id, scope)
+            checkpoints = await self.bot.database.get_backfill_checkpoints(guild.id, scope)
+            look_for = None if scope == "*" else {scope}
+            # Checkpoints of a backfill looking for other domains don't tell anything about these
+            domains_key = hashlib.sha1(",".join(sorted(look_for or domains)).encode("utf-8")).hexdigest()
+            me = guild.me
+            channels = [
+                channel
+                for channel in [*guild.text_channels, *guild.threads]
+                if channel.permissions_for(me).read_message_history
+                and (dry_run or channel.permissions_for(me).manage_messages)
+            ]
+            engine = BackfillEngine(
+                channels,
+                lambda content: self.find_forbidden_domain(guild.id, content, domains=look_for),
+                database=self.bot.database,
+                server_id=guild.id,
+                scope=scope,
+                domains=domains_key,
+                checkpoints=checkpoints,
+                after=discord.utils.utcnow() - timedelta(days=days) if days > 0 else None,
+                dry_run=dry_run,
+                concurrency=self.bot.config.get("backfill_concurrency", 4),
+            )
+            status = await context.send(
+                embed=discord.Embed(
+                    description=f"🔎 Scanning {len(channels)} channel(s) for `{scope}`...",
+                    color=discord.Color.blue()
+                )
+            )
+            engine.filter.exclude.add(status.id)
 
-            guild_id = message.guild.id
-            self.logger.debug(f"Scanning message from {message.author} (ID: {message.author.id}) in guild ID: {guild_id}")
+            def report() -> discord.Embed:
+                scanned_rate, deleted_rate = engine.throughput()
+                done = task.done()
+                embed = discord.Embed(
+                    title=f"{'Dry run' if dry_run else 'Backfill'} for `{scope}`{'' if done else ' (running)'}",
+                    color=discord.Color.red() if engine.matched else discord.Color.green()
+                )
+                embed.add_field(name="Channels", value=f"{engine.channels_done}/{len(channels)} ({engine.skipped} already done)")
+                embed.add_field(name="Scanned", value=f"{engine.scanned} ({scanned_rate:.0f} msg/s)")
+                embed.add_field(name="Matched", value=str(engine.matched))
+                if not dry_run:
+                    embed.add_field(name="Deleted", value=f"{engine.deleted} ({deleted_rate:.1f}/s)")
+                    embed.add_field(name="Failed", value=str(engine.failed))
+                embed.set_footer(text=f"Took {engine.elapsed:.1f}s")
+                return embed
+
+            task = asyncio.create_task(engine.run())
+            while not task.done():
+                await asyncio.wait({task}, timeout=5)
+                if not task.done():
+                    try:
+                        await status.edit(embed=report())
+                    except discord.HTTPException:
+                        pass
+            await task
+            self.logger.info(
+                "Backfill of %s in guild ID: %s scanned %s messages, matched %s, deleted %s in %.1fs",
+                scope, guild.id, engine.scanned, engine.matched, engine.deleted, engine.elapsed,
+            )
 
-            if guild_id not in self.forbidden_links:
-                return
+            hits = self.format_hits(engine.hits)
+            await status.edit(embed=report())
+            if hits:
+                await context.send(file=discord.File(io.BytesIO(hits.encode("utf-8")), filename=f"backfill-{guild.id}.txt"))
+            if not dry_run and engine.matched:
+                self.bot.database.log_action(
+                    guild.id,
+                    "link_backfill",
+                    moderator_id=context.author.id,
+                    reason=f"{engine.deleted} messages linking {scope} in {len(channels)} channel(s)",
+                )
+                await self.send_backfill_report(guild, report(), hits)
 
-            forbidden_domains = self.forbidden_links[guild_id]
-            found_urls = self.url_regex.findall(message.content)
-            self.logger.debug(f"Found {len(found_urls)} URLs in message from {message.author}")
+        except Exception as e:
+            self.logger.error("Backfill command failed: %s", str(e), exc_info=True)
+            await context.send("❌ An error occurred while scanning the history.", ephemeral=True)
+        finally:
+            self.backfills.discard(guild.id)
+
+    def format_hits(self, hits: list) -> str:
+        """List the matches of a backfill, one per line."""
+        return "\n".join(
+            f"{created_at:%Y-%m-%d %H:%M} #{channel} {author} (ID: {author.id}) {domain} "
+            f"https://discord.com/channels/{channel.guild.id}/{channel.id}/{message_id}"
+            for channel, message_id, author, domain, created_at in hits
+        )
+
+    async def send_backfill_report(self, guild: discord.Guild, embed: discord.Embed, hits: str):
+        """Send the summary of a backfill, with its matches attached, to the designated reports channel."""
+        report_channel = discord.utils.get(guild.text_channels, name='reports')
+        if not report_channel:
+            self.logger.warning("Reports channel not found in %s (ID: %s)", guild.name, guild.id)
+            return
+        try:
+            await report_channel.send(
+                embed=embed,
+                file=discord.File(io.BytesIO(hits.encode("utf-8")), filename=f"backfill-{guild.id}.txt"),
+            )
+        except discord.HTTPException as e:
+            self.logger.error("Failed to send backfill report: %s", str(e), exc_info=True)
+
+    def find_forbidden_domain(self, guild_id: int, content: str, urls: list = None, domains: set = None):
+        """Return the first forbidden domain linked in the content, or None. `urls` skips extracting them again, `domains` narrows the domains looked for."""
+        forbidden_domains = self.forbidden_links.get(guild_id) if domains is None else domains
+        if not forbidden_domains:
+            return None
+
+        found_urls = self.url_regex.findall(content) if urls is None else urls
+        # Checked once, this runs for every message of the guilds with forbidden links
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug("Found %s URLs in content", len(found_urls))
+
+        for url in found_urls:
+            try:
+                domain = self.normalize_domain(url)
+                if debug:
+                    self.logger.debug("Checking URL: %s → Normalized: %s", url, domain)
+
+                if domain in forbidden_domains:
+                    return domain  # Only process first violation
+
+            except Exception as e:
+                self.logger.error("URL processing error: %s", str(e), exc_info=True)
+        return None
+
+    async def scan_message(self, context: MessageContext) -> None:
+        """Message pipeline stage scanning messages for forbidden domains, before commands and the LLM."""
+        try:
+            guild_id = context.guild_id
+            if guild_id is None or guild_id not in self.forbidden_links:
+                return
 
-            for url in found_urls:
-                try:
-                    domain = self.normalize_domain(url)
-                    self.logger.debug(f"Checking URL: {url} → Normalized: {domain}")
+            domain = self.find_forbidden_domain(guild_id, context.content, context.urls)
+            if domain is not None:
+                self.logger.warning("Found forbidden domain %s in message from %s", domain, context.message.author)
+                # The message is deleted, the next stages must not answer it
+                context.stop("forbidden_link")
+                await self.handle_forbidden_message(context.message, domain)
 
-                    if domain in forbidden_domains:
-                        self.logger.warning(f"Found forbidden domain {domain} in message from {message.author}")
-                        await self.handle_forbidden_message(message, domain)
-                        break  # Only process first violation
+        except Exception as e:
+            self.logger.error("Message scanning failed: %s", str(e), exc_info=True)
 
-                except Exception as e:
-                    self.logger.error(f"URL processing error: {str(e)}", exc_info=True)
+    async def record_violation(self, message: discord.Message, domain: str):
+        """Store the violation as a warn so repeat offenders escalate automatically."""
+        if self.bot.database is None:
+            return
+        warn_id, total = await self.bot.database.add_warn(
+            message.author.id, message.guild.id, self.bot.user.id, f"Posted forbidden domain {domain}"
+        )
+        self.logger.info("Recorded warn #%s for %s (%s total)", warn_id, message.author, total)
 
-        except Exception as e:
-            self.logger.error(f"Message scanning failed: {str(e)}", exc_info=True)
+        try:
+            policy = await self.bot.escalation.escalate(
+                message.guild, message.author.id, warn_id, "Repeated forbidden links"
+            )
+        except discord.HTTPException as e:
+            # The warn is counted, only the sanction failed, the report and warning still go out
+            self.logger.error("Failed to escalate %s (ID: %s): %s", message.author, message.author.id, str(e))
+            return
+        if policy is not None:
+            self.logger.warning("Escalated %s (ID: %s): %s", message.author, message.author.id, policy.describe())
 
     async def handle_forbidden_message(self, message: discord.Message, domain: str):
         """Handle messages containing forbidden domains."""
         try:
-            self.logger.info(f"Deleting forbidden message containing {domain} from {message.author}")
+            self.logger.info("Deleting forbidden message containing %s from %s", domain, message.author)
             await message.delete()
+            if self.bot.database is not None:
+                self.bot.database.log_action(
+                    message.guild.id,
+                    "link_delete",
+                    target_id=message.author.id,
+                    reason=f"Forbidden domain {domain} in #{message.channel}",
+                )
+            # Counted before notifying, a report or warning that fails must not spare the offender
+            await self.record_violation(message, domain)
 
-            self.logger.debug(f"Sending report for {domain} violation by {message.author}")
+            self.logger.debug("Sending report for %s violation by %s", domain, message.author)
             await self.send_report(message.guild, message, domain)
 
             # Send user warning
@@ -233,12 +449,12 @@ class LinkManager(commands.Cog, name="linkmanager"):
                 color=discord.Color.orange()
             )
             await message.channel.send(embed=embed, delete_after=10)
-            self.logger.info(f"Sent user warning for {domain} violation to {message.author}")
+            self.logger.info("Sent user warning for %s violation to %s", domain, message.author)
 
         except discord.Forbidden:
-            self.logger.error(f"Missing permissions in {message.guild.name} (ID: {message.guild.id})")
+            self.logger.error("Missing permissions in %s (ID: %s)", message.guild.name, message.guild.id)
         except Exception as e:
-            self.logger.error(f"Forbidden message handling failed: {str(e)}", exc_info=True)
+            self.logger.error("Forbidden message handling failed: %s", str(e), exc_info=True)
 
 async def setup(bot) -> None:
     """Cog setup function."""
@@ -1,17 +1,132 @@
 
 
+import asyncio
+import csv
+import io
+import json
 import os
-from datetime import datetime
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from typing import Literal
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
+from utils.archive import ChannelArchiver
+from utils.bans import BanCache, MassBan
+from utils.escalation import MAX_TIMEOUT, EscalationPolicy
+from utils.files import AsyncGzipWriter
+from utils.paginator import Paginator
+from utils.purge import PurgeEngine, PurgeFilter
+
+
+REQUIRED_INTENTS = ("guild_messages", "message_content", "members", "moderation")
+
+
+class WarningsPaginator(Paginator):
+    PAGE_SIZE = 10
+
+    def __init__(
+        self, database, user: discord.User, server_id: int, author_id: int, total: int
+    ) -> None:
+        super().__init__(author_id)
+        self.database = database
+        self.user = user
+        self.server_id = server_id
+        self.total = total
+        # The warn ID each page starts after, filled in as pages are visited
+        self.cursors = [0]
+
+    async def get_page(self, index: int) -> tuple:
+        warnings_list = await self.database.get_warnings_page(
+            self.user.id,
+            self.server_id,
+            after_id=self.cursors[index],
+            limit=self.PAGE_SIZE + 1,
+        )
+        has_next = len(warnings_list) > self.PAGE_SIZE
+        warnings_list = warnings_list[: self.PAGE_SIZE]
+        if has_next and len(self.cursors) == index + 1:
+            self.cursors.append(warnings_list[-1][5])
+
+        embed = discord.Embed(title=f"Warnings of {self.user}", color=0xBEBEFE)
+        if len(warnings_list) == 0:
+            embed.description = "This user has no warnings."
+        else:
+            embed.description = "\n".join(
+                f"• Warned by <@{warning[2]}>: **{warning[3][:200]}** (<t:{warning[4]}>) - Warn ID #{warning[5]}"
+                for warning in warnings_list
+            )
+        embed.set_footer(text=f"Page {index + 1} • Total warns: {self.total}")
+        return embed, has_next
+
+
+class Confirm(discord.ui.View):
+    def __init__(self, author_id: int) -> None:
+        super().__init__(timeout=60)
+        self.author_id = author_id
+        self.value = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    @discord.ui.button(label="Confirm", style=discord.ButtonStyle.red)
+    async def confirm(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        self.value = True
+        await interaction.response.defer()
+        self.stop()
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
+    async def cancel(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        self.value = False
+        await interaction.response.defer()
+        self.stop()
+
+
+class MassBanFlags(commands.FlagConverter, prefix="", delimiter=":"):
+    """
+    The options of the `massban` command.
+
+    With the prefix command, the IDs come first and the other options follow as `name: value`,
+    e.g. `massban 123 456 joined_minutes: 30 reason: Spam raid`.
+    """
+
+    user_ids: str = commands.flag(
+        positional=True,
+        default=None,
+        description="The IDs or mentions of the users that should be banned.",
+    )
+    joined_minutes: commands.Range[int, 1, 1440] = commands.flag(
+        default=None,
+        description="Ban the members that joined in the last minutes, at most 1440 (one day).",
+    )
+    reason: str = commands.flag(
+        default="Raid cleanup",
+        description="The reason why the users should be banned.",
+    )
+
 
 class Moderation(commands.Cog, name="moderation"):
     def __init__(self, bot) -> None:
         self.bot = bot
+        self.ban_cache = BanCache()
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild: discord.Guild, user: discord.User) -> None:
+        self.ban_cache.add(guild.id, user.id)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild: discord.Guild, user: discord.User) -> None:
+        self.ban_cache.remove(guild.id, user.id)
 
     @commands.hybrid_command(
         name="kick",
@@ -57,6 +172,13 @@ class Moderation(commands.Cog, name="moderation"):
                     # Couldn't send a message in the private messages of the user
                     pass
                 await member.kick(reason=reason)
+                self.bot.database.log_action(
+                    context.guild.id,
+                    "kick",
+                    target_id=member.id,
+                    moderator_id=context.author.id,
+                    reason=reason,
+                )
             except:
                 embed = discord.Embed(
                     description="An error occurred while trying to kick the user. Make sure my role is above the role of the user you want to kick.",
@@ -89,6 +211,13 @@ class Moderation(commands.Cog, name="moderation"):
         )
         try:
             await member.edit(nick=nickname)
+            self.bot.database.log_action(
+                context.guild.id,
+                "nick",
+                target_id=member.id,
+                moderator_id=context.author.id,
+                reason=f"Nickname set to {nickname}" if nickname else "Nickname reset",
+            )
             embed = discord.Embed(
                 description=f"**{member}'s** new nickname is **{nickname}**!",
                 color=0xBEBEFE,
@@ -145,6 +274,13 @@ class Moderation(commands.Cog, name="moderation"):
                     # Couldn't send a message in the private messages of the user
                     pass
                 await member.ban(reason=reason)
+                self.bot.database.log_action(
+                    context.guild.id,
+                    "ban",
+                    target_id=member.id,
+                    moderator_id=context.author.id,
+                    reason=reason,
+                )
         except:
             embed = discord.Embed(
                 title="Error!",
@@ -166,7 +302,7 @@ class Moderation(commands.Cog, name="moderation"):
         """
         if context.invoked_subcommand is None:
             embed = discord.Embed(
-                description="Please specify a subcommand.\n\n**Subcommands:**\n`add` - Add a warning to a user.\n`remove` - Remove a warning from a user.\n`list` - List all warnings of a user.",
+                description="Please specify a subcommand.\n\n**Subcommands:**\n`add` - Add a warning to a user.\n`remove` - Remove a warning from a user.\n`list` - List all warnings of a user.\n`export` - Export all warnings of the server.",
                 color=0xE02B2B,
             )
             await context.send(embed=embed)
@@ -193,11 +329,18 @@ class Moderation(commands.Cog, name="moderation"):
         member = context.guild.get_member(user.id) or await context.guild.fetch_member(
             user.id
         )
-        total = await self.bot.database.add_warn(
+        warn_id, total = await self.bot.database.add_warn(
             user.id, context.guild.id, context.author.id, reason
         )
+        self.bot.database.log_action(
+            context.guild.id,
+            "warn",
+            target_id=user.id,
+            moderator_id=context.author.id,
+            reason=reason,
+        )
         embed = discord.Embed(
-            description=f"**{member}** was warned by **{context.author}**!\nTotal warns for this user: {total}",
+            description=f"**{member}** was warned by **{context.author}**! (Warn ID #{warn_id})\nTotal warns for this user: {total}",
             color=0xBEBEFE,
         )
         embed.add_field(name="Reason:", value=reason)
@@ -211,6 +354,23 @@ class Moderation(commands.Cog, name="moderation"):
             await context.send(
                 f"{member.mention}, you were warned by **{context.author}**!\nReason: {reason}"
             )
+        try:
+            policy = await self.bot.escalation.escalate(
+                context.guild, user.id, warn_id, f"Escalation of warn #{warn_id}"
+            )
+        except discord.HTTPException:
+            embed = discord.Embed(
+                description="The user reached an escalation threshold, but I couldn't apply it. Make sure my role is above the role of the user.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        if policy is not None:
+            embed = discord.Embed(
+                description=f"**{member}** was escalated automatically: {policy.describe()}",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
 
     @warning.command(
         name="remove",
@@ -235,6 +395,14 @@ class Moderation(commands.Cog, name="moderation"):
             user.id
         )
         total = await self.bot.database.remove_warn(warn_id, user.id, context.guild.id)
+        self.bot.database.log_action(
+            context.guild.id,
+            "unwarn",
+            target_id=user.id,
+            moderator_id=context.author.id,
+            reason=f"Removed warn #{warn_id}",
+        )
+        self.bot.escalation.forget(context.guild.id, user.id)
         embed = discord.Embed(
             description=f"I've removed the warning **#{warn_id}** from **{member}**!\nTotal warns for this user: {total}",
             color=0xBEBEFE,
@@ -254,15 +422,255 @@ class Moderation(commands.Cog, name="moderation"):
         :param context: The hybrid command context.
         :param user: The user you want to get the warnings of.
         """
-        warnings_list = await self.bot.database.get_warnings(user.id, context.guild.id)
-        embed = discord.Embed(title=f"Warnings of {user}", color=0xBEBEFE)
-        description = ""
-        if len(warnings_list) == 0:
-            description = "This user has no warnings."
+        total = await self.bot.database.count_warnings(user.id, context.guild.id)
+        paginator = WarningsPaginator(
+            self.bot.database, user, context.guild.id, context.author.id, total
+        )
+        await paginator.start(context)
+
+    @warning.command(
+        name="export",
+        description="Exports all the warnings of the server to a compressed file.",
+    )
+    @commands.has_permissions(administrator=True)
+    @app_commands.describe(file_format="The format of the export, `ndjson` or `csv`.")
+    async def warning_export(
+        self, context: Context, file_format: Literal["ndjson", "csv"] = "ndjson"
+    ) -> None:
+        """
+        Exports all the warnings of the server to a gzip-compressed NDJSON or CSV file.
+
+        Rows are streamed from the database cursor into the file, so the export never holds the whole result set in memory.
+
+        :param context: The hybrid command context.
+        :param file_format: The format of the export, `ndjson` or `csv`. Default is `ndjson`.
+        """
+        await context.defer()
+        directory = await asyncio.to_thread(tempfile.mkdtemp, prefix="warns-export-")
+        path = f"{directory}/warns-{context.guild.id}.{file_format}.gz"
+        try:
+            async with AsyncGzipWriter(path) as writer:
+                if file_format == "csv":
+                    await writer.write_lines(
+                        ["user_id,moderator_id,reason,created_at,warn_id\n"]
+                    )
+                exported = 0
+                async for batch in self.bot.database.iter_server_warnings(
+                    context.guild.id
+                ):
+                    # A CSV batch is written as a single chunk, count the rows rather than the chunks
+                    await writer.write_lines(self.format_warnings(batch, file_format))
+                    exported += len(batch)
+
+            size = await asyncio.to_thread(os.path.getsize, path)
+            if size > context.guild.filesize_limit:
+                embed = discord.Embed(
+                    description=f"The export of {exported} warnings is {size // 1024} KiB, which is above the upload limit of this server.",
+                    color=0xE02B2B,
+                )
+                await context.send(embed=embed)
+                return
+            embed = discord.Embed(
+                description=f"Exported **{exported}** warnings.",
+                color=0xBEBEFE,
+            )
+            await context.send(embed=embed, file=discord.File(path))
+        finally:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+
+    @staticmethod
+    def format_warnings(batch: list, file_format: str) -> list:
+        """
+        Formats a batch of (user_id, moderator_id, reason, created_at, id) rows as export lines.
+
+        :param batch: The rows to format.
+        :param file_format: The format of the export, `ndjson` or `csv`.
+        """
+        if file_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows(batch)
+            return [buffer.getvalue()]
+        return [
+            json.dumps(
+                {
+                    "warn_id": warn_id,
+                    "user_id": user_id,
+                    "moderator_id": moderator_id,
+                    "reason": reason,
+                    "created_at": int(created_at),
+                }
+            )
+            + "\n"
+            for user_id, moderator_id, reason, created_at, warn_id in batch
+        ]
+
+    @commands.hybrid_group(
+        name="escalation",
+        description="Manage the automatic actions applied to users collecting warns.",
+    )
+    @commands.has_permissions(administrator=True)
+    async def escalation(self, context: Context) -> None:
+        """
+        Manage the automatic actions applied to users collecting warns.
+
+        :param context: The hybrid command context.
+        """
+        if context.invoked_subcommand is None:
+            embed = discord.Embed(
+                description="Please specify a subcommand.\n\n**Subcommands:**\n`add` - Add an escalation policy.\n`remove` - Remove an escalation policy.\n`list` - List the escalation policies of the server.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+
+    @escalation.command(
+        name="add",
+        description="Adds an action applied when a user collects enough warns in a time window.",
+    )
+    @commands.has_permissions(administrator=True)
+    @app_commands.describe(
+        warns="The number of warns that triggers the action.",
+        hours="The time window the warns are counted in, in hours.",
+        action="The action to apply.",
+        timeout_minutes="The duration of a timeout, in minutes.",
+    )
+    async def escalation_add(
+        self,
+        context: Context,
+        warns: int,
+        hours: int,
+        action: Literal["timeout", "kick", "ban"],
+        timeout_minutes: int = 60,
+    ) -> None:
+        """
+        Adds an action applied when a user collects enough warns in a time window.
+
+        :param context: The hybrid command context.
+        :param warns: The number of warns that triggers the action.
+        :param hours: The time window the warns are counted in, in hours.
+        :param action: The action to apply, `timeout`, `kick` or `ban`.
+        :param timeout_minutes: The duration of a timeout, in minutes. Default is 60.
+        """
+        if warns < 1 or hours < 1 or timeout_minutes < 1:
+            embed = discord.Embed(
+                description="The number of warns, hours and minutes must be positive.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        policy = EscalationPolicy(
+            warns,
+            hours * 3600,
+            action,
+            min(timeout_minutes * 60, MAX_TIMEOUT) if action == "timeout" else None,
+        )
+        await self.bot.escalation.set_policy(context.guild.id, policy)
+        embed = discord.Embed(
+            description=f"Added the escalation policy: {policy.describe()}",
+            color=0xBEBEFE,
+        )
+        await context.send(embed=embed)
+
+    @escalation.command(
+        name="remove",
+        description="Removes an escalation policy.",
+    )
+    @commands.has_permissions(administrator=True)
+    @app_commands.describe(
+        warns="The number of warns of the policy.",
+        hours="The time window of the policy, in hours.",
+    )
+    async def escalation_remove(self, context: Context, warns: int, hours: int) -> None:
+        """
+        Removes an escalation policy.
+
+        :param context: The hybrid command context.
+        :param warns: The number of warns of the policy.
+        :param hours: The time window of the policy, in hours.
+        """
+        if await self.bot.escalation.remove_policy(context.guild.id, warns, hours * 3600):
+            embed = discord.Embed(
+                description=f"Removed the escalation policy for {warns} warns in {hours}h.",
+                color=0xBEBEFE,
+            )
+        else:
+            embed = discord.Embed(
+                description=f"There is no escalation policy for {warns} warns in {hours}h.",
+                color=0xE02B2B,
+            )
+        await context.send(embed=embed)
+
+    @escalation.command(
+        name="list",
+        description="Shows the escalation policies of the server.",
+    )
+    @commands.has_permissions(administrator=True)
+    async def escalation_list(self, context: Context) -> None:
+        """
+        Shows the escalation policies of the server.
+
+        :param context: The hybrid command context.
+        """
+        policies = await self.bot.escalation.get_policies(context.guild.id)
+        embed = discord.Embed(title="Escalation policies", color=0xBEBEFE)
+        if not policies:
+            embed.description = "This server has no escalation policies."
         else:
-            for warning in warnings_list:
-                description += f"• Warned by <@{warning[2]}>: **{warning[3]}** (<t:{warning[4]}>) - Warn ID #{warning[5]}\n"
-        embed.description = description
+            embed.description = "\n".join(
+                f"• {policy.describe()}"
+                for policy in sorted(policies, key=lambda policy: (policy.threshold, policy.window))
+            )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="modlog",
+        description="Shows the recent moderation actions of the server.",
+    )
+    @commands.has_guild_permissions(manage_messages=True)
+    @app_commands.describe(
+        user="The user to show the actions of. Default is every user.",
+        role="Whether the user is the target or the moderator of the actions.",
+        limit="The number of actions to show, up to 25.",
+    )
+    async def modlog(
+        self,
+        context: Context,
+        user: discord.User = None,
+        role: Literal["target", "moderator"] = "target",
+        limit: int = 15,
+    ) -> None:
+        """
+        Shows the recent moderation actions of the server, newest first.
+
+        :param context: The hybrid command context.
+        :param user: The user to show the actions of. Default is None, which shows every action.
+        :param role: Whether the user is the target or the moderator of the actions. Default is "target".
+        :param limit: The number of actions to show. Default is 15.
+        """
+        actions = await self.bot.database.get_mod_actions(
+            context.guild.id,
+            target_id=user.id if user is not None and role == "target" else None,
+            moderator_id=user.id if user is not None and role == "moderator" else None,
+            limit=min(max(1, limit), 25),
+        )
+        title = "Moderation log"
+        if user is not None:
+            title += f" {'of' if role == 'target' else 'by'} {user}"
+        embed = discord.Embed(title=title, color=0xBEBEFE)
+        if not actions:
+            embed.description = "No moderation actions found."
+            await context.send(embed=embed)
+            return
+        lines = []
+        for action, target_id, moderator_id, reason, created_at in actions:
+            line = f"<t:{created_at}:R> **{action}**"
+            if target_id is not None:
+                line += f" <@{target_id}>"
+            line += f" by <@{moderator_id}>" if moderator_id is not None else " (automatic)"
+            if reason:
+                line += f" - {reason[:100]}"
+            lines.append(line)
+        # Embed descriptions are limited to 4096 characters
+        embed.description = "\n".join(lines)[:4096]
         await context.send(embed=embed)
 
     @commands.hybrid_command(
@@ -283,12 +691,167 @@ class Moderation(commands.Cog, name="moderation"):
             "Deleting messages..."
         )  # Bit of a hacky way to make sure the bot responds to the interaction and doens't get a "Unknown Interaction" response
         purged_messages = await context.channel.purge(limit=amount + 1)
+        self.bot.database.log_action(
+            context.guild.id,
+            "purge",
+            moderator_id=context.author.id,
+            reason=f"{len(purged_messages)-1} messages in #{context.channel}",
+        )
         embed = discord.Embed(
             description=f"**{context.author}** cleared **{len(purged_messages)-1}** messages!",
             color=0xBEBEFE,
         )
         await context.channel.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="cleanup",
+        description="Delete the messages matching filters across the channels of the server.",
+    )
+    @commands.has_guild_permissions(manage_messages=True)
+    @commands.bot_has_guild_permissions(manage_messages=True, read_message_history=True)
+    @app_commands.describe(
+        users="Mentions or IDs of the users whose messages should be deleted.",
+        pattern="A regular expression the messages should match.",
+        has_link="Only delete messages containing a link.",
+        forbidden="Only delete messages linking a forbidden domain of the server.",
+        minutes="Only delete messages sent in the last minutes. Default is 1440 (one day).",
+        until_minutes="Only delete messages sent at least this many minutes ago. Default is 0, up to now.",
+        channel="Only clean this channel instead of every text channel.",
+        limit="The maximum number of messages scanned per channel.",
+    )
+    async def cleanup(
+        self,
+        context: Context,
+        users: str = None,
+        pattern: str = None,
+        has_link: bool = False,
+        forbidden: bool = False,
+        minutes: int = 1440,
+        until_minutes: int = 0,
+        channel: discord.TextChannel = None,
+        limit: int = 1000,
+    ) -> None:
+        """
+        Delete the messages matching filters across the channels of the server.
+
+        Channels are scanned a few at a time, recent matches are bulk deleted by chunks of 100 and older ones one by one.
+
+        :param context: The hybrid command context.
+        :param users: Mentions or IDs of the users whose messages should be deleted.
+        :param pattern: A regular expression the messages should match.
+        :param has_link: Only delete messages containing a link. Default is False.
+        :param forbidden: Only delete messages linking a forbidden domain of the server. Default is False.
+        :param minutes: Only delete messages sent in the last minutes. Default is 1440.
+        :param until_minutes: Only delete messages sent at least this many minutes ago, with `minutes` it selects a time range. Default is 0.
+        :param channel: Only clean this channel. Default is None, which cleans every text channel.
+        :param limit: The maximum number of messages scanned per channel. Default is 1000.
+        """
+        forbidden_matcher = None
+        if forbidden:
+            linkmanager = self.bot.get_cog("linkmanager")
+            if linkmanager is None:
+                embed = discord.Embed(
+                    description="The link manager is not loaded.", color=0xE02B2B
+                )
+                await context.send(embed=embed)
+                return
+            guild_id = context.guild.id
+            forbidden_matcher = lambda content: linkmanager.find_forbidden_domain(
+                guild_id, content
+            )
+        try:
+            compiled = re.compile(pattern[:200]) if pattern else None
+        except re.error as e:
+            embed = discord.Embed(
+                description=f"The pattern is not a valid regular expression: {e}",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+
+        minutes = max(1, minutes)
+        if until_minutes < 0 or until_minutes >= minutes:
+            embed = discord.Embed(
+                description="`until_minutes` must be between 0 and `minutes`, the range goes from `minutes` ago to `until_minutes` ago.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+
+        message_filter = PurgeFilter(
+            authors={int(user_id) for user_id in re.findall(r"\d{15,20}", users or "")},
+            pattern=compiled,
+            has_link=has_link,
+            forbidden_matcher=forbidden_matcher,
+            exclude={context.message.id} if context.message else set(),
+        )
+        if message_filter.is_empty():
+            embed = discord.Embed(
+                description="Please give at least one filter: `users`, `pattern`, `has_link` or `forbidden`.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+
+        me = context.guild.me
+        channels = [channel] if channel else context.guild.text_channels
+        channels = [
+            text_channel
+            for text_channel in channels
+            if text_channel.permissions_for(me).manage_messages
+            and text_channel.permissions_for(me).read_message_history
+        ]
+        now = discord.utils.utcnow()
+        engine = PurgeEngine(
+            channels,
+            message_filter,
+            after=now - timedelta(minutes=minutes),
+            before=now - timedelta(minutes=until_minutes) if until_minutes else None,
+            scan_limit=max(1, limit),
+        )
+        status = await context.send(
+            embed=discord.Embed(
+                description=f"Cleaning {len(channels)} channel(s)...", color=0xBEBEFE
+            )
+        )
+        engine.filter.exclude.add(status.id)
+
+        def report() -> discord.Embed:
+            scanned_rate, deleted_rate = engine.throughput()
+            embed = discord.Embed(
+                description=f"**{context.author}** cleaned up **{engine.deleted}** messages!",
+                color=0xBEBEFE,
+            )
+            embed.add_field(
+                name="Channels", value=f"{engine.channels_done}/{len(channels)}"
+            )
+            embed.add_field(
+                name="Scanned", value=f"{engine.scanned} ({scanned_rate:.0f}/s)"
+            )
+            embed.add_field(
+                name="Deleted", value=f"{engine.deleted} ({deleted_rate:.1f}/s)"
+            )
+            embed.add_field(name="Failed", value=str(engine.failed))
+            embed.set_footer(text=f"Took {engine.elapsed:.1f}s")
+            return embed
+
+        task = asyncio.create_task(engine.run())
+        while not task.done():
+            await asyncio.wait({task}, timeout=5)
+            if not task.done():
+                try:
+                    await status.edit(embed=report())
+                except discord.HTTPException:
+                    pass
+        await task
+        self.bot.database.log_action(
+            context.guild.id,
+            "cleanup",
+            moderator_id=context.author.id,
+            reason=f"{engine.deleted} messages in {len(channels)} channel(s)",
+        )
+        await status.edit(embed=report())
+
     @commands.hybrid_command(
         name="hackban",
         description="Bans a user without the user having to be in the server.",
@@ -311,6 +874,13 @@ class Moderation(commands.Cog, name="moderation"):
         """
         try:
             await self.bot.http.ban(user_id, context.guild.id, reason=reason)
+            self.bot.database.log_action(
+                context.guild.id,
+                "ban",
+                target_id=int(user_id),
+                moderator_id=context.author.id,
+                reason=reason,
+            )
             user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(
                 int(user_id)
             )
@@ -327,42 +897,183 @@ class Moderation(commands.Cog, name="moderation"):
             )
             await context.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="massban",
+        description="Bans many users at once, e.g. to clean up a raid.",
+    )
+    @commands.has_permissions(ban_members=True)
+    @commands.bot_has_permissions(ban_members=True)
+    @app_commands.describe(
+        attachment="A text file containing the IDs of the users that should be banned.",
+    )
+    async def massban(
+        self,
+        context: Context,
+        attachment: discord.Attachment = None,
+        *,
+        flags: MassBanFlags,
+    ) -> None:
+        """
+        Bans many users at once, e.g. to clean up a raid.
+
+        Users can be given as a list of IDs, a text file of IDs and/or the members that joined in the last minutes.
+        Already banned users are skipped using a cached ban list.
+
+        :param context: The hybrid command context.
+        :param attachment: A text file containing the IDs of the users that should be banned.
+        :param flags: The IDs of the users, the minutes within which members joined and the reason for the bans.
+        """
+        await context.defer()
+        reason = flags.reason
+        joined_minutes = flags.joined_minutes
+        candidates = set(int(user_id) for user_id in re.findall(r"\d{15,20}", flags.user_ids or ""))
+        if attachment is not None:
+            content = (await attachment.read()).decode("utf-8", errors="ignore")
+            candidates.update(int(user_id) for user_id in re.findall(r"\d{15,20}", content))
+        # Members looked up here, the member cache may be disabled
+        members = {}
+        if joined_minutes is not None:
+            since = discord.utils.utcnow() - timedelta(minutes=min(max(1, joined_minutes), 1440))
+            joined = (
+                context.guild.members
+                if context.guild.chunked
+                else [member async for member in context.guild.fetch_members(limit=None)]
+            )
+            for member in joined:
+                if member.joined_at is not None and member.joined_at >= since:
+                    candidates.add(member.id)
+                    members[member.id] = member
+        unknown = [
+            user_id
+            for user_id in candidates
+            if user_id not in members and context.guild.get_member(user_id) is None
+        ]
+        # Fetch the uncached candidates over the gateway, 100 per request, to check their permissions
+        for start in range(0, len(unknown), 100):
+            for member in await context.guild.query_members(
+                user_ids=unknown[start : start + 100], cache=False
+            ):
+                members[member.id] = member
+
+        # Never ban ourselves, the moderator or administrators
+        protected = {context.author.id, self.bot.user.id, context.guild.owner_id}
+        for user_id in list(candidates):
+            member = members.get(user_id) or context.guild.get_member(user_id)
+            if member is not None and member.guild_permissions.administrator:
+                protected.add(user_id)
+        banned = await self.ban_cache.get(context.guild)
+        to_ban = sorted(candidates - protected - banned)
+        skipped = len(candidates) - len(to_ban)
+
+        if not to_ban:
+            embed = discord.Embed(
+                description=f"There is nobody to ban ({skipped} user(s) skipped).",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+
+        confirm = Confirm(context.author.id)
+        embed = discord.Embed(
+            description=f"This will ban **{len(to_ban)}** user(s) ({skipped} already banned or protected).\nReason: {reason}",
+            color=0xE02B2B,
+        )
+        status = await context.send(embed=embed, view=confirm)
+        await confirm.wait()
+        if not confirm.value:
+            embed = discord.Embed(description="Mass ban cancelled.", color=0xE02B2B)
+            await status.edit(embed=embed, view=None)
+            return
+
+        mass_ban = MassBan(
+            context.guild,
+            to_ban,
+            reason=f"{reason} (mass ban by {context.author})",
+            ban_cache=self.ban_cache,
+        )
+
+        def report(title: str) -> discord.Embed:
+            embed = discord.Embed(title=title, color=0xBEBEFE)
+            embed.add_field(name="Progress", value=f"{mass_ban.done}/{len(to_ban)}")
+            embed.add_field(name="Banned", value=str(mass_ban.banned))
+            embed.add_field(name="Failed", value=str(mass_ban.failed))
+            embed.add_field(name="Skipped", value=str(skipped))
+            embed.add_field(name="Throughput", value=f"{mass_ban.throughput():.1f} bans/s")
+            embed.set_footer(text=f"Elapsed: {mass_ban.elapsed:.1f}s")
+            return embed
+
+        task = asyncio.create_task(mass_ban.run())
+        while not task.done():
+            await asyncio.wait({task}, timeout=2)
+            if not task.done():
+                try:
+                    await status.edit(embed=report("Mass ban in progress..."), view=None)
+                except discord.HTTPException:
+                    pass
+        await task
+        for user_id in mass_ban.banned_ids:
+            self.bot.database.log_action(
+                context.guild.id,
+                "massban",
+                target_id=user_id,
+                moderator_id=context.author.id,
+                reason=reason,
+            )
+        await status.edit(
+            embed=report(f"Mass ban by {context.author} finished"), view=None
+        )
+
     @commands.hybrid_command(
         name="archive",
-        description="Archives in a text file the last messages with a chosen limit of messages.",
+        description="Archives in compressed text files the last messages with a chosen limit of messages.",
     )
     @commands.has_permissions(manage_messages=True)
     @app_commands.describe(
-        limit="The limit of messages that should be archived.",
+        limit="The limit of messages that should be archived, 0 for the whole channel.",
     )
     async def archive(self, context: Context, limit: int = 10) -> None:
         """
-        Archives in a text file the last messages with a chosen limit of messages. This command requires the MESSAGE_CONTENT intent to work properly.
+        Archives in compressed text files the last messages with a chosen limit of messages. This command requires the MESSAGE_CONTENT intent to work properly.
+
+        Messages are streamed to gzip files in a temporary folder and split into parts below the upload limit of the server.
+        An interrupted archive of the same channel with the same limit resumes from its last checkpoint.
 
-        :param limit: The limit of messages that should be archived. Default is 10.
+        :param context: The hybrid command context.
+        :param limit: The limit of messages that should be archived, 0 for the whole channel. Default is 10.
         """
-        log_file = f"{context.channel.id}.log"
-        with open(log_file, "w", encoding="UTF-8") as f:
-            f.write(
-                f'Archived messages from: #{context.channel} ({context.channel.id}) in the guild "{context.guild}" ({context.guild.id}) at {datetime.now().strftime("%d.%m.%Y %H:%M:%S")}\n'
+        archiver = ChannelArchiver(
+            context.channel,
+            context.guild,
+            limit=max(0, limit),
+            before=context.message,
+            max_part_size=context.guild.filesize_limit,
+        )
+        status = await context.send(
+            embed=discord.Embed(description="Archiving messages...", color=0xBEBEFE)
+        )
+        started = time.monotonic()
+
+        async def on_progress(archiver: ChannelArchiver) -> None:
+            elapsed = time.monotonic() - started
+            embed = discord.Embed(
+                description=f"Archiving messages... **{archiver.state['messages']}** archived in {len(archiver.parts)} part(s) ({archiver.state['messages'] / elapsed:.0f} messages/s).",
+                color=0xBEBEFE,
             )
-            async for message in context.channel.history(
-                limit=limit, before=context.message
-            ):
-                attachments = []
-                for attachment in message.attachments:
-                    attachments.append(attachment.url)
-                attachments_text = (
-                    f"[Attached File{'s' if len(attachments) >= 2 else ''}: {', '.join(attachments)}]"
-                    if len(attachments) >= 1
-                    else ""
-                )
-                f.write(
-                    f"{message.created_at.strftime('%d.%m.%Y %H:%M:%S')} {message.author} {message.id}: {message.clean_content} {attachments_text}\n"
-                )
-        f = discord.File(log_file)
-        await context.send(file=f)
-        os.remove(log_file)
+            try:
+                await status.edit(embed=embed)
+            except discord.HTTPException:
+                pass
+
+        parts = await archiver.run(on_progress)
+        elapsed = time.monotonic() - started
+        embed = discord.Embed(
+            description=f"Archived **{archiver.state['messages']}** messages in {len(parts)} part(s) in {elapsed:.1f}s{' (resumed)' if archiver.resumed else ''}.",
+            color=0xBEBEFE,
+        )
+        await status.edit(embed=embed)
+        for part in parts:
+            await context.send(file=discord.File(part))
+        await asyncio.to_thread(shutil.rmtree, archiver.directory, True)
 
 
 async def setup(bot) -> None:
@@ -1,14 +1,53 @@
 
 
+import asyncio
+import cProfile
+import io
+import os
+import time
+import tracemalloc
+from typing import Literal
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
+from utils.intents import missing_intents
+from utils.profiling import (
+    CONTAINERS,
+    SamplingProfiler,
+    cprofile_report,
+    deep_size,
+    snapshot_report,
+)
+from utils.recorder import RECORDINGS_ROOT, GatewayRecorder
+
+
+REQUIRED_INTENTS = ()
+
 
 class Owner(commands.Cog, name="owner"):
     def __init__(self, bot) -> None:
         self.bot = bot
+        self.profiling = False
+        self.last_snapshot = None
+        self.recorder = None
+        self.recording_timer = None
+
+    def intents_warning(self, cog: str) -> str:
+        """
+        This function will warn about the intents a cog needs that the bot wasn't started with.
+
+        :param cog: The name of the cog.
+        :return: The warning, or an empty string.
+        """
+        missing = missing_intents(
+            self.bot.intents, os.path.join(os.path.dirname(__file__), f"{cog}.py")
+        )
+        if not missing:
+            return ""
+        return f"\n⚠️ The bot runs without the intents {', '.join(missing)}, which this cog needs. Restart it to enable them."
 
     @commands.command(
         name="sync",
@@ -106,8 +145,11 @@ class Owner(commands.Cog, name="owner"):
             )
             await context.send(embed=embed)
             return
+        # Lets the cogs caching data about the loaded commands, like the help pages, rebuild it
+        self.bot.dispatch("extensions_changed")
         embed = discord.Embed(
-            description=f"Successfully loaded the `{cog}` cog.", color=0xBEBEFE
+            description=f"Successfully loaded the `{cog}` cog.{self.intents_warning(cog)}",
+            color=0xBEBEFE,
         )
         await context.send(embed=embed)
 
@@ -132,6 +174,8 @@ class Owner(commands.Cog, name="owner"):
             )
             await context.send(embed=embed)
             return
+        # Lets the cogs caching data about the loaded commands, like the help pages, rebuild it
+        self.bot.dispatch("extensions_changed")
         embed = discord.Embed(
             description=f"Successfully unloaded the `{cog}` cog.", color=0xBEBEFE
         )
@@ -158,8 +202,11 @@ class Owner(commands.Cog, name="owner"):
             )
             await context.send(embed=embed)
             return
+        # Lets the cogs caching data about the loaded commands, like the help pages, rebuild it
+        self.bot.dispatch("extensions_changed")
         embed = discord.Embed(
-            description=f"Successfully reloaded the `{cog}` cog.", color=0xBEBEFE
+            description=f"Successfully reloaded the `{cog}` cog.{self.intents_warning(cog)}",
+            color=0xBEBEFE,
         )
         await context.send(embed=embed)
 
@@ -178,6 +225,456 @@ class Owner(commands.Cog, name="owner"):
         await context.send(embed=embed)
         await self.bot.close()
 
+    @commands.hybrid_command(
+        name="clusters",
+        description="Shows the health of every cluster of the bot.",
+    )
+    @commands.is_owner()
+    async def clusters(self, context: Context) -> None:
+        """
+        Shows the health of every cluster of the bot, as last reported to the database.
+
+        :param context: The hybrid command context.
+        """
+        reports = await self.bot.database.get_cluster_health()
+        embed = discord.Embed(title="Clusters", color=0xBEBEFE)
+        if not reports:
+            embed.description = "No cluster has reported its health yet."
+        now = int(time.time())
+        for (
+            cluster_id,
+            shard_ids,
+            pid,
+            guilds,
+            latency,
+            events_per_second,
+            top_events,
+            started_at,
+            updated_at,
+        ) in reports[:25]:
+            # A cluster reports every 30 seconds, one silent for much longer is down
+            state = "🟢" if now - updated_at < 90 else "🔴"
+            events = ", ".join(f"{event} {rate}/s" for event, rate in top_events.items())
+            shards = f"{shard_ids[0]}-{shard_ids[-1]}" if shard_ids else "none"
+            embed.add_field(
+                name=f"{state} Cluster {cluster_id}{' (this one)' if cluster_id == self.bot.cluster_id else ''}",
+                value=(
+                    f"Shards: {shards} | PID {pid}\n"
+                    f"Guilds: {guilds} | Latency: {f'{latency * 1000:.0f}ms' if latency is not None else 'n/a'}\n"
+                    f"Events: {events_per_second:.1f}/s ({events or 'none'})\n"
+                    f"Up since <t:{started_at}:R>, reported <t:{updated_at}:R>"
+                )[:1024],
+                inline=False,
+            )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="stats",
+        description="Shows the metrics of the bot: messages, commands, database and LLM latencies.",
+    )
+    @commands.is_owner()
+    async def stats(self, context: Context) -> None:
+        """
+        Shows a summary of the metrics the bot records, the full set is served in the Prometheus format.
+
+        :param context: The hybrid command context.
+        """
+        metrics = self.bot.metrics.metrics
+        uptime = int(time.time()) - self.bot.started_at
+        embed = discord.Embed(title="Stats", color=0xBEBEFE)
+        latency = self.bot.latency
+        embed.description = (
+            f"Up since <t:{self.bot.started_at}:R> ({uptime // 3600}h {uptime % 3600 // 60}m) | "
+            f"{len(self.bot.guilds)} guilds | "
+            f"Latency: {f'{latency * 1000:.0f}ms' if latency == latency else 'n/a'}"
+        )
+        if self.bot.metrics_server is not None:
+            embed.description += (
+                f"\nMetrics: `http://{self.bot.metrics_server.host}:{self.bot.metrics_server.port}/metrics`"
+            )
+
+        messages = metrics["bot_messages_total"].values
+        if messages:
+            embed.add_field(
+                name="Messages",
+                value=", ".join(
+                    f"{verdict} {value.value:.0f}" for (verdict,), value in sorted(messages.items())
+                ),
+                inline=False,
+            )
+        sections = (
+            ("Message stages", "bot_message_stage_seconds", 10),
+            ("Commands", "bot_command_seconds", 10),
+            ("Database", "bot_db_seconds", 10),
+            ("LLM requests", "bot_llm_request_seconds", 5),
+        )
+        for title, name, limit in sections:
+            metric = metrics.get(name)
+            if metric is None or not metric.values:
+                continue
+            # The busiest series first
+            series = sorted(metric.values.items(), key=lambda item: item[1].count, reverse=True)
+            lines = [
+                f"`{key[0]}` {value.count} | avg {value.average * 1000:.1f}ms | "
+                f"p50 {value.quantile(0.5) * 1000:.1f}ms | p95 {value.quantile(0.95) * 1000:.1f}ms"
+                for key, value in series[:limit]
+                if value.count
+            ]
+            if lines:
+                embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+        if self.bot.database is not None:
+            cache = self.bot.database.warnings_cache.stats()
+            embed.add_field(
+                name="Warnings cache",
+                value=(
+                    f"{cache['entries']} users | hit rate {cache['hit_rate']:.0%} "
+                    f"({cache['hits']} hits, {cache['misses']} misses) | "
+                    f"{cache['invalidations']} invalidations, {cache['evictions']} evictions"
+                ),
+                inline=False,
+            )
+        costs = metrics.get("bot_llm_cost_dollars_total")
+        if costs is not None and costs.values:
+            embed.add_field(
+                name="LLM costs since start",
+                value=", ".join(f"{kind} ${value.value:.4f}" for (kind,), value in costs.values.items()),
+                inline=False,
+            )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="profile",
+        description="Profiles the bot for some seconds and uploads the report.",
+    )
+    @app_commands.describe(
+        seconds="How long to profile, from 1 to 300 seconds",
+        mode="`sampling` samples the event loop without slowing it down, `cprofile` traces every call",
+    )
+    @commands.is_owner()
+    async def profile(
+        self,
+        context: Context,
+        seconds: int = 10,
+        mode: Literal["sampling", "cprofile"] = "sampling",
+    ) -> None:
+        """
+        Profiles the bot while it keeps running, then uploads the report.
+
+        :param context: The hybrid command context.
+        :param seconds: How long to profile, from 1 to 300 seconds.
+        :param mode: `sampling` samples the stack of the event loop every 5ms, `cprofile` traces every call.
+        """
+        if self.profiling:
+            embed = discord.Embed(
+                description="A profiling session is already running.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        seconds = max(1, min(seconds, 300))
+        await context.defer()
+        self.profiling = True
+        try:
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.disable()
+                report = cprofile_report(profiler)
+            else:
+                # Started from the event loop's thread, the one it samples
+                profiler = SamplingProfiler()
+                profiler.start()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.stop()
+                report = profiler.report()
+        finally:
+            self.profiling = False
+        embed = discord.Embed(
+            description=f"Profiled the bot for {seconds} seconds with `{mode}`, the report is attached.",
+            color=0xBEBEFE,
+        )
+        await context.send(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO(report.encode("utf-8")),
+                filename=f"profile-{mode}-{int(time.time())}.txt",
+            ),
+        )
+
+    @commands.hybrid_command(
+        name="memory",
+        description="Traces the memory allocations of the bot and uploads snapshots of them.",
+    )
+    @app_commands.describe(
+        action="`start` the tracing, take a `snapshot` compared to the previous one, or `stop` the tracing",
+        frames="The number of frames stored per allocation when starting",
+    )
+    @commands.is_owner()
+    async def memory(
+        self,
+        context: Context,
+        action: Literal["start", "snapshot", "stop"] = "snapshot",
+        frames: int = 1,
+    ) -> None:
+        """
+        Traces the memory allocations with tracemalloc, which slows the bot down while it runs.
+
+        :param context: The hybrid command context.
+        :param action: `start` the tracing, take a `snapshot` compared to the previous one, or `stop` the tracing.
+        :param frames: The number of frames stored per allocation when starting.
+        """
+        if action == "start":
+            if tracemalloc.is_tracing():
+                description = "The memory is already being traced."
+            else:
+                tracemalloc.start(max(1, min(frames, 25)))
+                self.last_snapshot = None
+                description = "Started tracing the memory, take snapshots with `memory snapshot`."
+            await context.send(embed=discord.Embed(description=description, color=0xBEBEFE))
+            return
+        if not tracemalloc.is_tracing():
+            embed = discord.Embed(
+                description="The memory isn't being traced, start with `memory start`.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        if action == "stop":
+            tracemalloc.stop()
+            self.last_snapshot = None
+            embed = discord.Embed(description="Stopped tracing the memory.", color=0xBEBEFE)
+            await context.send(embed=embed)
+            return
+
+        await context.defer()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        report = snapshot_report(snapshot, self.last_snapshot)
+        compared = self.last_snapshot is not None
+        self.last_snapshot = snapshot
+        embed = discord.Embed(
+            description=(
+                f"Traced memory: {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB. "
+                f"The top allocations{', compared to the previous snapshot,' if compared else ''} are attached."
+            ),
+            color=0xBEBEFE,
+        )
+        await context.send(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO(report.encode("utf-8")),
+                filename=f"memory-{int(time.time())}.txt",
+            ),
+        )
+
+    def memory_structures(self) -> list:
+        """
+        This function will list the in-memory structures of the cogs and the bot worth measuring.
+
+        The containers held by the cogs are found by themselves, and so are the ones held by the
+        helpers of the cogs, like the ban cache of the moderation cog.
+
+        :return: A list of (name, structure) tuples.
+        """
+        structures = []
+        for cog in self.bot.cogs.values():
+            for attribute, value in vars(cog).items():
+                name = f"{type(cog).__name__}.{attribute}"
+                if isinstance(value, CONTAINERS):
+                    structures.append((name, value))
+                elif type(value).__module__.startswith(("utils.", "database.")):
+                    structures += [
+                        (f"{name}.{inner}", inner_value)
+                        for inner, inner_value in vars(value).items()
+                        if isinstance(inner_value, CONTAINERS)
+                    ]
+        if self.bot.database is not None:
+            structures.append(("DatabaseManager.warnings_cache", self.bot.database.warnings_cache.entries))
+        structures.append(("HTTPClient.cache", self.bot.http_client._cache))
+        structures.append(("DiscordBot.event_counts", self.bot.event_counts))
+        return structures
+
+    @commands.hybrid_command(
+        name="sizes",
+        description="Reports the size of the big in-memory structures of the bot.",
+    )
+    @commands.is_owner()
+    async def sizes(self, context: Context) -> None:
+        """
+        Reports the entries and memory of the structures of the cogs and the caches, and the size of the Discord cache.
+
+        :param context: The hybrid command context.
+        """
+        rows = []
+        for name, structure in self.memory_structures():
+            size, objects, truncated = deep_size(structure)
+            rows.append((name, len(structure), size, objects, truncated))
+        rows.sort(key=lambda row: row[2], reverse=True)
+
+        lines = [f"{'structure':<48} {'entries':>9} {'size':>12} {'objects':>9}"]
+        for name, entries, size, objects, truncated in rows:
+            lines.append(
+                f"{name:<48} {entries:>9} {size / 1024:>10.1f}KiB {objects:>9}{' (at least)' if truncated else ''}"
+            )
+        discord_cache = {
+            "guilds": len(self.bot.guilds),
+            "users": len(self.bot.users),
+            "members": sum(len(guild.members) for guild in self.bot.guilds),
+            "channels": sum(len(guild.channels) for guild in self.bot.guilds),
+            "messages": len(self.bot.cached_messages),
+        }
+        lines += ["", "Discord cache:"]
+        lines += [f"{name:<48} {count:>9}" for name, count in discord_cache.items()]
+
+        embed = discord.Embed(title="Memory structures", color=0xBEBEFE)
+        embed.description = "\n".join(
+            f"`{name}` {entries} entries, {size / 1024:.1f} KiB"
+            for name, entries, size, _, _ in rows[:10]
+        )[:4096]
+        embed.add_field(
+            name="Discord cache",
+            value=", ".join(f"{count} {name}" for name, count in discord_cache.items()),
+            inline=False,
+        )
+        await context.send(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO("\n".join(lines).encode("utf-8")),
+                filename=f"sizes-{int(time.time())}.txt",
+            ),
+        )
+
+    @commands.hybrid_command(
+        name="stalls",
+        description="Shows the recent times the event loop was blocked, and by what.",
+    )
+    @commands.is_owner()
+    async def stalls(self, context: Context) -> None:
+        """
+        Shows the recent event loop stalls caught by the watchdog, with their stacks attached.
+
+        :param context: The hybrid command context.
+        """
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            embed = discord.Embed(
+                description="The watchdog is disabled, set `watchdog_threshold` in the config to enable it.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        stalls = list(watchdog.stalls)
+        embed = discord.Embed(title="Event loop stalls", color=0xBEBEFE)
+        embed.description = (
+            f"Threshold: {watchdog.threshold * 1000:.0f}ms | Worst lag since start: {watchdog.max_lag * 1000:.0f}ms"
+        )
+        if not stalls:
+            embed.description += "\nThe event loop hasn't been blocked past the threshold."
+            await context.send(embed=embed)
+            return
+        for stall in reversed(stalls[-10:]):
+            embed.add_field(
+                name=f"<t:{int(stall.started_at)}:R> for {stall.duration:.2f}s",
+                value=(
+                    f"`{stall.location or 'unknown code'}`\n"
+                    f"Cog: {stall.cog or 'none'} | Command: {stall.command or 'none'} | Task: {stall.task or 'none'}"
+                )[:1024],
+                inline=False,
+            )
+        report = "\n\n".join(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stall.started_at))} {stall.describe()}\n{stall.stack or 'No stack captured, the stall was too short.'}"
+            for stall in stalls
+        )
+        await context.send(
+            embed=embed,
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename=f"stalls-{int(time.time())}.txt"),
+        )
+
+    @commands.hybrid_command(
+        name="record",
+        description="Records the gateway events to a compressed file, to replay them offline.",
+    )
+    @app_commands.describe(
+        action="`start` or `stop` the recording",
+        minutes="When starting, how long to record at most, from 1 to 1440 minutes",
+        anonymize="When starting, whether to replace the IDs, names and message texts",
+    )
+    @commands.is_owner()
+    async def record(
+        self,
+        context: Context,
+        action: Literal["start", "stop"] = "start",
+        minutes: int = 10,
+        anonymize: bool = True,
+    ) -> None:
+        """
+        Records the message, edit and member events of the cluster, for `loadtest/replay.py`.
+
+        :param context: The hybrid command context.
+        :param action: `start` or `stop` the recording.
+        :param minutes: When starting, how long to record at most, from 1 to 1440 minutes.
+        :param anonymize: When starting, whether to replace the IDs, names and message texts.
+        """
+        if action == "stop":
+            if self.recorder is None:
+                embed = discord.Embed(description="Nothing is being recorded.", color=0xE02B2B)
+                await context.send(embed=embed)
+                return
+            path = self.recorder.path
+            recorded = await self.stop_recording()
+            embed = discord.Embed(
+                description=f"Recorded {recorded} events in `{path}`.", color=0xBEBEFE
+            )
+            await context.send(embed=embed)
+            return
+        if self.recorder is not None:
+            embed = discord.Embed(
+                description=f"Already recording in `{self.recorder.path}`.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        minutes = max(1, min(minutes, 1440))
+        path = os.path.join(
+            RECORDINGS_ROOT, f"gateway-cluster{self.bot.cluster_id}-{int(time.time())}.ndjson.gz"
+        )
+        self.recorder = GatewayRecorder(path, anonymize=anonymize)
+        await self.recorder.start(self.bot)
+        self.recording_timer = asyncio.create_task(self.stop_recording(delay=minutes * 60))
+        embed = discord.Embed(
+            description=(
+                f"Recording the events of {len(self.bot.guilds)} guilds{' anonymized' if anonymize else ''} "
+                f"in `{path}` for {minutes} minutes, or until `record stop`."
+            ),
+            color=0xBEBEFE,
+        )
+        await context.send(embed=embed)
+
+    async def stop_recording(self, delay: float = 0) -> int:
+        """
+        This function will stop the recording, after some time when it is the timer of a recording.
+
+        :param delay: The time to wait before stopping, in seconds. Default is 0.
+        :return: The number of events recorded.
+        """
+        if delay:
+            await asyncio.sleep(delay)
+        elif self.recording_timer is not None:
+            self.recording_timer.cancel()
+        self.recording_timer = None
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return 0
+        recorded = await recorder.stop()
+        self.bot.logger.info("Recorded %s gateway events in %s", recorded, recorder.path)
+        return recorded
+
+    async def cog_unload(self) -> None:
+        await self.stop_recording()
+
     @commands.hybrid_command(
         name="say",
         description="The bot will say anything you want.",
@@ -4,6 +4,10 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 
+# Gateway intents this cog needs on top of the base ones, read by the `minimal` intents profile of bot.py
+REQUIRED_INTENTS = ()
+
+
 # Here we name the cog and create a new class for the cog.
 class Template(commands.Cog, name="template"):
     def __init__(self, bot) -> None:
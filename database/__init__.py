@@ -6,44 +6,360 @@ Description:
 Version: 6.2.0
 """
 
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import time
+
 import aiosqlite
 
+from database.audit import ActionBuffer
+from database.cache import WarningsCache
+from utils.metrics import REGISTRY
+
+MIGRATIONS_PATH = f"{os.path.realpath(os.path.dirname(__file__))}/migrations"
+
+# Applied to every connection. WAL lets the readers run while the writer commits, and
+# synchronous=NORMAL is durable across application crashes in WAL mode (only an OS crash
+# can lose the last commits), which is fine for warns and caches.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # 16 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # Map up to 256 MiB of the file
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+DB_SECONDS = REGISTRY.histogram(
+    "bot_db_seconds",
+    "Time spent in the database: reads, waits for a reader, writes until committed and commits.",
+    ("operation",),
+)
+READ_SECONDS = DB_SECONDS.labels("read")
+READER_WAIT_SECONDS = DB_SECONDS.labels("reader_wait")
+WRITE_SECONDS = DB_SECONDS.labels("write")
+COMMIT_SECONDS = DB_SECONDS.labels("commit")
+WRITE_BATCH_SIZE = REGISTRY.histogram(
+    "bot_db_write_batch_size",
+    "Writes committed per transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+async def connect(path: str, *, readonly: bool = False) -> aiosqlite.Connection:
+    """
+    This function will open a tuned connection to the database.
+
+    :param path: The path of the database file.
+    :param readonly: Whether the connection may only read. Default is False.
+    :return: The open connection.
+    """
+    connection = await aiosqlite.connect(path)
+    if not readonly:
+        await connection.execute("PRAGMA journal_mode = WAL")
+    for pragma in CONNECTION_PRAGMAS:
+        await connection.execute(pragma)
+    if readonly:
+        await connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+async def run_migrations(connection: aiosqlite.Connection, target: int = None) -> int:
+    """
+    This function will bring the database schema up to date.
+
+    Migrations are the `NNNN_name.sql` files of the migrations folder, applied in order. The
+    current schema version is tracked in `PRAGMA user_version`, and each migration runs in its own
+    transaction together with the version bump, so a failing migration leaves the database untouched.
+
+    :param connection: The connection to migrate.
+    :param target: The version to stop at. Default is None, which applies every migration.
+    :return: The schema version of the database after migrating.
+    """
+    async with connection.execute("PRAGMA user_version") as cursor:
+        result = await cursor.fetchone()
+        current = result[0]
+    for file in sorted(os.listdir(MIGRATIONS_PATH)):
+        if not file.endswith(".sql"):
+            continue
+        version = int(file.split("_", 1)[0])
+        if version <= current or (target is not None and version > target):
+            continue
+        with open(f"{MIGRATIONS_PATH}/{file}") as migration:
+            script = migration.read()
+        try:
+            await connection.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except Exception:
+            await connection.rollback()
+            raise
+        current = version
+    return current
+
 
 class DatabaseManager:
-    def __init__(self, *, connection: aiosqlite.Connection) -> None:
+    def __init__(
+        self,
+        *,
+        connection: aiosqlite.Connection,
+        readers: list = None,
+        max_batch_size: int = 256,
+        cache_size: int = 10_000,
+    ) -> None:
+        """
+        :param connection: The connection writes go through.
+        :param readers: Read-only connections reads are spread over. Default is None, which reads through `connection`.
+        :param max_batch_size: The maximum number of queued writes committed in one transaction.
+        :param cache_size: The maximum number of (server, user) warning lists kept in memory.
+        """
         self.connection = connection
+        self.warnings_cache = WarningsCache(cache_size)
+        self.readers = readers or []
+        self.max_batch_size = max_batch_size
+        self._write_queue = asyncio.Queue()
+        self._writer_task = None
+        self._idle_readers = list(self.readers)
+        self._reader_waiters = collections.deque()
+        self.actions = ActionBuffer(self)
+
+    @classmethod
+    async def open(cls, path: str, *, readers: int = 3) -> "DatabaseManager":
+        """
+        This function will open a writer connection and a pool of reader connections.
+
+        Each aiosqlite connection runs its queries on its own thread, so with WAL enabled reads
+        never queue behind writes.
+
+        :param path: The path of the database file.
+        :param readers: The number of read-only connections. Default is 3.
+        :return: The database manager.
+        """
+        # The writer enables WAL, which the readers rely on, so it is opened first
+        connection = await connect(path)
+        reader_connections = await asyncio.gather(
+            *(connect(path, readonly=True) for _ in range(readers))
+        )
+        return cls(connection=connection, readers=list(reader_connections))
+
+    async def migrate(self) -> int:
+        """
+        This function will bring the schema up to date through the writer connection.
+
+        It must run before any write is queued, as migrations commit on their own.
+
+        :return: The schema version of the database after migrating.
+        """
+        return await run_migrations(self.connection)
+
+    @property
+    def pending_writes(self) -> int:
+        return self._write_queue.qsize()
+
+    async def read(self, query: str, parameters: tuple = ()) -> list:
+        """
+        This function will run a read query on an idle reader connection.
+
+        :param query: The SQL query.
+        :param parameters: The parameters of the query.
+        :return: All the rows of the result.
+        """
+        started = time.perf_counter()
+        try:
+            async with self.reader() as connection:
+                rows = await connection.execute(query, parameters)
+                async with rows as cursor:
+                    return await cursor.fetchall()
+        finally:
+            READ_SECONDS.observe(time.perf_counter() - started)
+
+    @contextlib.asynccontextmanager
+    async def reader(self):
+        """
+        This function will borrow an idle reader connection for several queries.
+
+        Without a reader pool, the writer connection is used.
+        """
+        if not self.readers:
+            yield self.connection
+            return
+        started = time.perf_counter()
+        connection = await self._acquire_reader()
+        READER_WAIT_SECONDS.observe(time.perf_counter() - started)
+        try:
+            yield connection
+        finally:
+            self._release_reader(connection)
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        if self._idle_readers and not self._reader_waiters:
+            return self._idle_readers.pop()
+        # Readers are handed over in FIFO order so a busy task can't starve the others
+        waiter = asyncio.get_running_loop().create_future()
+        self._reader_waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_reader(waiter.result())
+            raise
+
+    def _release_reader(self, connection: aiosqlite.Connection) -> None:
+        while self._reader_waiters:
+            waiter = self._reader_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(connection)
+                return
+        self._idle_readers.append(connection)
+
+    async def write(self, operation, *, invalidates: tuple = ()):
+        """
+        This function will queue a write operation and wait until it has been committed.
+
+        Writes are group-committed: every operation that queued up while the previous
+        transaction was being committed runs in the next transaction, so a burst of writes
+        costs a single commit instead of one per write.
+
+        :param operation: A coroutine function taking the connection and returning the result of the write.
+        :param invalidates: The warnings cache keys the write touches, dropped right after the commit.
+        :return: The result of the operation, once it is durable.
+        """
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer())
+        future = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        await self._write_queue.put((operation, future, invalidates))
+        try:
+            return await future
+        finally:
+            WRITE_SECONDS.observe(time.perf_counter() - started)
+
+    async def _writer(self) -> None:
+        closing = False
+        while not (closing and self._write_queue.empty()):
+            batch = []
+            while len(batch) < self.max_batch_size:
+                if batch or closing:
+                    if self._write_queue.empty():
+                        break
+                    item = self._write_queue.get_nowait()
+                else:
+                    item = await self._write_queue.get()
+                if item is None:
+                    # Closing: the writes queued until now, even behind the sentinel, still commit
+                    closing = True
+                    continue
+                batch.append(item)
+            if batch:
+                await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list) -> None:
+        started = time.perf_counter()
+        try:
+            results = await self._run_batch(batch)
+        except Exception as e:
+            # SQLite itself failed, e.g. busy with another cluster's write: the whole batch fails,
+            # but its callers are answered and the writer keeps going
+            try:
+                await self.connection.rollback()
+            except Exception:
+                pass
+            results = [(future, None, e) for _, future, _ in batch]
+        COMMIT_SECONDS.observe(time.perf_counter() - started)
+        WRITE_BATCH_SIZE.observe(len(batch))
+        # Invalidate before waking the callers, even if they were cancelled meanwhile
+        for _, _, invalidates in batch:
+            for key in invalidates:
+                self.warnings_cache.invalidate(key)
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(self, batch: list) -> list:
+        results = []
+        # One transaction for the batch, a savepoint per operation: a SAVEPOINT outside a
+        # transaction would start one that its RELEASE commits. IMMEDIATE takes the write lock
+        # up front, so a write of another process makes it wait for busy_timeout instead of failing
+        # when the transaction upgrades from reading to writing.
+        if not self.connection.in_transaction:
+            await self.connection.execute("BEGIN IMMEDIATE")
+        for operation, future, _ in batch:
+            await self.connection.execute("SAVEPOINT operation")
+            try:
+                result = await operation(self.connection)
+            except Exception as e:
+                # Undo everything the operation wrote, not only its failing statement
+                await self.connection.execute("ROLLBACK TO operation")
+                await self.connection.execute("RELEASE operation")
+                results.append((future, None, e))
+                continue
+            await self.connection.execute("RELEASE operation")
+            results.append((future, result, None))
+        await self.connection.commit()
+        return results
+
+    async def close(self) -> None:
+        """
+        This function will commit the pending writes and close the connections.
+        """
+        await self.actions.close()
+        if self._writer_task is not None and not self._writer_task.done():
+            await self._write_queue.put(None)
+            await self._writer_task
+        for reader in self.readers:
+            await reader.close()
+        await self.connection.close()
 
     async def add_warn(
         self, user_id: int, server_id: int, moderator_id: int, reason: str
-    ) -> int:
+    ) -> tuple:
         """
         This function will add a warn to the database.
 
+        The ID is allocated in the INSERT statement itself, so concurrent warns for the same user can never get the same ID.
+
         :param user_id: The ID of the user that should be warned.
+        :param server_id: The ID of the server where the user should be warned.
+        :param moderator_id: The ID of the moderator that warned the user.
         :param reason: The reason why the user should be warned.
+        :return: The ID of the new warn and the total number of warns of the user.
         """
-        rows = await self.connection.execute(
-            "SELECT id FROM warns WHERE user_id=? AND server_id=? ORDER BY id DESC LIMIT 1",
-            (
-                user_id,
-                server_id,
-            ),
-        )
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            warn_id = result[0] + 1 if result is not None else 1
-            await self.connection.execute(
-                "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+
+        async def operation(connection: aiosqlite.Connection) -> tuple:
+            rows = await connection.execute(
+                "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) "
+                "SELECT COALESCE(MAX(id), 0) + 1, ?, ?, ?, ? FROM warns WHERE server_id=? AND user_id=? "
+                "RETURNING id",
                 (
-                    warn_id,
                     user_id,
                     server_id,
                     moderator_id,
                     reason,
+                    server_id,
+                    user_id,
                 ),
             )
-            await self.connection.commit()
-            return warn_id
+            async with rows as cursor:
+                result = await cursor.fetchone()
+                warn_id = result[0]
+            rows = await connection.execute(
+                "SELECT COUNT(*) FROM warns WHERE server_id=? AND user_id=?",
+                (
+                    server_id,
+                    user_id,
+                ),
+            )
+            async with rows as cursor:
+                result = await cursor.fetchone()
+                return warn_id, result[0]
+
+        return await self.write(operation, invalidates=((server_id, user_id),))
 
     async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
         """
@@ -52,26 +368,30 @@ class DatabaseManager:
         :param warn_id: The ID of the warn.
         :param user_id: The ID of the user that was warned.
         :param server_id: The ID of the server where the user has been warned
+        :return: The number of warns the user has left.
         """
-        await self.connection.execute(
-            "DELETE FROM warns WHERE id=? AND user_id=? AND server_id=?",
-            (
-                warn_id,
-                user_id,
-                server_id,
-            ),
-        )
-        await self.connection.commit()
-        rows = await self.connection.execute(
-            "SELECT COUNT(*) FROM warns WHERE user_id=? AND server_id=?",
-            (
-                user_id,
-                server_id,
-            ),
-        )
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+
+        async def operation(connection: aiosqlite.Connection) -> int:
+            await connection.execute(
+                "DELETE FROM warns WHERE id=? AND user_id=? AND server_id=?",
+                (
+                    warn_id,
+                    user_id,
+                    server_id,
+                ),
+            )
+            rows = await connection.execute(
+                "SELECT COUNT(*) FROM warns WHERE user_id=? AND server_id=?",
+                (
+                    user_id,
+                    server_id,
+                ),
+            )
+            async with rows as cursor:
+                result = await cursor.fetchone()
+                return result[0] if result is not None else 0
+
+        return await self.write(operation, invalidates=((server_id, user_id),))
 
     async def get_warnings(self, user_id: int, server_id: int) -> list:
         """
@@ -81,16 +401,518 @@ class DatabaseManager:
         :param server_id: The ID of the server that should be checked.
         :return: A list of all the warnings of the user.
         """
-        rows = await self.connection.execute(
-            "SELECT user_id, server_id, moderator_id, reason, strftime('%s', created_at), id FROM warns WHERE user_id=? AND server_id=?",
+
+        async def loader() -> tuple:
+            return tuple(
+                await self.read(
+                    "SELECT user_id, server_id, moderator_id, reason, strftime('%s', created_at), id FROM warns WHERE user_id=? AND server_id=? ORDER BY id",
+                    (
+                        user_id,
+                        server_id,
+                    ),
+                )
+            )
+
+        return list(await self.warnings_cache.get((server_id, user_id), loader))
+
+    async def count_warnings(self, user_id: int, server_id: int) -> int:
+        """
+        This function will get the number of warnings of a user.
+
+        :param user_id: The ID of the user that should be checked.
+        :param server_id: The ID of the server that should be checked.
+        :return: The number of warnings of the user.
+        """
+        key = (server_id, user_id)
+        cached = self.warnings_cache.peek(key)
+        if cached is not None:
+            return len(cached)
+
+        # Counted by the (server, user) index, without loading the warnings of heavily warned users
+        async def loader() -> int:
+            rows = await self.read(
+                "SELECT COUNT(*) FROM warns WHERE server_id=? AND user_id=?",
+                (
+                    server_id,
+                    user_id,
+                ),
+            )
+            return rows[0][0] if rows else 0
+
+        return await self.warnings_cache.get(key, loader, kind="count")
+
+    async def get_warnings_page(
+        self, user_id: int, server_id: int, *, after_id: int = 0, limit: int = 10
+    ) -> list:
+        """
+        This function will get one page of the warnings of a user, ordered by warn ID.
+
+        Pages are keyset-paginated: the next page starts after the last warn ID of the previous one,
+        so each page is a single index range scan no matter how many warnings the user has. Pages are
+        cached until the warnings of the user change, or sliced from all the warnings if those are cached.
+
+        :param user_id: The ID of the user that should be checked.
+        :param server_id: The ID of the server that should be checked.
+        :param after_id: Only warnings with a greater ID are returned. Default is 0.
+        :param limit: The maximum number of warnings returned. Default is 10.
+        :return: A list of warnings, in the same format as `get_warnings`.
+        """
+        key = (server_id, user_id)
+        cached = self.warnings_cache.peek(key)
+        if cached is not None:
+            return [row for row in cached if row[5] > after_id][:limit]
+
+        async def loader() -> tuple:
+            return tuple(
+                await self.read(
+                    "SELECT user_id, server_id, moderator_id, reason, strftime('%s', created_at), id FROM warns WHERE server_id=? AND user_id=? AND id>? ORDER BY id LIMIT ?",
+                    (
+                        server_id,
+                        user_id,
+                        after_id,
+                        limit,
+                    ),
+                )
+            )
+
+        return list(await self.warnings_cache.get(key, loader, kind=("page", after_id, limit)))
+
+    async def iter_server_warnings(self, server_id: int, batch_size: int = 500):
+        """
+        This function will stream all the warnings of a server in batches, without loading them all in memory.
+
+        :param server_id: The ID of the server.
+        :param batch_size: The number of rows fetched at once. Default is 500.
+        :return: An async iterator of lists of (user_id, moderator_id, reason, created_at, id) rows, ordered by user and warn ID.
+        """
+        async with self.reader() as connection:
+            rows = await connection.execute(
+                "SELECT user_id, moderator_id, reason, strftime('%s', created_at), id FROM warns WHERE server_id=? ORDER BY server_id, user_id, id",
+                (server_id,),
+            )
+            async with rows as cursor:
+                while True:
+                    batch = await cursor.fetchmany(batch_size)
+                    if not batch:
+                        return
+                    yield batch
+
+    async def get_warn_history(self, user_id: int, server_id: int, since: int) -> list:
+        """
+        This function will get the IDs and creation times of the recent warnings of a user.
+
+        :param user_id: The ID of the user that should be checked.
+        :param server_id: The ID of the server that should be checked.
+        :param since: Only warnings created at or after this UNIX timestamp are returned.
+        :return: A list of (warn ID, UNIX timestamp) tuples, oldest first.
+        """
+        return await self.read(
+            "SELECT id, CAST(strftime('%s', created_at) AS INTEGER) AS created FROM warns WHERE server_id=? AND user_id=? AND created >= ? ORDER BY created, id",
             (
+                server_id,
                 user_id,
+                since,
+            ),
+        )
+
+    async def get_escalation_policies(self, server_id: int) -> list:
+        """
+        This function will get the escalation policies of a server.
+
+        :param server_id: The ID of the server.
+        :return: A list of (threshold, window_seconds, action, duration_seconds) tuples.
+        """
+        return await self.read(
+            "SELECT threshold, window_seconds, action, duration_seconds FROM escalation_policies WHERE server_id=? ORDER BY threshold, window_seconds",
+            (server_id,),
+        )
+
+    async def set_escalation_policy(
+        self,
+        server_id: int,
+        threshold: int,
+        window_seconds: int,
+        action: str,
+        duration_seconds: int = None,
+    ) -> None:
+        """
+        This function will add or replace an escalation policy of a server.
+
+        :param server_id: The ID of the server.
+        :param threshold: The number of warns that triggers the policy.
+        :param window_seconds: The time window the warns are counted in.
+        :param action: The action to apply, `timeout`, `kick` or `ban`.
+        :param duration_seconds: The duration of a timeout.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.execute(
+                "INSERT OR REPLACE INTO escalation_policies(server_id, threshold, window_seconds, action, duration_seconds) VALUES (?, ?, ?, ?, ?)",
+                (
+                    server_id,
+                    threshold,
+                    window_seconds,
+                    action,
+                    duration_seconds,
+                ),
+            )
+
+        await self.write(operation)
+
+    async def remove_escalation_policy(
+        self, server_id: int, threshold: int, window_seconds: int
+    ) -> bool:
+        """
+        This function will remove an escalation policy of a server.
+
+        :param server_id: The ID of the server.
+        :param threshold: The threshold of the policy.
+        :param window_seconds: The time window of the policy.
+        :return: Whether a policy was removed.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> bool:
+            cursor = await connection.execute(
+                "DELETE FROM escalation_policies WHERE server_id=? AND threshold=? AND window_seconds=?",
+                (
+                    server_id,
+                    threshold,
+                    window_seconds,
+                ),
+            )
+            return cursor.rowcount > 0
+
+        return await self.write(operation)
+
+    def log_action(
+        self,
+        server_id: int,
+        action: str,
+        *,
+        target_id: int = None,
+        moderator_id: int = None,
+        reason: str = None,
+    ) -> None:
+        """
+        This function will record a moderation action in the audit log.
+
+        The action is buffered and written in the background with the other recent actions, so this
+        never waits on the database.
+
+        :param server_id: The ID of the server the action happened in.
+        :param action: The kind of action, e.g. `kick` or `ban`.
+        :param target_id: The ID of the user the action targeted, if any.
+        :param moderator_id: The ID of the moderator, None for automatic actions.
+        :param reason: The reason of the action.
+        """
+        self.actions.add(server_id, action, target_id, moderator_id, reason)
+
+    async def get_mod_actions(
+        self,
+        server_id: int,
+        *,
+        target_id: int = None,
+        moderator_id: int = None,
+        limit: int = 10,
+    ) -> list:
+        """
+        This function will return the most recent moderation actions of a server.
+
+        Each filter is served by its own (server, column, time) index, so the query reads only the
+        returned rows, newest first, however large the table is.
+
+        :param server_id: The ID of the server.
+        :param target_id: Only return the actions targeting this user.
+        :param moderator_id: Only return the actions done by this moderator.
+        :param limit: The maximum number of actions. Default is 10.
+        :return: A list of (action, target ID, moderator ID, reason, created at) tuples.
+        """
+        # Actions still buffered in memory should show up in the result
+        await self.actions.flush()
+        if target_id is not None:
+            condition, parameters = "server_id=? AND target_id=?", (server_id, target_id)
+        elif moderator_id is not None:
+            condition, parameters = "server_id=? AND moderator_id=?", (
+                server_id,
+                moderator_id,
+            )
+        else:
+            condition, parameters = "server_id=?", (server_id,)
+        return await self.read(
+            f"SELECT action, target_id, moderator_id, reason, created_at FROM mod_actions WHERE {condition} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*parameters, limit),
+        )
+
+    async def get_forbidden_links(self) -> dict:
+        """
+        This function will get the forbidden domains of every server.
+
+        :return: A dict mapping server IDs to sets of domains.
+        """
+        links = {}
+        for server_id, domain in await self.read(
+            "SELECT server_id, domain FROM forbidden_links"
+        ):
+            links.setdefault(server_id, set()).add(domain)
+        return links
+
+    async def add_forbidden_links(self, server_id: int, domains: list) -> None:
+        """
+        This function will add forbidden domains to a server.
+
+        :param server_id: The ID of the server.
+        :param domains: The normalized domains to forbid.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.executemany(
+                "INSERT OR IGNORE INTO forbidden_links(server_id, domain) VALUES (?, ?)",
+                [(server_id, domain) for domain in domains],
+            )
+
+        await self.write(operation)
+
+    async def remove_forbidden_link(self, server_id: int, domain: str) -> bool:
+        """
+        This function will remove a forbidden domain from a server.
+
+        :param server_id: The ID of the server.
+        :param domain: The normalized domain.
+        :return: Whether the domain was forbidden.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> bool:
+            cursor = await connection.execute(
+                "DELETE FROM forbidden_links WHERE server_id=? AND domain=?",
+                (
+                    server_id,
+                    domain,
+                ),
+            )
+            return cursor.rowcount > 0
+
+        return await self.write(operation)
+
+    async def get_backfill_checkpoints(self, server_id: int, scope: str) -> dict:
+        """
+        This function will get where the channels of a server are in a history backfill.
+
+        :param server_id: The ID of the server.
+        :param scope: The domain looked for, or '*' for every forbidden domain.
+        :return: A dict mapping channel IDs to (before ID, scanned, matched, completed, after ID, domains) tuples.
+        """
+        rows = await self.read(
+            "SELECT channel_id, before_id, scanned, matched, completed, after_id, domains FROM backfill_checkpoints WHERE server_id=? AND scope=?",
+            (
                 server_id,
+                scope,
             ),
         )
-        async with rows as cursor:
-            result = await cursor.fetchall()
-            result_list = []
-            for row in result:
-                result_list.append(row)
-            return result_list
+        return {row[0]: (row[1], row[2], row[3], bool(row[4]), row[5], row[6]) for row in rows}
+
+    async def save_backfill_checkpoint(
+        self,
+        server_id: int,
+        scope: str,
+        channel_id: int,
+        before_id: int,
+        scanned: int,
+        matched: int,
+        completed: bool,
+        after_id: int,
+        domains: str,
+    ) -> None:
+        """
+        This function will store where a channel is in a history backfill.
+
+        :param server_id: The ID of the server.
+        :param scope: The domain looked for, or '*' for every forbidden domain.
+        :param channel_id: The ID of the channel.
+        :param before_id: The ID of the oldest message scanned, None if none was.
+        :param scanned: The number of messages scanned in the channel so far.
+        :param matched: The number of messages matched in the channel so far.
+        :param completed: Whether the channel has been scanned up to the end of the backfill.
+        :param after_id: The ID of the oldest message the backfill is bounded to, None for the whole history.
+        :param domains: The key of the forbidden domains looked for.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.execute(
+                "INSERT OR REPLACE INTO backfill_checkpoints(server_id, scope, channel_id, before_id, scanned, matched, completed, after_id, domains, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, strftime('%s', 'now'))",
+                (
+                    server_id,
+                    scope,
+                    channel_id,
+                    before_id,
+                    scanned,
+                    matched,
+                    int(completed),
+                    after_id,
+                    domains,
+                ),
+            )
+
+        await self.write(operation)
+
+    async def clear_backfill_checkpoints(self, server_id: int, scope: str) -> None:
+        """
+        This function will forget the progress of a history backfill, so the next one starts over.
+
+        :param server_id: The ID of the server.
+        :param scope: The domain looked for, or '*' for every forbidden domain.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.execute(
+                "DELETE FROM backfill_checkpoints WHERE server_id=? AND scope=?",
+                (
+                    server_id,
+                    scope,
+                ),
+            )
+
+        await self.write(operation)
+
+    async def get_scam_images(self) -> list:
+        """
+        This function will get the samples of known scam images of every server.
+
+        :return: A list of (ID, server ID, hash, label) tuples, the server ID is 0 for the samples of every server.
+        """
+        rows = await self.read("SELECT id, server_id, hash, label FROM scam_images")
+        return [(row[0], row[1], int(row[2], 16), row[3]) for row in rows]
+
+    async def add_scam_image(self, server_id: int, image_hash: int, label: str, added_by: int) -> int:
+        """
+        This function will add a sample of a known scam image.
+
+        :param server_id: The ID of the server, 0 for every server.
+        :param image_hash: The 64-bit difference hash of the image.
+        :param label: What the image is, shown in the reports.
+        :param added_by: The ID of the moderator who added the sample.
+        :return: The ID of the sample.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> int:
+            cursor = await connection.execute(
+                "INSERT INTO scam_images(server_id, hash, label, added_by, created_at) VALUES (?, ?, ?, ?, strftime('%s', 'now'))",
+                (
+                    server_id,
+                    f"{image_hash:016x}",
+                    label,
+                    added_by,
+                ),
+            )
+            return cursor.lastrowid
+
+        return await self.write(operation)
+
+    async def remove_scam_image(self, image_id: int, server_id: int) -> bool:
+        """
+        This function will remove a sample of a known scam image.
+
+        :param image_id: The ID of the sample.
+        :param server_id: The ID of the server the sample belongs to, 0 for every server.
+        :return: Whether the sample existed.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> bool:
+            cursor = await connection.execute(
+                "DELETE FROM scam_images WHERE id=? AND server_id=?",
+                (
+                    image_id,
+                    server_id,
+                ),
+            )
+            return cursor.rowcount > 0
+
+        return await self.write(operation)
+
+    async def add_chat_costs(self, costs: list) -> None:
+        """
+        This function will add to the chat completion costs.
+
+        Costs are incremented in place, so every process of a sharded deployment can add its own.
+
+        :param costs: A list of (kind, thread ID, cost) tuples, the thread ID is an empty string for costs not tied to a thread.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.executemany(
+                "INSERT INTO chat_costs(kind, thread_id, cost) VALUES (?, ?, ?) ON CONFLICT(kind, thread_id) DO UPDATE SET cost = cost + excluded.cost",
+                costs,
+            )
+
+        await self.write(operation)
+
+    async def get_chat_costs(self) -> tuple:
+        """
+        This function will get the chat completion costs.
+
+        :return: A dict of the total cost of each kind and a dict of the total cost of each thread.
+        """
+        async with self.reader() as connection:
+            rows = await connection.execute(
+                "SELECT kind, SUM(cost) FROM chat_costs GROUP BY kind"
+            )
+            async with rows as cursor:
+                totals = dict(await cursor.fetchall())
+            rows = await connection.execute(
+                "SELECT thread_id, SUM(cost) FROM chat_costs WHERE thread_id != '' GROUP BY thread_id"
+            )
+            async with rows as cursor:
+                threads = dict(await cursor.fetchall())
+        return totals, threads
+
+    async def report_cluster_health(
+        self,
+        cluster_id: int,
+        shard_ids: list,
+        guilds: int,
+        latency: float,
+        events_per_second: float,
+        top_events: dict,
+        started_at: int,
+    ) -> None:
+        """
+        This function will store the latest health report of a cluster.
+
+        :param cluster_id: The ID of the cluster.
+        :param shard_ids: The shards the cluster runs.
+        :param guilds: The number of guilds of the cluster.
+        :param latency: The average gateway latency, in seconds.
+        :param events_per_second: The gateway events received per second since the last report.
+        :param top_events: The most frequent event types since the last report and their rates.
+        :param started_at: The UNIX timestamp the cluster started at.
+        """
+
+        async def operation(connection: aiosqlite.Connection) -> None:
+            await connection.execute(
+                "INSERT OR REPLACE INTO cluster_health(cluster_id, shard_ids, pid, guilds, latency, events_per_second, top_events, started_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, strftime('%s', 'now'))",
+                (
+                    cluster_id,
+                    json.dumps(shard_ids),
+                    os.getpid(),
+                    guilds,
+                    latency,
+                    events_per_second,
+                    json.dumps(top_events),
+                    started_at,
+                ),
+            )
+
+        await self.write(operation)
+
+    async def get_cluster_health(self) -> list:
+        """
+        This function will get the latest health report of every cluster.
+
+        :return: A list of (cluster ID, shard IDs, PID, guilds, latency, events per second, top events, started at, updated at) tuples.
+        """
+        rows = await self.read(
+            "SELECT cluster_id, shard_ids, pid, guilds, latency, events_per_second, top_events, started_at, updated_at FROM cluster_health ORDER BY cluster_id"
+        )
+        return [
+            (row[0], json.loads(row[1]), *row[2:6], json.loads(row[6]), *row[7:])
+            for row in rows
+        ]
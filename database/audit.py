@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+
+class ActionBuffer:
+    """
+    Buffers moderation actions in memory and writes them to the `mod_actions` table in batches.
+
+    Logging an action only appends a row to a list, so commands never wait on the database. A
+    background task hands the buffered rows to the database manager's write queue with a single
+    `executemany` every `flush_interval` seconds, or as soon as `max_pending` rows are waiting, so a
+    raid cleanup logging thousands of actions costs a few commits instead of one per action.
+    """
+
+    def __init__(self, database, *, flush_interval: float = 2.0, max_pending: int = 500) -> None:
+        """
+        :param database: The database manager the rows are written through.
+        :param flush_interval: The maximum number of seconds a row stays in memory. Default is 2.
+        :param max_pending: The number of buffered rows that triggers an early flush. Default is 500.
+        """
+        self.database = database
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        server_id: int,
+        action: str,
+        target_id: int = None,
+        moderator_id: int = None,
+        reason: str = None,
+    ) -> None:
+        """
+        This function will buffer an action, it is written by the background task.
+        """
+        self._pending.append(
+            (server_id, action, target_id, moderator_id, reason, int(time.time()))
+        )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # The rows were put back, the next flush retries them
+                pass
+
+    async def flush(self) -> None:
+        """
+        This function will write every buffered action and wait until they are committed.
+        """
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+
+        async def operation(connection) -> None:
+            await connection.executemany(
+                "INSERT INTO mod_actions(server_id, action, target_id, moderator_id, reason, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        try:
+            await self.database.write(operation)
+        except Exception:
+            self._pending[:0] = rows
+            raise
+        self.written += len(rows)
+
+    async def close(self) -> None:
+        """
+        This function will stop the background task and write the remaining actions.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
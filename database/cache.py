@@ -0,0 +1,111 @@
+import collections
+
+
+class WarningsCache:
+    """
+    A bounded LRU cache of the warnings of a user in a server, keyed by (server ID, user ID).
+
+    A key holds several views of the same warnings: all the rows, the count and the pages shown by
+    `warning list`, each stored under its kind. Entries are only dropped by `invalidate`, which the
+    database manager calls once a write touching the key has been committed, and which drops every
+    kind at once. A load racing with such a write is never stored: every load registers a token, and
+    `invalidate` discards the tokens of the key, so only a load that started after the last
+    invalidation can fill the cache.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        """
+        :param max_entries: The maximum number of (server, user) entries kept in memory.
+        """
+        self.max_entries = max_entries
+        # key -> {kind: value}, the least recently used key first
+        self._entries = collections.OrderedDict()
+        # key -> {kind: token} of the loads in flight
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def entries(self) -> collections.OrderedDict:
+        """
+        The cached values, for the memory report of the owner commands.
+        """
+        return self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: tuple, loader, kind="rows"):
+        """
+        This function will return the cached value of a key, loading it on a miss.
+
+        :param key: The (server ID, user ID) key.
+        :param loader: A coroutine function returning the value from the database.
+        :param kind: What the value is, e.g. "rows", "count" or a page. Default is "rows".
+        :return: The value.
+        """
+        values = self._entries.get(key)
+        if values is not None and kind in values:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values[kind]
+        self.misses += 1
+        token = object()
+        self._loading.setdefault(key, {})[kind] = token
+        try:
+            value = await loader()
+        finally:
+            loading = self._loading.get(key)
+            stored = loading is not None and loading.get(kind) is token
+            if stored:
+                del loading[kind]
+                if not loading:
+                    del self._loading[key]
+        if stored:
+            self._entries.setdefault(key, {})[kind] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def peek(self, key: tuple, kind="rows"):
+        """
+        This function will return the cached value of a key without loading it.
+
+        :param key: The (server ID, user ID) key.
+        :param kind: What the value is. Default is "rows".
+        :return: The value, or None if it isn't cached.
+        """
+        values = self._entries.get(key)
+        if values is None or kind not in values:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return values[kind]
+
+    def invalidate(self, key: tuple) -> None:
+        """
+        This function will drop a key and prevent loads that are in flight from storing it.
+
+        :param key: The (server ID, user ID) key.
+        """
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        This function will return the hit/miss statistics of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
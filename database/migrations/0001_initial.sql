@@ -5,4 +5,4 @@ CREATE TABLE IF NOT EXISTS `warns` (
   `moderator_id` varchar(20) NOT NULL,
   `reason` varchar(255) NOT NULL,
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
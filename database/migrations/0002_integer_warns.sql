@@ -0,0 +1,24 @@
+-- Store ids as integers and index the (server, user) lookups every warn query does
+CREATE TABLE `warns_new` (
+  `id` INTEGER NOT NULL,
+  `user_id` INTEGER NOT NULL,
+  `server_id` INTEGER NOT NULL,
+  `moderator_id` INTEGER NOT NULL,
+  `reason` TEXT NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO `warns_new` (`id`, `user_id`, `server_id`, `moderator_id`, `reason`, `created_at`)
+  SELECT
+    CAST(`id` AS INTEGER),
+    CAST(`user_id` AS INTEGER),
+    CAST(`server_id` AS INTEGER),
+    CAST(`moderator_id` AS INTEGER),
+    `reason`,
+    `created_at`
+  FROM `warns`;
+
+DROP TABLE `warns`;
+ALTER TABLE `warns_new` RENAME TO `warns`;
+
+CREATE INDEX `idx_warns_server_user_id` ON `warns` (`server_id`, `user_id`, `id`);
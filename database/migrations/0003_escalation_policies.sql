@@ -0,0 +1,9 @@
+-- Automatic actions applied when a user collects `threshold` warns within `window_seconds`
+CREATE TABLE `escalation_policies` (
+  `server_id` INTEGER NOT NULL,
+  `threshold` INTEGER NOT NULL,
+  `window_seconds` INTEGER NOT NULL,
+  `action` TEXT NOT NULL,
+  `duration_seconds` INTEGER,
+  PRIMARY KEY (`server_id`, `threshold`, `window_seconds`)
+);
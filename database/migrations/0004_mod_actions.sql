@@ -0,0 +1,14 @@
+-- Audit log of moderation actions, queried by target, by moderator or by time
+CREATE TABLE `mod_actions` (
+  `id` INTEGER PRIMARY KEY,
+  `server_id` INTEGER NOT NULL,
+  `action` TEXT NOT NULL,
+  `target_id` INTEGER,
+  `moderator_id` INTEGER,
+  `reason` TEXT,
+  `created_at` INTEGER NOT NULL
+);
+
+CREATE INDEX `idx_mod_actions_target` ON `mod_actions` (`server_id`, `target_id`, `created_at`);
+CREATE INDEX `idx_mod_actions_moderator` ON `mod_actions` (`server_id`, `moderator_id`, `created_at`);
+CREATE INDEX `idx_mod_actions_time` ON `mod_actions` (`server_id`, `created_at`);
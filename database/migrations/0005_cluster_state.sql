@@ -0,0 +1,28 @@
+-- State shared by the processes of a sharded deployment
+CREATE TABLE `forbidden_links` (
+  `server_id` INTEGER NOT NULL,
+  `domain` TEXT NOT NULL,
+  PRIMARY KEY (`server_id`, `domain`)
+) WITHOUT ROWID;
+
+-- Chat completion costs, `thread_id` is empty for costs not tied to a thread
+CREATE TABLE `chat_costs` (
+  `kind` TEXT NOT NULL,
+  `thread_id` TEXT NOT NULL DEFAULT '',
+  `cost` REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (`kind`, `thread_id`)
+) WITHOUT ROWID;
+
+CREATE INDEX `idx_chat_costs_thread_id` ON `chat_costs` (`thread_id`);
+
+CREATE TABLE `cluster_health` (
+  `cluster_id` INTEGER PRIMARY KEY,
+  `shard_ids` TEXT NOT NULL,
+  `pid` INTEGER NOT NULL,
+  `guilds` INTEGER NOT NULL,
+  `latency` REAL,
+  `events_per_second` REAL NOT NULL,
+  `top_events` TEXT NOT NULL,
+  `started_at` INTEGER NOT NULL,
+  `updated_at` INTEGER NOT NULL
+);
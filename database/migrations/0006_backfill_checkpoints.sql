@@ -0,0 +1,14 @@
+-- Progress of the history backfills of the link manager, one row per channel so they resume.
+-- `scope` is the domain looked for, or '*' for every forbidden domain of the server.
+-- Channels are scanned from the newest message back, `before_id` is the oldest message scanned.
+CREATE TABLE `backfill_checkpoints` (
+  `server_id` INTEGER NOT NULL,
+  `scope` TEXT NOT NULL,
+  `channel_id` INTEGER NOT NULL,
+  `before_id` INTEGER,
+  `scanned` INTEGER NOT NULL DEFAULT 0,
+  `matched` INTEGER NOT NULL DEFAULT 0,
+  `completed` INTEGER NOT NULL DEFAULT 0,
+  `updated_at` INTEGER NOT NULL,
+  PRIMARY KEY (`server_id`, `scope`, `channel_id`)
+) WITHOUT ROWID;
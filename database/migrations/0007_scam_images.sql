@@ -0,0 +1,12 @@
+-- Samples of known scam images for the image scan, `server_id` is 0 for the samples of every server.
+-- `hash` is the 64-bit difference hash of the image in hexadecimal, SQLite integers are signed.
+CREATE TABLE `scam_images` (
+  `id` INTEGER PRIMARY KEY,
+  `server_id` INTEGER NOT NULL,
+  `hash` TEXT NOT NULL,
+  `label` TEXT,
+  `added_by` INTEGER NOT NULL,
+  `created_at` INTEGER NOT NULL
+);
+
+CREATE INDEX `idx_scam_images_server_id` ON `scam_images` (`server_id`);
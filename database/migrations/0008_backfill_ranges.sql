@@ -0,0 +1,5 @@
+-- What a backfill checkpoint covers, so a run over a wider range or other domains doesn't skip its channels.
+-- `after_id` is the oldest message ID the run was bounded to, NULL for the whole history.
+-- `domains` identifies the forbidden domains looked for, checkpoints stored before are never reused.
+ALTER TABLE `backfill_checkpoints` ADD COLUMN `after_id` INTEGER;
+ALTER TABLE `backfill_checkpoints` ADD COLUMN `domains` TEXT NOT NULL DEFAULT '';
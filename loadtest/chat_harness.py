@@ -0,0 +1,296 @@
+"""
+Load-test harness driving the message pipeline with fake Discord messages and threads.
+
+Messages go through a `MessagePipeline` holding the chat cog's stage, like in the bot, and the
+report includes the timing of each stage.
+
+The chat cog talks to the bundled OpenAI-compatible stub (started in a background thread
+unless `--base-url` is given), so no money is spent and no real gateway is needed.
+
+Usage:
+    python -m loadtest.chat_harness --rate 20 --duration 30 --latency lognormal --latency-ms 400
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import discord
+
+from loadtest.stub_server import StubServer, add_stub_arguments, config_from_arguments
+from utils.pipeline import MessagePipeline
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers.
+
+    :param values: The samples.
+    :param pct: The percentile, between 0 and 100.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False) -> None:
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int) -> None:
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+
+
+class FakeThread(discord.Thread):
+    """
+    A `discord.Thread` that never touches the network, so `isinstance` checks in the cog still pass.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, thread_id: int, guild: FakeGuild, stats: "HarnessStats") -> None:
+        self.id = thread_id
+        self.fake_guild = guild
+        self.stats = stats
+
+    async def send(self, content=None, **kwargs):
+        if isinstance(content, str) and content.startswith("Error generating response"):
+            self.stats.errors += 1
+        self.stats.replies += 1
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, stats: "HarnessStats") -> None:
+        self.id = channel_id
+        self.stats = stats
+
+    async def send(self, content=None, **kwargs):
+        self.stats.replies += 1
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, author: FakeUser, content: str, channel, guild: FakeGuild, harness) -> None:
+        self.id = message_id
+        self.author = author
+        self.content = content
+        self.channel = channel
+        self.guild = guild
+        self.harness = harness
+        self.attachments = []
+
+    async def create_thread(self, *, name: str, **kwargs):
+        self.harness.stats.threads_created += 1
+        return self.harness.new_thread()
+
+
+class FakeDatabase:
+    """
+    The subset of `DatabaseManager` that `ChatCog` relies on, keeping the costs in memory.
+    """
+
+    def __init__(self) -> None:
+        self.costs = {}
+
+    async def add_chat_costs(self, costs: list) -> None:
+        for kind, thread_id, cost in costs:
+            self.costs[(kind, thread_id)] = self.costs.get((kind, thread_id), 0.0) + cost
+
+    async def get_chat_costs(self) -> tuple:
+        return {}, {}
+
+
+class FakeBot:
+    """
+    The subset of `DiscordBot` that `ChatCog` relies on.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.user = FakeUser(1, "harness-bot", bot=True)
+        self.logger = logging.getLogger("loadtest")
+        self.database = FakeDatabase()
+        self.pipeline = MessagePipeline(self.logger)
+        self._closed = asyncio.Event()
+
+    async def wait_until_ready(self) -> None:
+        # Never "ready", so the cog's auto-save loop stays idle during the run
+        await self._closed.wait()
+
+    def is_closed(self) -> bool:
+        return self._closed.is_set()
+
+
+class HarnessStats:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.completed = 0
+        self.failed = 0
+        self.errors = 0
+        self.replies = 0
+        self.threads_created = 0
+        self.latencies = []
+        self.loop_lags = []
+
+
+class ChatHarness:
+    def __init__(self, cog, bot: FakeBot, *, threads: int, channel_ratio: float) -> None:
+        self.cog = cog
+        self.bot = bot
+        self.stats = HarnessStats()
+        self.guild = FakeGuild(1000)
+        self.channel = FakeChannel(2000, self.stats)
+        self.author = FakeUser(3000, "load-tester")
+        self._next_thread_id = 5_000_000
+        self.threads = [self.new_thread() for _ in range(threads)]
+        self.channel_ratio = channel_ratio
+        self._next_id = 10_000
+        self.cog.active_channels = {
+            str(self.guild.id): {"channels": [str(self.channel.id)]}
+        }
+        self.cog.index_active_channels()
+
+    def new_thread(self) -> FakeThread:
+        self._next_thread_id += 1
+        return FakeThread(self._next_thread_id, self.guild, self.stats)
+
+    def next_message(self, index: int) -> FakeMessage:
+        self._next_id += 1
+        if self.threads and (index % 100) >= self.channel_ratio * 100:
+            channel = self.threads[index % len(self.threads)]
+            content = f"My transaction {index} is stuck, what should I do?"
+        else:
+            channel = self.channel
+            content = f"Can someone help me recover my wallet? ({index})"
+        return FakeMessage(self._next_id, self.author, content, channel, self.guild, self)
+
+    async def drive(self, message: FakeMessage) -> None:
+        start = time.perf_counter()
+        try:
+            await self.bot.pipeline.process(message)
+            self.stats.completed += 1
+        except Exception:
+            self.stats.failed += 1
+        self.stats.latencies.append(time.perf_counter() - start)
+
+    async def monitor_loop_lag(self, interval: float = 0.01) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.stats.loop_lags.append(max(0.0, loop.time() - expected))
+
+    async def run(self, rate: float, duration: float) -> float:
+        """
+        Dispatch messages open-loop at the target rate, like the gateway does, then wait for them.
+
+        :param rate: The target rate in messages per second.
+        :param duration: How long messages are dispatched, in seconds.
+        :return: The elapsed wall time in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        monitor = asyncio.create_task(self.monitor_loop_lag())
+        tasks = []
+        start = loop.time()
+        index = 0
+        while loop.time() - start < duration:
+            tasks.append(asyncio.create_task(self.drive(self.next_message(index))))
+            self.stats.sent += 1
+            index += 1
+            next_at = start + index / rate
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+        monitor.cancel()
+        return elapsed
+
+
+def report(stats: HarnessStats, elapsed: float, stub: StubServer, pipeline: MessagePipeline) -> None:
+    ms = lambda seconds: f"{seconds * 1000:.1f}ms"
+    print("ChatCog load test")
+    print(f"  messages sent:      {stats.sent}")
+    print(f"  handled:            {stats.completed} ({stats.failed} raised)")
+    print(f"  replies sent:       {stats.replies} ({stats.errors} error replies)")
+    print(f"  threads created:    {stats.threads_created}")
+    print(f"  elapsed:            {elapsed:.2f}s")
+    print(f"  throughput:         {stats.completed / elapsed if elapsed else 0:.2f} msg/s")
+    print(
+        f"  latency:            p50 {ms(percentile(stats.latencies, 50))} | "
+        f"p95 {ms(percentile(stats.latencies, 95))} | p99 {ms(percentile(stats.latencies, 99))}"
+    )
+    print(
+        f"  event loop lag:     p50 {ms(percentile(stats.loop_lags, 50))} | "
+        f"p99 {ms(percentile(stats.loop_lags, 99))} | max {ms(max(stats.loop_lags, default=0.0))}"
+    )
+    if stub is not None:
+        print(f"  stub requests:      {stub.requests} ({stub.errors} injected errors)")
+    for name, order, stage in pipeline.report():
+        print(
+            f"  stage {name + ':':<13} {stage.calls} calls | avg {ms(stage.average)} | "
+            f"max {ms(stage.max)} | {stage.stops} stops | {stage.errors} errors"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    stub = None
+    base_url = args.base_url
+    if base_url is None:
+        stub = StubServer(config_from_arguments(args))
+        base_url = stub.start_in_thread()
+    # The chat cog builds its client from the environment on first use
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+    os.environ.setdefault("DEEPSEEK_API_KEY", "load-test")
+
+    # Keep the cog's persistent JSON files out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="chat-harness-"))
+    from cogs.chat import ChatCog, get_client
+
+    bot = FakeBot(asyncio.get_running_loop())
+    cog = ChatCog(bot)
+    await cog.cog_load()
+    # Measure the steady state, not the import of openai
+    await asyncio.to_thread(get_client)
+    harness = ChatHarness(cog, bot, threads=args.threads, channel_ratio=args.channel_ratio)
+    try:
+        elapsed = await harness.run(args.rate, args.duration)
+    finally:
+        bot._closed.set()
+        cog.save_task.cancel()
+        if stub is not None:
+            stub.stop_thread()
+    report(harness.stats, elapsed, stub, bot.pipeline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default=None, help="Use a running stub instead of an in-process one.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Target messages per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Dispatch duration in seconds.")
+    parser.add_argument("--threads", type=int, default=20, help="Number of simulated help threads.")
+    parser.add_argument(
+        "--channel-ratio",
+        type=float,
+        default=0.2,
+        help="Fraction of messages sent to the monitored channel (decision API) instead of threads.",
+    )
+    add_stub_arguments(parser)
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,343 @@
+"""
+Replays a gateway recording through the real bot, its cogs and their listeners, offline.
+
+Recordings are made by the owner `record` command. The events are fed to the parsers of the
+connection state, like the gateway does, so discord.py builds the same objects and dispatches
+them to `LinkManager`, `ChatCog`, `Moderation` and the message pipeline. The Discord HTTP API is
+replaced by a fake answering every request locally, the chat cog talks to the bundled OpenAI stub
+and the database is a temporary one.
+
+The report gives the throughput, the latency of each event type (from feeding the event to the
+end of every listener it dispatched) and the API calls the cogs made.
+
+Usage:
+    python -m loadtest.replay recording.ndjson.gz --speed 10 --forbid scam.example --api-latency-ms 50
+"""
+
+import argparse
+import asyncio
+import collections
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import discord
+from discord.http import HTTPClient, Route
+
+from loadtest.chat_harness import percentile
+from loadtest.stub_server import StubServer, add_stub_arguments, config_from_arguments
+from utils.recorder import GUILD_SNAPSHOT
+
+BOT_USER = {
+    "id": "1000000000000000001",
+    "username": "replay-bot",
+    "discriminator": "0",
+    "global_name": None,
+    "avatar": None,
+    "bot": True,
+}
+
+
+def read_recording(path: str):
+    """
+    This function will read a recording line by line, without decompressing it all in memory.
+
+    :param path: The recording, gzip-compressed or not.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class FakeHTTPClient(HTTPClient):
+    """
+    A Discord HTTP client answering every request locally with a plausible payload.
+
+    Messages, threads, DM channels, members and users are made up from the request, anything
+    else gets an empty answer, like the many 204 of the API. Every request is counted by route.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, *, latency: float = 0.0) -> None:
+        """
+        :param loop: The event loop of the bot.
+        :param latency: The time each request takes, in seconds. Default is 0.
+        """
+        super().__init__(loop)
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.bot = None
+        self._next_id = 0
+
+    def snowflake(self) -> str:
+        self._next_id += 1
+        return str(discord.utils.time_snowflake(datetime.now(timezone.utc)) + self._next_id % 4096)
+
+    def user(self, user_id) -> dict:
+        return {"id": str(user_id), "username": f"user-{user_id}", "discriminator": "0", "avatar": None}
+
+    def message(self, channel_id, payload: dict) -> dict:
+        return {
+            "id": self.snowflake(),
+            "channel_id": str(channel_id),
+            "author": BOT_USER,
+            "content": payload.get("content") or "",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": payload.get("embeds") or [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    def thread(self, channel_id, payload: dict) -> dict:
+        channel = self.bot.get_channel(int(channel_id)) if self.bot is not None else None
+        return {
+            "id": self.snowflake(),
+            "type": payload.get("type", 11),
+            "guild_id": str(channel.guild.id) if channel is not None else None,
+            "name": payload.get("name") or "thread",
+            "parent_id": str(channel_id),
+            "owner_id": BOT_USER["id"],
+            "thread_metadata": {
+                "archived": False,
+                "auto_archive_duration": payload.get("auto_archive_duration", 1440),
+                "archive_timestamp": datetime.now(timezone.utc).isoformat(),
+                "locked": False,
+            },
+        }
+
+    async def request(self, route: Route, *, files=None, form=None, **kwargs):
+        method, path = route.method, route.path
+        self.calls[f"{method} {path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        payload = kwargs.get("json") or {}
+        if isinstance(payload, list):
+            return []
+        if path.startswith("/channels/{channel_id}/messages") and method in ("POST", "PATCH"):
+            if path.endswith("/threads"):
+                return self.thread(route.channel_id, payload)
+            if not path.endswith(("/messages", "/{message_id}")):
+                return None
+            return self.message(route.channel_id, payload)
+        if path == "/channels/{channel_id}/threads" and method == "POST":
+            return self.thread(route.channel_id, payload)
+        if path == "/users/@me/channels":
+            return {"id": self.snowflake(), "type": 1, "recipients": [self.user(payload.get("recipient_id"))]}
+        if path.startswith("/guilds/{guild_id}/members/") and method in ("GET", "PATCH"):
+            member_id = route.url.rsplit("/", 1)[-1]
+            return {"user": self.user(member_id), "roles": [], "joined_at": datetime.now(timezone.utc).isoformat()}
+        if path.startswith("/users/") and method == "GET":
+            return self.user(route.url.rsplit("/", 1)[-1])
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class ReplayStats:
+    def __init__(self) -> None:
+        self.fed = collections.Counter()
+        self.parse_errors = collections.Counter()
+        self.handler_errors = 0
+        self.latencies = collections.defaultdict(list)
+        self.recorded_duration = 0.0
+
+
+class Replayer:
+    def __init__(self, bot, *, speed: float, max_in_flight: int) -> None:
+        self.bot = bot
+        self.speed = speed
+        self.stats = ReplayStats()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.pending = set()
+        self._collected = None
+        # Every listener the parsers dispatch goes through `_schedule_event`
+        schedule_event = bot._schedule_event
+
+        def collect(*args, **kwargs):
+            task = schedule_event(*args, **kwargs)
+            if self._collected is not None:
+                self._collected.append(task)
+            return task
+
+        bot._schedule_event = collect
+
+        async def on_error(event_method: str, *args, **kwargs) -> None:
+            self.stats.handler_errors += 1
+            bot.logger.exception("Replayed listener %s failed", event_method)
+
+        bot.on_error = on_error
+
+    def add_guild(self, data: dict) -> None:
+        state = self.bot._connection
+        state._add_guild(discord.Guild(data=data, state=state))
+
+    async def track(self, op: str, fed: float, tasks: list) -> None:
+        try:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.stats.latencies[op].append(time.perf_counter() - fed)
+        finally:
+            self.in_flight.release()
+
+    def feed(self, op: str, data) -> None:
+        parser = self.bot._connection.parsers.get(op)
+        if parser is None:
+            self.stats.parse_errors[op] += 1
+            self.in_flight.release()
+            return
+        fed = time.perf_counter()
+        self._collected = tasks = []
+        try:
+            parser(data)
+        except Exception:
+            self.stats.parse_errors[op] += 1
+            self.in_flight.release()
+            return
+        finally:
+            self._collected = None
+        self.stats.fed[op] += 1
+        task = asyncio.create_task(self.track(op, fed, tasks))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def run(self, path: str) -> float:
+        """
+        Feed the events of a recording at its pace divided by the speed, then wait for their listeners.
+
+        :param path: The recording.
+        :return: The elapsed wall time in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        start = None
+        for record in read_recording(path):
+            op, data = record["op"], record["d"]
+            if op == GUILD_SNAPSHOT:
+                self.add_guild(data)
+                continue
+            if start is None:
+                # The first event is replayed right away, whenever the recording started
+                start = loop.time()
+                first = record["t"]
+            self.stats.recorded_duration = record["t"] - first
+            if self.speed > 0:
+                await asyncio.sleep(max(0.0, start + (record["t"] - first) / self.speed - loop.time()))
+            await self.in_flight.acquire()
+            self.feed(op, data)
+        if self.pending:
+            await asyncio.gather(*self.pending)
+        return loop.time() - start if start is not None else 0.0
+
+
+def report(path: str, speed: float, stats: ReplayStats, elapsed: float, http: FakeHTTPClient, stub, stages: list) -> None:
+    ms = lambda seconds: f"{seconds * 1000:.1f}ms"
+    total = sum(stats.fed.values())
+    print(f"Gateway replay of {path}")
+    print(f"  speed:              {f'{speed:g}x' if speed > 0 else 'as fast as possible'}")
+    print(f"  events replayed:    {total} ({sum(stats.parse_errors.values())} not parsed, {stats.handler_errors} listener errors)")
+    print(f"  recorded over:      {stats.recorded_duration:.2f}s")
+    print(f"  elapsed:            {elapsed:.2f}s")
+    print(f"  throughput:         {total / elapsed if elapsed else 0:.1f} events/s")
+    print("  latency per event type:")
+    for op, latencies in sorted(stats.latencies.items()):
+        print(
+            f"    {op + ':':<22} {len(latencies):>7} | p50 {ms(percentile(latencies, 50))} | "
+            f"p95 {ms(percentile(latencies, 95))} | p99 {ms(percentile(latencies, 99))} | max {ms(max(latencies))}"
+        )
+    for op, count in sorted(stats.parse_errors.items()):
+        print(f"    {op + ':':<22} {count:>7} not parsed")
+    print(f"  Discord API calls:  {sum(http.calls.values())}")
+    for route, count in http.calls.most_common():
+        print(f"    {route:<60} {count:>7}")
+    if stub is not None:
+        print(f"  LLM stub requests:  {stub.requests} ({stub.errors} injected errors)")
+    for name, order, stage in stages:
+        print(
+            f"  stage {name + ':':<13} {stage.calls} calls | avg {ms(stage.average)} | "
+            f"max {ms(stage.max)} | {stage.stops} stops | {stage.errors} errors"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    path = os.path.abspath(args.recording)
+    stub = None
+    base_url = args.base_url
+    if base_url is None:
+        stub = StubServer(config_from_arguments(args))
+        base_url = stub.start_in_thread()
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+    os.environ.setdefault("DEEPSEEK_API_KEY", "replay")
+
+    # Keep the log, the database and the cogs' JSON files out of the working tree
+    workdir = tempfile.mkdtemp(prefix="gateway-replay-")
+    os.chdir(workdir)
+    import bot as bot_module
+
+    # The cogs log every deleted message, only their errors matter here
+    logging.disable(logging.NOTSET if args.verbose else logging.WARNING)
+    bot_module.DATABASE_PATH = os.path.join(workdir, "replay.db")
+    bot = bot_module.DiscordBot(profile=args.profile)
+    await bot._async_setup_hook()
+    http = FakeHTTPClient(bot.loop, latency=args.api_latency_ms / 1000)
+    http.bot = bot
+    bot.http = bot._connection.http = http
+    bot._connection.user = discord.ClientUser(state=bot._connection, data=BOT_USER)
+    try:
+        await bot.init_db()
+        bot.escalation = bot_module.EscalationEngine(bot.database)
+        await bot.load_cogs()
+        replayer = Replayer(bot, speed=args.speed, max_in_flight=args.max_in_flight)
+        # The links to forbid and the channels the chat cog answers in, for every recorded guild
+        guild_ids = [int(record["d"]["id"]) for record in read_recording(path) if record["op"] == GUILD_SNAPSHOT]
+        links = bot.get_cog("linkmanager")
+        if args.forbid and links is not None:
+            for guild_id in guild_ids:
+                await bot.database.add_forbidden_links(guild_id, args.forbid)
+            links.forbidden_links = await bot.database.get_forbidden_links()
+        chat = bot.get_cog("chat")
+        if args.chat_channel and chat is not None and guild_ids:
+            chat.active_channels = {str(guild_ids[0]): {"channels": [str(channel) for channel in args.chat_channel]}}
+            chat.index_active_channels()
+        elapsed = await replayer.run(path)
+        # Taken before closing the bot, which unloads the cogs and their stages
+        stages = bot.pipeline.report()
+    finally:
+        await bot.close()
+        if stub is not None:
+            stub.stop_thread()
+    report(path, args.speed, replayer.stats, elapsed, http, stub, stages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", help="A recording made by the owner `record` command.")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Pace of the replay, 10 for 10 times faster, 0 for as fast as possible."
+    )
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Events whose listeners may run at once.")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Latency of every fake Discord API call.")
+    parser.add_argument("--forbid", action="append", default=[], help="A domain to forbid in every guild, repeatable.")
+    parser.add_argument(
+        "--chat-channel", type=int, action="append", default=[], help="A channel the chat cog answers in, repeatable."
+    )
+    parser.add_argument("--profile", default="full", help="The intents profile of the bot.")
+    parser.add_argument("--verbose", action="store_true", help="Show the warnings of the cogs.")
+    parser.add_argument("--base-url", default=None, help="Use a running LLM stub instead of an in-process one.")
+    add_stub_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,287 @@
+"""
+Local OpenAI-compatible stub for load testing the chat cog without touching api.deepseek.com.
+
+It implements `POST /chat/completions` (also reachable as `/v1/chat/completions`), including
+server-sent-event streaming, with configurable latency, error rates and token usage.
+
+Usage:
+    python -m loadtest.stub_server --port 8089 --latency lognormal --latency-ms 400
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8089 python bot.py
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+LOREM = (
+    "to keep your wallet safe never share your seed phrase with anyone and only use "
+    "the official support channels listed by the project team"
+).split()
+
+
+class StubConfig:
+    def __init__(
+        self,
+        *,
+        latency: str = "fixed",
+        latency_ms: float = 200.0,
+        latency_spread: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        completion_tokens: int = 60,
+        yes_ratio: float = 0.3,
+        chunk_delay_ms: float = 5.0,
+        seed: int = None,
+    ) -> None:
+        """
+        :param latency: The latency distribution, one of `fixed`, `uniform`, `exponential` or `lognormal`.
+        :param latency_ms: The mean latency before the first byte, in milliseconds.
+        :param latency_spread: Relative spread for `uniform` (+/- fraction) or sigma for `lognormal`.
+        :param error_rate: Probability of answering with a 500 error.
+        :param rate_limit_rate: Probability of answering with a 429 error.
+        :param completion_tokens: The number of completion tokens generated per answer.
+        :param yes_ratio: Probability of answering `YES` to a help decision prompt.
+        :param chunk_delay_ms: Delay between two streamed chunks, in milliseconds.
+        :param seed: Optional seed for reproducible runs.
+        """
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.completion_tokens = completion_tokens
+        self.yes_ratio = yes_ratio
+        self.chunk_delay_ms = chunk_delay_ms
+        self.random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """
+        Draw a latency from the configured distribution.
+
+        :return: The latency in seconds.
+        """
+        mean = self.latency_ms / 1000
+        if self.latency == "uniform":
+            low = mean * (1 - self.latency_spread)
+            high = mean * (1 + self.latency_spread)
+            return max(0.0, self.random.uniform(low, high))
+        if self.latency == "exponential":
+            return self.random.expovariate(1 / mean) if mean > 0 else 0.0
+        if self.latency == "lognormal":
+            sigma = self.latency_spread
+            # Pick mu so that the distribution mean matches latency_ms
+            mu = math.log(mean) - sigma**2 / 2 if mean > 0 else 0.0
+            return self.random.lognormvariate(mu, sigma) if mean > 0 else 0.0
+        return mean
+
+
+class StubServer:
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.requests = 0
+        self.errors = 0
+        self.app = web.Application()
+        self.app.router.add_post("/chat/completions", self.chat_completions)
+        self.app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.runner = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8089) -> str:
+        """
+        Start serving in the running event loop.
+
+        :param host: The interface to bind to.
+        :param port: The port to bind to, 0 picks a free one.
+        :return: The base URL of the stub.
+        """
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Serve from a dedicated thread and event loop.
+
+        The chat cog currently calls the API synchronously, which blocks its own event loop,
+        so a stub sharing that loop could never answer.
+
+        :return: The base URL of the stub.
+        """
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        result = {}
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            result["url"] = loop.run_until_complete(self.start(host, port))
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="stub-server", daemon=True)
+        self._loop = loop
+        self._thread.start()
+        started.wait()
+        return result["url"]
+
+    def stop_thread(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _answer(self, messages: list) -> str:
+        system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        if "'YES' or 'NO'" in system:
+            return "YES" if self.config.random.random() < self.config.yes_ratio else "NO"
+        words = [
+            LOREM[i % len(LOREM)] for i in range(self.config.completion_tokens)
+        ]
+        return " ".join(words).capitalize() + "."
+
+    def _usage(self, messages: list, answer: str) -> dict:
+        prompt_tokens = sum(
+            len(m.get("content") or "") // 4 + 4 for m in messages
+        )
+        completion_tokens = max(1, len(answer.split()))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.config.sample_latency())
+
+        roll = self.config.random.random()
+        if roll < self.config.rate_limit_rate:
+            self.errors += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                status=429,
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.errors += 1
+            return web.json_response(
+                {"error": {"message": "Injected server error", "type": "server_error"}},
+                status=500,
+            )
+
+        messages = body.get("messages", [])
+        answer = self._answer(messages)
+        usage = self._usage(messages, answer)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "deepseek-chat")
+
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": answer},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+
+        async def send_chunk(delta: dict, finish_reason=None, extra=None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            if extra:
+                chunk.update(extra)
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send_chunk({"role": "assistant", "content": ""})
+        for word in answer.split(" "):
+            await send_chunk({"content": word + " "})
+            await asyncio.sleep(self.config.chunk_delay_ms / 1000)
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        await send_chunk({}, "stop", {"usage": usage} if include_usage else None)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--latency",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+        default="fixed",
+    )
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--yes-ratio", type=float, default=0.3)
+    parser.add_argument("--chunk-delay-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_arguments(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        completion_tokens=args.completion_tokens,
+        yes_ratio=args.yes_ratio,
+        chunk_delay_ms=args.chunk_delay_ms,
+        seed=args.seed,
+    )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = StubServer(config_from_arguments(args))
+    base_url = await server.start(args.host, args.port)
+    print(f"OpenAI-compatible stub listening on {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_stub_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,163 @@
+import asyncio
+import shutil
+import sqlite3
+
+import aiosqlite
+import pytest
+
+import database
+from database import DatabaseManager, run_migrations
+
+
+def run(coroutine) -> None:
+    asyncio.run(coroutine)
+
+
+async def open_database(path) -> DatabaseManager:
+    manager = await DatabaseManager.open(str(path), readers=1)
+    await manager.migrate()
+    return manager
+
+
+def test_migrations_create_schema(tmp_path) -> None:
+    async def scenario() -> None:
+        async with aiosqlite.connect(tmp_path / "bot.db") as connection:
+            version = await run_migrations(connection)
+            async with connection.execute("PRAGMA user_version") as cursor:
+                assert (await cursor.fetchone())[0] == version
+            async with connection.execute("SELECT name FROM sqlite_master WHERE type='table'") as cursor:
+                tables = {row[0] for row in await cursor.fetchall()}
+            # Running them again is a no-op
+            assert await run_migrations(connection) == version
+        assert {"warns", "escalation_policies", "backfill_checkpoints", "scam_images"} <= tables
+
+    run(scenario())
+
+
+def test_integer_warns_migration_keeps_rows(tmp_path) -> None:
+    async def scenario() -> None:
+        async with aiosqlite.connect(tmp_path / "bot.db") as connection:
+            assert await run_migrations(connection, target=1) == 1
+            await connection.executemany(
+                "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (1, "111111111111111111", "222222222222222222", "3", "First"),
+                    (2, "111111111111111111", "222222222222222222", "3", "Second"),
+                ],
+            )
+            await connection.commit()
+            await run_migrations(connection)
+            async with connection.execute(
+                "SELECT id, typeof(user_id), user_id, reason FROM warns WHERE server_id=? ORDER BY id",
+                (222222222222222222,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            async with connection.execute("PRAGMA index_list(warns)") as cursor:
+                indexes = {row[1] for row in await cursor.fetchall()}
+        assert rows == [
+            (1, "integer", 111111111111111111, "First"),
+            (2, "integer", 111111111111111111, "Second"),
+        ]
+        assert "idx_warns_server_user_id" in indexes
+
+    run(scenario())
+
+
+def test_failing_migration_leaves_database_untouched(tmp_path, monkeypatch) -> None:
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    shutil.copy(f"{database.MIGRATIONS_PATH}/0001_initial.sql", migrations)
+    (migrations / "0002_broken.sql").write_text(
+        "CREATE TABLE `half_done` (`id` INTEGER);\nINSERT INTO `missing_table` VALUES (1);\n"
+    )
+    monkeypatch.setattr(database, "MIGRATIONS_PATH", str(migrations))
+
+    async def scenario() -> None:
+        async with aiosqlite.connect(tmp_path / "bot.db") as connection:
+            with pytest.raises(sqlite3.OperationalError):
+                await run_migrations(connection)
+            async with connection.execute("PRAGMA user_version") as cursor:
+                assert (await cursor.fetchone())[0] == 1
+            async with connection.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name='half_done'"
+            ) as cursor:
+                assert (await cursor.fetchone())[0] == 0
+
+    run(scenario())
+
+
+def test_concurrent_warns_get_distinct_ids(tmp_path) -> None:
+    async def scenario() -> None:
+        manager = await open_database(tmp_path / "bot.db")
+        try:
+            results = await asyncio.gather(*(manager.add_warn(1, 2, 3, "Spam") for _ in range(50)))
+            assert sorted(warn_id for warn_id, _ in results) == list(range(1, 51))
+            assert max(total for _, total in results) == 50
+            # Other users of the server have their own IDs
+            assert (await manager.add_warn(4, 2, 3, "Spam"))[0] == 1
+        finally:
+            await manager.close()
+
+    run(scenario())
+
+
+def test_failed_write_rolled_back_alone(tmp_path) -> None:
+    async def scenario() -> None:
+        manager = await open_database(tmp_path / "bot.db")
+
+        async def insert(connection: aiosqlite.Connection, server_id: int) -> None:
+            await connection.execute(
+                "INSERT INTO escalation_policies(server_id, threshold, window_seconds, action) VALUES (?, 3, 3600, 'kick')",
+                (server_id,),
+            )
+
+        async def insert_then_fail(connection: aiosqlite.Connection) -> None:
+            await insert(connection, 2)
+            raise ValueError("Broken operation")
+
+        try:
+            # Queued together, the three writes are committed in the same batch
+            results = await asyncio.gather(
+                manager.write(lambda connection: insert(connection, 1)),
+                manager.write(insert_then_fail),
+                manager.write(lambda connection: insert(connection, 3)),
+                return_exceptions=True,
+            )
+            assert results[0] is None and results[2] is None
+            assert isinstance(results[1], ValueError)
+            rows = await manager.read("SELECT server_id FROM escalation_policies ORDER BY server_id")
+            assert [row[0] for row in rows] == [1, 3]
+        finally:
+            await manager.close()
+
+    run(scenario())
+
+
+def test_locked_database_fails_batch_and_writer_recovers(tmp_path) -> None:
+    async def scenario() -> None:
+        manager = await open_database(tmp_path / "bot.db")
+        await manager.connection.execute("PRAGMA busy_timeout = 50")
+        # Another process holding the write lock
+        other = sqlite3.connect(tmp_path / "bot.db", isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            with pytest.raises(sqlite3.OperationalError):
+                await asyncio.wait_for(manager.add_warn(1, 2, 3, "Spam"), 5)
+            other.execute("COMMIT")
+            assert await asyncio.wait_for(manager.add_warn(1, 2, 3, "Spam"), 5) == (1, 1)
+        finally:
+            other.close()
+            await manager.close()
+
+    run(scenario())
+
+
+def test_writes_queued_before_close_are_committed(tmp_path) -> None:
+    async def scenario() -> None:
+        manager = await open_database(tmp_path / "bot.db")
+        writes = [asyncio.create_task(manager.add_warn(1, 2, 3, "Spam")) for _ in range(10)]
+        await asyncio.sleep(0)
+        await manager.close()
+        assert sorted(warn_id for warn_id, _ in await asyncio.gather(*writes)) == list(range(1, 11))
+
+    run(scenario())
@@ -0,0 +1,124 @@
+import asyncio
+
+from utils import escalation
+from utils.escalation import EscalationEngine, EscalationPolicy, SlidingWindowCounter
+
+
+class FakeDatabase:
+    """
+    The two reads the escalation engine makes, served from memory.
+    """
+
+    def __init__(self, policies: list, history: list = ()) -> None:
+        self.policies = policies
+        self.history = list(history)
+        self.history_reads = 0
+
+    async def get_escalation_policies(self, guild_id: int) -> list:
+        return self.policies
+
+    async def get_warn_history(self, user_id: int, guild_id: int, since: int) -> list:
+        self.history_reads += 1
+        return [(warn_id, created) for warn_id, created in self.history if created >= since]
+
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_sliding_window_counter_expires_events() -> None:
+    counter = SlidingWindowCounter(60)
+    for timestamp in (0, 10, 50):
+        counter.add(timestamp)
+    assert counter.count(55) == 3
+    assert counter.count(65) == 2
+    assert counter.count(110) == 1
+    assert counter.count(111) == 0
+
+
+def test_policy_triggers_at_threshold_within_window(monkeypatch) -> None:
+    clock = Clock(1_000_000)
+    monkeypatch.setattr(escalation.time, "time", clock)
+    engine = EscalationEngine(FakeDatabase([(3, 3600, "timeout", 600)]))
+
+    async def scenario() -> None:
+        assert await engine.record(1, 2, 1) is None
+        clock.now += 60
+        assert await engine.record(1, 2, 2) is None
+        clock.now += 60
+        policy = await engine.record(1, 2, 3)
+        assert (policy.threshold, policy.action) == (3, "timeout")
+        # Another user of the guild has their own counters
+        assert await engine.record(1, 3, 4) is None
+
+    asyncio.run(scenario())
+
+
+def test_old_warns_leave_the_window(monkeypatch) -> None:
+    clock = Clock(1_000_000)
+    monkeypatch.setattr(escalation.time, "time", clock)
+    engine = EscalationEngine(FakeDatabase([(2, 3600, "kick", None)]))
+
+    async def scenario() -> None:
+        assert await engine.record(1, 2, 1) is None
+        clock.now += 3601
+        assert await engine.record(1, 2, 2) is None
+        clock.now += 10
+        assert (await engine.record(1, 2, 3)).action == "kick"
+
+    asyncio.run(scenario())
+
+
+def test_most_severe_policy_wins(monkeypatch) -> None:
+    clock = Clock(1_000_000)
+    monkeypatch.setattr(escalation.time, "time", clock)
+    policies = [(2, 3600, "timeout", 600), (3, 3600, "ban", None), (3, 86400, "kick", None)]
+    engine = EscalationEngine(FakeDatabase(policies))
+
+    async def scenario() -> list:
+        return [await engine.record(1, 2, warn_id) for warn_id in range(1, 4)]
+
+    first, second, third = asyncio.run(scenario())
+    assert first is None
+    assert second.action == "timeout"
+    assert third.action == "ban"
+
+
+def test_hydrated_warn_not_counted_twice(monkeypatch) -> None:
+    clock = Clock(1_000_000)
+    monkeypatch.setattr(escalation.time, "time", clock)
+    # Warn 2 is already stored when the counters are hydrated, as it is when `escalate` runs
+    database = FakeDatabase([(3, 3600, "kick", None)], history=[(1, clock.now - 60), (2, clock.now)])
+    engine = EscalationEngine(database)
+
+    async def scenario() -> None:
+        assert await engine.record(1, 2, 2) is None
+        assert (await engine.record(1, 2, 3)).action == "kick"
+        assert database.history_reads == 1
+
+    asyncio.run(scenario())
+
+
+def test_forget_rehydrates_counters(monkeypatch) -> None:
+    clock = Clock(1_000_000)
+    monkeypatch.setattr(escalation.time, "time", clock)
+    database = FakeDatabase([(2, 3600, "kick", None)])
+    engine = EscalationEngine(database)
+
+    async def scenario() -> None:
+        assert await engine.record(1, 2, 1) is None
+        # The warn was removed: the counters are rebuilt from the (now empty) history
+        engine.forget(1, 2)
+        assert await engine.record(1, 2, 2) is None
+        assert database.history_reads == 2
+
+    asyncio.run(scenario())
+
+
+def test_describe_policy() -> None:
+    assert EscalationPolicy(3, 3600, "timeout", 600).describe() == "3 warns in 1h → timeout for 10 minutes"
+    assert EscalationPolicy(5, 1800, "ban").describe() == "5 warns in 30m → ban"
@@ -0,0 +1,132 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.http import HTTPClient
+
+
+class FakeAPI:
+    """
+    A local JSON API counting the requests it serves and the connections they came through.
+    """
+
+    def __init__(self, *, status: int = 200, body: str = '{"value": 42}', delay: float = 0) -> None:
+        self.status = status
+        self.body = body
+        self.delay = delay
+        self.hits = 0
+        self.peers = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.hits += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return web.Response(status=self.status, text=self.body, content_type="application/json")
+
+
+def run(api: FakeAPI, scenario) -> None:
+    async def main() -> None:
+        app = web.Application()
+        app.router.add_get("/data", api.handle)
+        server = TestServer(app)
+        await server.start_server()
+        client = HTTPClient()
+        try:
+            await scenario(client, str(server.make_url("/data")))
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(main())
+
+
+def test_connection_reused() -> None:
+    api = FakeAPI()
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        for _ in range(5):
+            assert await client.get_json(url) == (200, {"value": 42})
+
+    run(api, scenario)
+    assert api.hits == 5
+    assert len(api.peers) == 1
+
+
+def test_cache_hit_and_expiry() -> None:
+    api = FakeAPI()
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        assert await client.get_json(url, ttl=0.2) == (200, {"value": 42})
+        assert await client.get_json(url, ttl=0.2) == (200, {"value": 42})
+        assert api.hits == 1
+        assert client.cache_hits == 1
+        await asyncio.sleep(0.3)
+        assert await client.get_json(url, ttl=0.2) == (200, {"value": 42})
+        assert api.hits == 2
+
+    run(api, scenario)
+
+
+def test_cache_keyed_by_params() -> None:
+    api = FakeAPI()
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        await client.get_json(url, params={"currency": "USD"}, ttl=30)
+        await client.get_json(url, params={"currency": "EUR"}, ttl=30)
+        await client.get_json(url, params={"currency": "USD"}, ttl=30)
+
+    run(api, scenario)
+    assert api.hits == 2
+
+
+def test_concurrent_requests_coalesced() -> None:
+    api = FakeAPI(delay=0.1)
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        responses = await asyncio.gather(*(client.get_json(url, ttl=30) for _ in range(20)))
+        assert responses == [(200, {"value": 42})] * 20
+        assert client.requests == 1
+
+    run(api, scenario)
+    assert api.hits == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch() -> None:
+    api = FakeAPI(delay=0.1)
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        first = asyncio.create_task(client.get_json(url, ttl=30))
+        second = asyncio.create_task(client.get_json(url, ttl=30))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        assert await second == (200, {"value": 42})
+
+    run(api, scenario)
+    assert api.hits == 1
+
+
+def test_error_response_not_cached() -> None:
+    api = FakeAPI(status=503, body="{}")
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        assert await client.get_json(url, ttl=30) == (503, None)
+        assert await client.get_json(url, ttl=30) == (503, None)
+
+    run(api, scenario)
+    assert api.hits == 2
+
+
+def test_invalid_json_raises_client_error() -> None:
+    api = FakeAPI(body="<html>Bad gateway</html>")
+
+    async def scenario(client: HTTPClient, url: str) -> None:
+        for _ in range(2):
+            with pytest.raises(aiohttp.ClientError):
+                await client.get_json(url, ttl=30)
+
+    run(api, scenario)
+    assert api.hits == 2
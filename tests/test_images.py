@@ -0,0 +1,79 @@
+import io
+import random
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image, ImageDraw, UnidentifiedImageError
+
+from utils.images import BKTree, dhash, hamming
+
+
+def image_bytes(image: Image.Image, file_format: str = "PNG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=file_format, **options)
+    return buffer.getvalue()
+
+
+def sample_image(seed: int) -> Image.Image:
+    rng = random.Random(seed)
+    image = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(300), rng.randrange(220)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 90)), fill=color)
+    return image
+
+
+def test_hamming() -> None:
+    assert hamming(0b1011, 0b1011) == 0
+    assert hamming(0b1011, 0b0010) == 2
+    assert hamming(0, 2**64 - 1) == 64
+
+
+def test_bktree_search_matches_brute_force() -> None:
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    # Near duplicates, as resized copies of the same image give
+    hashes += [value ^ (1 << rng.randrange(64)) for value in hashes[:200]]
+    tree = BKTree()
+    for index, value in enumerate(hashes):
+        tree.add(value, index)
+    assert len(tree) == len(hashes)
+    for _ in range(50):
+        query = rng.choice(hashes) ^ rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        for max_distance in (0, 4, 12):
+            expected = sorted(
+                (hamming(query, value), index)
+                for index, value in enumerate(hashes)
+                if hamming(query, value) <= max_distance
+            )
+            found = tree.search(query, max_distance)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_bktree_items_sharing_a_hash() -> None:
+    tree = BKTree()
+    tree.add(42, "first")
+    tree.add(42, "second")
+    assert sorted(tree.search(42, 0)) == [(0, "first"), (0, "second")]
+    assert BKTree().search(42, 10) == []
+
+
+def test_dhash_close_for_copies_and_far_for_other_images() -> None:
+    original = sample_image(1)
+    reference = dhash(image_bytes(original))
+    resized = dhash(image_bytes(original.resize((160, 120))))
+    recompressed = dhash(image_bytes(original, "JPEG", quality=40))
+    other = dhash(image_bytes(sample_image(2)))
+    assert hamming(reference, resized) <= 6
+    assert hamming(reference, recompressed) <= 6
+    assert hamming(reference, other) > 12
+
+
+def test_dhash_rejects_non_images() -> None:
+    with pytest.raises(UnidentifiedImageError):
+        dhash(b"not an image")
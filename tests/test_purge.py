@@ -0,0 +1,175 @@
+import asyncio
+import re
+from datetime import timedelta
+
+import discord
+
+from utils.purge import BackfillEngine, PurgeEngine, PurgeFilter
+
+NOW = discord.utils.utcnow()
+
+
+class FakeAuthor:
+    def __init__(self, user_id: int) -> None:
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", index: int, age: timedelta, author_id: int, content: str) -> None:
+        self.channel = channel
+        self.created_at = NOW - age
+        self.id = discord.utils.time_snowflake(self.created_at) + index
+        self.author = FakeAuthor(author_id)
+        self.content = content
+
+    async def delete(self) -> None:
+        self.channel.single_deletes += 1
+        self.channel.messages.remove(self)
+
+
+class FakeChannel:
+    """
+    A channel whose history is served from memory, newest first like Discord does.
+    """
+
+    def __init__(self, channel_id: int, messages: list) -> None:
+        self.id = channel_id
+        self.messages = [FakeMessage(self, index, *message) for index, message in enumerate(messages)]
+        self.bulk_deletes = []
+        self.single_deletes = 0
+        self.scans = 0
+
+    async def history(self, *, limit, after, before, oldest_first):
+        before_id = before.id if isinstance(before, discord.Object) else None
+        for message in sorted(self.messages, key=lambda message: message.id, reverse=True):
+            if after is not None and message.created_at <= after:
+                continue
+            if before_id is not None and message.id >= before_id:
+                continue
+            if before is not None and before_id is None and message.created_at >= before:
+                continue
+            self.scans += 1
+            yield message
+
+    async def delete_messages(self, batch: list) -> None:
+        self.bulk_deletes.append(len(batch))
+        for message in batch:
+            self.messages.remove(message)
+
+
+class FakeDatabase:
+    def __init__(self) -> None:
+        self.checkpoints = {}
+
+    async def save_backfill_checkpoint(self, server_id, scope, channel_id, *checkpoint) -> None:
+        self.checkpoints[channel_id] = checkpoint
+
+
+def spam_channel(channel_id: int, count: int, age: timedelta = timedelta(minutes=1)) -> FakeChannel:
+    return FakeChannel(
+        channel_id,
+        [(age + timedelta(seconds=index), 1 + index % 2, f"buy at https://scam.example/{index}") for index in range(count)],
+    )
+
+
+def matcher(content: str):
+    return "scam.example" if "scam.example" in content else None
+
+
+def test_filter_conditions_all_apply() -> None:
+    channel = FakeChannel(
+        1,
+        [
+            (timedelta(minutes=1), 1, "free nitro https://scam.example"),
+            (timedelta(minutes=2), 2, "free nitro https://scam.example"),
+            (timedelta(minutes=3), 1, "hello"),
+        ],
+    )
+    message_filter = PurgeFilter(authors={1}, pattern=re.compile("nitro"), has_link=True)
+    assert [message_filter.matches(message) for message in channel.messages] == [True, False, False]
+    message_filter.exclude.add(channel.messages[0].id)
+    assert not message_filter.matches(channel.messages[0])
+    assert PurgeFilter().is_empty()
+
+
+def test_purge_batches_recent_and_deletes_old_one_by_one() -> None:
+    recent = spam_channel(1, 250)
+    old = spam_channel(2, 3, age=timedelta(days=20))
+    engine = PurgeEngine([recent, old], PurgeFilter(forbidden_matcher=matcher), concurrency=2)
+    asyncio.run(engine.run())
+    assert recent.bulk_deletes == [100, 100, 50]
+    assert old.single_deletes == 3
+    assert (engine.scanned, engine.matched, engine.deleted, engine.channels_done) == (253, 253, 253, 2)
+
+
+def test_purge_time_range() -> None:
+    channel = FakeChannel(1, [(timedelta(minutes=minutes), 1, "https://scam.example") for minutes in (5, 30, 90)])
+    engine = PurgeEngine(
+        [channel],
+        PurgeFilter(forbidden_matcher=matcher),
+        after=NOW - timedelta(minutes=60),
+        before=NOW - timedelta(minutes=10),
+    )
+    asyncio.run(engine.run())
+    assert engine.deleted == 1
+    assert sorted(round((NOW - message.created_at).total_seconds() / 60) for message in channel.messages) == [5, 90]
+
+
+def backfill(channels: list, database: FakeDatabase, *, days: int = 0, domains: str = "key", **options) -> BackfillEngine:
+    engine = BackfillEngine(
+        channels,
+        matcher,
+        database=database,
+        server_id=1,
+        scope="*",
+        domains=domains,
+        checkpoints=dict(database.checkpoints),
+        after=NOW - timedelta(days=days) if days else None,
+        **options,
+    )
+    asyncio.run(engine.run())
+    return engine
+
+
+def test_backfill_skips_completed_channels() -> None:
+    database = FakeDatabase()
+    channel = spam_channel(1, 30)
+    assert backfill([channel], database).deleted == 30
+    again = backfill([channel], database)
+    assert (again.skipped, again.scanned) == (1, 0)
+
+
+def test_backfill_resumes_from_checkpoint() -> None:
+    database = FakeDatabase()
+    channel = FakeChannel(1, [(timedelta(minutes=index + 1), 1, "hello") for index in range(50)])
+    # Interrupted after the second checkpoint
+    database.checkpoints[1] = (channel.messages[19].id, 20, 0, False, None, "key")
+    engine = backfill([channel], database, checkpoint_every=10)
+    assert engine.scanned == 30
+    assert database.checkpoints[1][1:4] == (50, 0, True)
+
+
+def test_backfill_over_a_wider_range_scans_only_older_messages() -> None:
+    database = FakeDatabase()
+    channel = FakeChannel(1, [(timedelta(days=day, minutes=1), 1, "hello") for day in range(60)])
+    assert backfill([channel], database, days=7).scanned == 7
+    # Covered by the 7 day run
+    assert backfill([channel], database, days=3).skipped == 1
+    assert backfill([channel], database).scanned == 53
+    assert backfill([channel], database, days=30).skipped == 1
+
+
+def test_backfill_for_other_domains_starts_over() -> None:
+    database = FakeDatabase()
+    channel = FakeChannel(1, [(timedelta(minutes=index + 1), 1, "hello") for index in range(20)])
+    backfill([channel], database, domains="before")
+    assert backfill([channel], database, domains="after").scanned == 20
+
+
+def test_backfill_dry_run_deletes_nothing() -> None:
+    database = FakeDatabase()
+    channel = spam_channel(1, 10)
+    engine = backfill([channel], database, dry_run=True)
+    assert (engine.matched, engine.deleted, len(engine.hits)) == (10, 0, 10)
+    assert len(channel.messages) == 10
+    assert database.checkpoints == {}
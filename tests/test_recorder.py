@@ -0,0 +1,50 @@
+from utils.recorder import Anonymizer
+
+USER_ID = "175928847299117063"
+ROLE_ID = "41771983423143936"
+
+
+def message_payload() -> dict:
+    return {
+        "id": "1200000000000000000",
+        "channel_id": "1100000000000000000",
+        "content": "Hi Bob, claim it at https://scam.example/claim?id=42 now",
+        "author": {"id": USER_ID, "username": "bob", "avatar": "a1b2c3"},
+        "member": {"nick": "Bobby", "roles": [ROLE_ID]},
+        "embeds": [{"title": "Free nitro"}],
+        "attachments": [{"id": "1", "filename": "card.png", "url": "https://cdn.example/attachments/1/card.png"}],
+    }
+
+
+def test_snowflakes_hashed_consistently_keeping_their_time() -> None:
+    anonymizer = Anonymizer()
+    first = anonymizer.scrub(message_payload())
+    second = anonymizer.scrub(message_payload())
+    assert first["author"]["id"] != USER_ID
+    assert first["author"]["id"] == second["author"]["id"]
+    assert first["member"]["roles"] == second["member"]["roles"] != [ROLE_ID]
+    # The 42 timestamp bits, and so the creation date, are kept
+    assert int(first["id"]) >> 22 == 1200000000000000000 >> 22
+    # Another key gives other IDs
+    assert Anonymizer().scrub(message_payload())["author"]["id"] != first["author"]["id"]
+
+
+def test_identifying_fields_removed() -> None:
+    anonymizer = Anonymizer()
+    payload = message_payload()
+    scrubbed = anonymizer.scrub(payload)
+    assert scrubbed["author"]["username"] == "name-1"
+    assert scrubbed["member"]["nick"] == "name-2"
+    assert scrubbed["author"]["avatar"] is None
+    assert scrubbed["embeds"] == []
+    assert scrubbed["attachments"][0]["filename"].endswith(".png")
+    assert "card" not in scrubbed["attachments"][0]["url"]
+    # The original payload is left untouched
+    assert payload == message_payload()
+
+
+def test_text_keeps_its_shape_and_link_domains() -> None:
+    content = Anonymizer().scrub(message_payload())["content"]
+    assert "Bob" not in content and "claim?id" not in content
+    assert content.startswith("xx xxx, xxxxx xx xx https://scam.example/")
+    assert content.endswith(" xxx")
@@ -0,0 +1,137 @@
+import asyncio
+import random
+
+from database import DatabaseManager
+from database.cache import WarningsCache
+
+SERVER_ID = 1
+USERS = (10, 11, 12)
+
+
+def test_invalidate_discards_load_in_flight() -> None:
+    cache = WarningsCache()
+
+    async def scenario() -> None:
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def loader() -> tuple:
+            loading.set()
+            await release.wait()
+            return ("stale",)
+
+        task = asyncio.create_task(cache.get((1, 2), loader))
+        await loading.wait()
+        cache.invalidate((1, 2))
+        release.set()
+        assert await task == ("stale",)
+        assert cache.peek((1, 2)) is None
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_drops_every_kind() -> None:
+    cache = WarningsCache()
+
+    async def scenario() -> None:
+        async def rows() -> tuple:
+            return ((1,),)
+
+        async def count() -> int:
+            return 1
+
+        await cache.get((1, 2), rows)
+        await cache.get((1, 2), count, kind="count")
+        assert await cache.get((1, 2), count, kind="count") == 1
+        cache.invalidate((1, 2))
+        assert cache.peek((1, 2)) is None
+        assert cache.peek((1, 2), kind="count") is None
+
+    asyncio.run(scenario())
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction() -> None:
+    cache = WarningsCache(max_entries=2)
+
+    async def scenario() -> None:
+        for user_id in range(3):
+
+            async def loader() -> tuple:
+                return ()
+
+            await cache.get((1, user_id), loader)
+
+    asyncio.run(scenario())
+    assert len(cache) == 2
+    assert cache.peek((1, 0)) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_no_stale_entry_under_concurrent_writes(tmp_path) -> None:
+    async def scenario() -> None:
+        database = await DatabaseManager.open(str(tmp_path / "warns.db"), readers=2)
+        await database.migrate()
+        rng = random.Random(0)
+
+        writing = set(USERS)
+
+        async def reader(user_id: int) -> None:
+            # Loads racing with the writes, the ones started before a commit must not be cached
+            while user_id in writing:
+                await database.get_warnings(user_id, SERVER_ID)
+                await database.count_warnings(user_id, SERVER_ID)
+                await database.get_warnings_page(user_id, SERVER_ID, limit=5)
+                # Cache hits never suspend, let the writers run
+                await asyncio.sleep(0)
+
+        async def writer(user_id: int) -> None:
+            try:
+                await write_and_check(user_id)
+            finally:
+                writing.discard(user_id)
+
+        async def write_and_check(user_id: int) -> None:
+            # Every write must be visible to the next read, whatever the readers cached meanwhile
+            mine = []
+            for _ in range(100):
+                if mine and rng.random() < 0.4:
+                    warn_id = mine.pop(rng.randrange(len(mine)))
+                    await database.remove_warn(warn_id, user_id, SERVER_ID)
+                    present = False
+                else:
+                    warn_id, _ = await database.add_warn(user_id, SERVER_ID, 1, "Test")
+                    mine.append(warn_id)
+                    present = True
+                view = rng.choice(("rows", "page", "count"))
+                if view == "rows":
+                    ids = [row[5] for row in await database.get_warnings(user_id, SERVER_ID)]
+                    assert (warn_id in ids) == present
+                elif view == "page":
+                    page = await database.get_warnings_page(
+                        user_id, SERVER_ID, after_id=warn_id - 1, limit=1
+                    )
+                    assert (bool(page) and page[0][5] == warn_id) == present
+                else:
+                    assert await database.count_warnings(user_id, SERVER_ID) == len(mine)
+
+        try:
+            await asyncio.gather(
+                *(writer(user_id) for user_id in USERS),
+                *(reader(user_id) for user_id in USERS for _ in range(4)),
+            )
+            for user_id in USERS:
+                rows = await database.read(
+                    "SELECT id FROM warns WHERE server_id=? AND user_id=? ORDER BY id",
+                    (SERVER_ID, user_id),
+                )
+                expected = [row[0] for row in rows]
+                assert [row[5] for row in await database.get_warnings(user_id, SERVER_ID)] == expected
+                assert await database.count_warnings(user_id, SERVER_ID) == len(expected)
+                page = await database.get_warnings_page(user_id, SERVER_ID, limit=10)
+                assert [row[5] for row in page] == expected[:10]
+            assert database.warnings_cache.hits > 0
+        finally:
+            await database.close()
+
+    asyncio.run(scenario())
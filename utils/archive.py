@@ -0,0 +1,158 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import discord
+
+from utils.files import AsyncGzipWriter, read_json, write_json
+
+ARCHIVE_ROOT = os.path.join(tempfile.gettempdir(), "mod-radar-archives")
+
+
+class ChannelArchiver:
+    """
+    Streams the history of a channel into gzip-compressed parts below a size limit.
+
+    History pages are formatted and written batch by batch through a thread-offloaded gzip writer,
+    so memory stays constant however many messages are archived. Every `checkpoint_every` messages
+    the current part is made resumable and the position is saved in `checkpoint.json`; running the
+    archiver again for the same channel and limit continues from there.
+    """
+
+    def __init__(
+        self,
+        channel: discord.abc.Messageable,
+        guild: discord.Guild,
+        *,
+        limit: int,
+        before: discord.abc.Snowflake,
+        max_part_size: int,
+        batch_size: int = 100,
+        checkpoint_every: int = 1000,
+        progress_interval: float = 5.0,
+    ) -> None:
+        """
+        :param channel: The channel to archive.
+        :param guild: The guild of the channel.
+        :param limit: The number of messages to archive, 0 for the whole channel.
+        :param before: Only messages before this one are archived when starting fresh.
+        :param max_part_size: The maximum size of a part in bytes.
+        :param batch_size: The number of lines handed to the writer thread at once. Default is 100.
+        :param checkpoint_every: The number of messages between two checkpoints. Default is 1000.
+        :param progress_interval: The minimum number of seconds between two progress callbacks. Default is 5.
+        """
+        self.channel = channel
+        self.guild = guild
+        self.limit = limit
+        self.before = before
+        # Keep some room for data still buffered in the compressor and the gzip trailer
+        self.max_part_size = int(max_part_size * 0.9)
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.progress_interval = progress_interval
+        self.directory = os.path.join(ARCHIVE_ROOT, str(channel.id))
+        self.checkpoint_path = os.path.join(self.directory, "checkpoint.json")
+        self.state = None
+        self.resumed = False
+
+    def part_path(self, part: int) -> str:
+        return os.path.join(self.directory, f"{self.channel.id}.part{part}.log.gz")
+
+    @property
+    def parts(self) -> list:
+        if self.state is None:
+            return []
+        return [self.part_path(part) for part in range(1, self.state["part"] + 1)]
+
+    async def _load_state(self) -> None:
+        state = await read_json(self.checkpoint_path)
+        if state is not None and state.get("limit") == self.limit and not state.get("complete"):
+            self.state = state
+            self.resumed = True
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = {
+            "limit": self.limit,
+            "before_id": self.before.id,
+            "part": 1,
+            "offset": None,
+            "messages": 0,
+            "complete": False,
+        }
+
+    def format_message(self, message: discord.Message) -> str:
+        attachments = [attachment.url for attachment in message.attachments]
+        attachments_text = (
+            f"[Attached File{'s' if len(attachments) >= 2 else ''}: {', '.join(attachments)}]"
+            if len(attachments) >= 1
+            else ""
+        )
+        return f"{message.created_at.strftime('%d.%m.%Y %H:%M:%S')} {message.author} {message.id}: {message.clean_content} {attachments_text}\n"
+
+    async def run(self, on_progress=None) -> list:
+        """
+        This function will archive the channel, resuming from the last checkpoint if there is one.
+
+        :param on_progress: An optional coroutine function called with the archiver while it runs.
+        :return: The paths of the parts, oldest part first.
+        """
+        await self._load_state()
+        state = self.state
+        writer = await AsyncGzipWriter(
+            self.part_path(state["part"]), resume_offset=state["offset"]
+        ).open()
+        if state["offset"] is None and state["part"] == 1:
+            await writer.write_lines(
+                [
+                    f'Archived messages from: #{self.channel} ({self.channel.id}) in the guild "{self.guild}" ({self.guild.id}) at {datetime.now().strftime("%d.%m.%Y %H:%M:%S")}\n'
+                ]
+            )
+
+        remaining = None if self.limit == 0 else self.limit - state["messages"]
+        lines = []
+        last_id = state["before_id"]
+        since_checkpoint = 0
+        last_progress = time.monotonic()
+        try:
+            if remaining is None or remaining > 0:
+                async for message in self.channel.history(
+                    limit=remaining, before=discord.Object(id=state["before_id"])
+                ):
+                    lines.append(self.format_message(message))
+                    last_id = message.id
+                    if len(lines) < self.batch_size:
+                        continue
+                    writer = await self._flush(writer, lines, last_id)
+                    since_checkpoint += len(lines)
+                    lines = []
+                    if since_checkpoint >= self.checkpoint_every:
+                        await self._checkpoint(writer, last_id)
+                        since_checkpoint = 0
+                    if on_progress is not None and time.monotonic() - last_progress >= self.progress_interval:
+                        last_progress = time.monotonic()
+                        await on_progress(self)
+            writer = await self._flush(writer, lines, last_id)
+            state["complete"] = True
+            await self._checkpoint(writer, last_id)
+        finally:
+            await writer.close()
+        return self.parts
+
+    async def _flush(self, writer: AsyncGzipWriter, lines: list, last_id: int) -> AsyncGzipWriter:
+        await writer.write_lines(lines)
+        self.state["messages"] += len(lines)
+        if writer.compressed_size < self.max_part_size:
+            return writer
+        # Close the full part and continue in a new one
+        await writer.close()
+        self.state["part"] += 1
+        self.state["offset"] = None
+        self.state["before_id"] = last_id
+        await write_json(self.checkpoint_path, self.state)
+        return await AsyncGzipWriter(self.part_path(self.state["part"])).open()
+
+    async def _checkpoint(self, writer: AsyncGzipWriter, last_id: int) -> None:
+        self.state["offset"] = await writer.checkpoint()
+        self.state["before_id"] = last_id
+        await write_json(self.checkpoint_path, self.state)
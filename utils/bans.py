@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import discord
+
+# The bulk ban endpoint accepts at most 200 users per request
+BULK_BAN_SIZE = 200
+
+
+class BanCache:
+    """
+    The IDs of the banned users of each guild, fetched once and then kept up to date by ban/unban events.
+    """
+
+    def __init__(self, ttl: float = 3600) -> None:
+        """
+        :param ttl: Seconds after which a guild's ban list is fetched again, in case events were missed. Default is 3600.
+        """
+        self.ttl = ttl
+        self._bans = {}
+        self._fetched_at = {}
+        self._locks = {}
+
+    async def get(self, guild: discord.Guild) -> set:
+        """
+        This function will return the IDs of the banned users of a guild, fetching them if needed.
+
+        :param guild: The guild.
+        :return: A set of user IDs.
+        """
+        lock = self._locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            fetched_at = self._fetched_at.get(guild.id)
+            if fetched_at is None or time.monotonic() - fetched_at > self.ttl:
+                self._bans[guild.id] = {entry.user.id async for entry in guild.bans(limit=None)}
+                self._fetched_at[guild.id] = time.monotonic()
+        return self._bans[guild.id]
+
+    def add(self, guild_id: int, user_id: int) -> None:
+        if guild_id in self._bans:
+            self._bans[guild_id].add(user_id)
+
+    def remove(self, guild_id: int, user_id: int) -> None:
+        if guild_id in self._bans:
+            self._bans[guild_id].discard(user_id)
+
+
+class MassBan:
+    """
+    Bans many users through a small pool of workers.
+
+    Users are sent by chunks of 200 to the bulk ban endpoint when the library supports it, otherwise
+    one by one. Every request goes through discord.py's HTTP client, which waits on the rate-limit
+    bucket of the route and retries on 429, so the pool size only bounds how many requests are queued
+    on the bucket at once.
+    """
+
+    def __init__(
+        self,
+        guild: discord.Guild,
+        user_ids: list,
+        *,
+        reason: str,
+        ban_cache: BanCache,
+        workers: int = 2,
+    ) -> None:
+        """
+        :param guild: The guild to ban the users from.
+        :param user_ids: The IDs of the users to ban, already deduplicated.
+        :param reason: The reason shown in the audit log.
+        :param ban_cache: The ban cache updated as users get banned.
+        :param workers: The number of concurrent workers. Default is 2.
+        """
+        self.guild = guild
+        self.user_ids = user_ids
+        self.reason = reason
+        self.ban_cache = ban_cache
+        self.workers = workers
+        self.banned = 0
+        self.failed = 0
+        self.banned_ids = []
+        self.started = None
+
+    @property
+    def done(self) -> int:
+        return self.banned + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def throughput(self) -> float:
+        """
+        :return: The processed users per second.
+        """
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    async def run(self) -> None:
+        self.started = time.monotonic()
+        bulk = hasattr(self.guild, "bulk_ban")
+        size = BULK_BAN_SIZE if bulk else 1
+        queue = asyncio.Queue()
+        for start in range(0, len(self.user_ids), size):
+            queue.put_nowait(self.user_ids[start : start + size])
+
+        async def worker() -> None:
+            while not queue.empty():
+                chunk = queue.get_nowait()
+                if bulk:
+                    await self._bulk_ban(chunk)
+                else:
+                    await self._ban(chunk[0])
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+
+    async def _bulk_ban(self, chunk: list) -> None:
+        try:
+            result = await self.guild.bulk_ban(
+                [discord.Object(id=user_id) for user_id in chunk],
+                reason=self.reason,
+                delete_message_seconds=0,
+            )
+        except discord.HTTPException:
+            # The whole request failed (e.g. none of the users could be banned), retry them one by one
+            for user_id in chunk:
+                await self._ban(user_id)
+            return
+        for user in result.banned:
+            self.ban_cache.add(self.guild.id, user.id)
+            self.banned_ids.append(user.id)
+        self.banned += len(result.banned)
+        self.failed += len(result.failed)
+
+    async def _ban(self, user_id: int) -> None:
+        try:
+            await self.guild.ban(
+                discord.Object(id=user_id), reason=self.reason, delete_message_seconds=0
+            )
+            self.ban_cache.add(self.guild.id, user_id)
+            self.banned_ids.append(user_id)
+            self.banned += 1
+        except discord.HTTPException:
+            self.failed += 1
@@ -0,0 +1,215 @@
+import asyncio
+import collections
+import time
+from datetime import timedelta
+
+import discord
+
+ACTIONS = ("timeout", "kick", "ban")
+# Discord refuses timeouts longer than 28 days
+MAX_TIMEOUT = 28 * 24 * 3600
+
+
+class EscalationPolicy:
+    __slots__ = ("threshold", "window", "action", "duration")
+
+    def __init__(self, threshold: int, window: int, action: str, duration: int = None) -> None:
+        """
+        :param threshold: The number of warns that triggers the policy.
+        :param window: The time window the warns are counted in, in seconds.
+        :param action: The action to apply, `timeout`, `kick` or `ban`.
+        :param duration: The duration of a timeout, in seconds.
+        """
+        self.threshold = threshold
+        self.window = window
+        self.action = action
+        self.duration = duration
+
+    @property
+    def severity(self) -> tuple:
+        return ACTIONS.index(self.action), self.duration or 0, self.threshold
+
+    def describe(self) -> str:
+        window = f"{self.window // 3600}h" if self.window % 3600 == 0 else f"{self.window // 60}m"
+        action = self.action
+        if self.action == "timeout":
+            action = f"timeout for {self.duration // 60} minutes"
+        return f"{self.threshold} warns in {window} → {action}"
+
+
+class SlidingWindowCounter:
+    """
+    Counts the events of the last `window` seconds. Each event is appended once and expired once, so a warn costs O(1) amortized.
+    """
+
+    __slots__ = ("window", "events")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.events = collections.deque()
+
+    def add(self, timestamp: float) -> None:
+        self.events.append(timestamp)
+
+    def count(self, now: float) -> int:
+        horizon = now - self.window
+        events = self.events
+        while events and events[0] < horizon:
+            events.popleft()
+        return len(events)
+
+
+class UserCounters:
+    __slots__ = ("max_warn_id", "windows")
+
+    def __init__(self, windows: dict, max_warn_id: int) -> None:
+        self.windows = windows
+        # The newest warn already counted, so a warn included by the hydration query isn't counted twice
+        self.max_warn_id = max_warn_id
+
+
+class EscalationEngine:
+    """
+    Applies the escalation policies of a guild when a user collects enough warns in a time window.
+
+    Each (guild, user) has one sliding-window counter per distinct policy window. Counters are kept in a
+    bounded LRU and hydrated from the warns table on first use, so they survive restarts and evictions.
+    Recording a warn appends to each counter and checks every policy of the guild, which is O(1) for the
+    handful of policies a guild has.
+    """
+
+    def __init__(self, database, max_users: int = 50_000) -> None:
+        """
+        :param database: The database manager.
+        :param max_users: The maximum number of (guild, user) counters kept in memory. Default is 50 000.
+        """
+        self.database = database
+        self.max_users = max_users
+        self._policies = {}
+        self._counters = collections.OrderedDict()
+        self._policy_locks = collections.defaultdict(asyncio.Lock)
+
+    async def get_policies(self, guild_id: int) -> list:
+        """
+        This function will return the policies of a guild, most severe first.
+
+        :param guild_id: The ID of the guild.
+        """
+        policies = self._policies.get(guild_id)
+        if policies is None:
+            async with self._policy_locks[guild_id]:
+                policies = self._policies.get(guild_id)
+                if policies is None:
+                    rows = await self.database.get_escalation_policies(guild_id)
+                    policies = sorted(
+                        (EscalationPolicy(*row) for row in rows),
+                        key=lambda policy: policy.severity,
+                        reverse=True,
+                    )
+                    self._policies[guild_id] = policies
+        return policies
+
+    async def set_policy(self, guild_id: int, policy: EscalationPolicy) -> None:
+        await self.database.set_escalation_policy(
+            guild_id, policy.threshold, policy.window, policy.action, policy.duration
+        )
+        self._reset_guild(guild_id)
+
+    async def remove_policy(self, guild_id: int, threshold: int, window: int) -> bool:
+        removed = await self.database.remove_escalation_policy(guild_id, threshold, window)
+        self._reset_guild(guild_id)
+        return removed
+
+    def _reset_guild(self, guild_id: int) -> None:
+        # The set of windows may have changed, counters are rebuilt from the warns table
+        self._policies.pop(guild_id, None)
+        for key in [key for key in self._counters if key[0] == guild_id]:
+            del self._counters[key]
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        """
+        This function will drop the counters of a user, e.g. after one of their warns was removed.
+        """
+        self._counters.pop((guild_id, user_id), None)
+
+    async def _hydrate(self, guild_id: int, user_id: int, policies: list) -> UserCounters:
+        windows = {policy.window for policy in policies}
+        since = int(time.time()) - max(windows)
+        history = await self.database.get_warn_history(user_id, guild_id, since)
+        counters = {window: SlidingWindowCounter(window) for window in windows}
+        for _, created in history:
+            for counter in counters.values():
+                counter.add(created)
+        return UserCounters(counters, max((warn_id for warn_id, _ in history), default=0))
+
+    async def record(self, guild_id: int, user_id: int, warn_id: int):
+        """
+        This function will count a warn that has just been stored and return the policy it triggers.
+
+        :param guild_id: The ID of the guild.
+        :param user_id: The ID of the warned user.
+        :param warn_id: The ID of the stored warn.
+        :return: The most severe triggered policy, or None.
+        """
+        policies = await self.get_policies(guild_id)
+        if not policies:
+            return None
+        key = (guild_id, user_id)
+        counters = self._counters.get(key)
+        if counters is None:
+            hydrated = await self._hydrate(guild_id, user_id, policies)
+            # Another warn may have hydrated the same user meanwhile, keep a single copy
+            counters = self._counters.setdefault(key, hydrated)
+            if len(self._counters) > self.max_users:
+                self._counters.popitem(last=False)
+        self._counters.move_to_end(key)
+
+        now = time.time()
+        if warn_id > counters.max_warn_id:
+            counters.max_warn_id = warn_id
+            for counter in counters.windows.values():
+                counter.add(now)
+        for policy in policies:
+            counter = counters.windows.get(policy.window)
+            if counter is not None and counter.count(now) >= policy.threshold:
+                return policy
+        return None
+
+    async def escalate(
+        self, guild: discord.Guild, user_id: int, warn_id: int, reason: str
+    ):
+        """
+        This function will count a warn and apply the policy it triggers, if any.
+
+        :param guild: The guild of the warn.
+        :param user_id: The ID of the warned user.
+        :param warn_id: The ID of the stored warn.
+        :param reason: The reason shown in the audit log.
+        :return: The applied policy, or None.
+        """
+        policy = await self.record(guild.id, user_id, warn_id)
+        if policy is None:
+            return None
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                member = None
+        if member is not None and member.guild_permissions.administrator:
+            return None
+        reason = f"{reason} ({policy.describe()})"
+        if policy.action == "ban":
+            await guild.ban(discord.Object(id=user_id), reason=reason, delete_message_seconds=0)
+        elif member is None:
+            # Timeouts and kicks need the user to still be in the guild
+            return None
+        elif policy.action == "kick":
+            await member.kick(reason=reason)
+        else:
+            await member.timeout(
+                timedelta(seconds=min(policy.duration or 3600, MAX_TIMEOUT)), reason=reason
+            )
+        # Automatic actions have no moderator
+        self.database.log_action(guild.id, policy.action, target_id=user_id, reason=reason)
+        return policy
@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+
+
+class AsyncGzipWriter:
+    """
+    A gzip text file whose compression and disk writes run in a worker thread, so the event loop never blocks on them.
+
+    The file can be made resumable: `checkpoint` ends the current gzip member and returns the byte
+    offset where the next one starts. Reopening the file with that offset as `resume_offset` drops
+    anything written after the checkpoint and appends a new member. Multi-member files decompress
+    as a single stream with gzip, zcat or Python's gzip module.
+
+    Usage:
+        async with AsyncGzipWriter(path) as writer:
+            await writer.write_lines(lines)
+    """
+
+    def __init__(
+        self, path: str, compresslevel: int = 6, resume_offset: int = None
+    ) -> None:
+        """
+        :param path: The path of the file to create.
+        :param compresslevel: The gzip compression level. Default is 6.
+        :param resume_offset: The offset returned by `checkpoint` to resume from. Default is None, which truncates the file.
+        """
+        self.path = path
+        self.compresslevel = compresslevel
+        self.resume_offset = resume_offset
+        self.lines_written = 0
+        self._raw = None
+        self._file = None
+
+    def _start_member(self) -> None:
+        self._file = io.TextIOWrapper(
+            gzip.GzipFile(
+                fileobj=self._raw, mode="wb", compresslevel=self.compresslevel
+            ),
+            encoding="utf-8",
+        )
+
+    def _open(self) -> None:
+        if self.resume_offset is None:
+            self._raw = open(self.path, "wb")
+        else:
+            self._raw = open(self.path, "r+b")
+            self._raw.truncate(self.resume_offset)
+            self._raw.seek(self.resume_offset)
+        self._start_member()
+
+    async def open(self) -> "AsyncGzipWriter":
+        await asyncio.to_thread(self._open)
+        return self
+
+    async def write_lines(self, lines: list) -> None:
+        """
+        This function will write a batch of lines, which must already end with a newline.
+
+        :param lines: The lines to write.
+        """
+        if not lines:
+            return
+        await asyncio.to_thread(self._file.writelines, lines)
+        self.lines_written += len(lines)
+
+    def _checkpoint(self) -> int:
+        # Closing the text wrapper closes the gzip member but not the underlying file
+        self._file.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        offset = self._raw.tell()
+        self._start_member()
+        return offset
+
+    async def checkpoint(self) -> int:
+        """
+        This function will make everything written so far durable and resumable.
+
+        :return: The offset to pass as `resume_offset` when resuming.
+        """
+        return await asyncio.to_thread(self._checkpoint)
+
+    @property
+    def compressed_size(self) -> int:
+        """
+        The number of compressed bytes written to disk so far (data still buffered by the compressor is not counted).
+        """
+        return self._raw.tell() if self._raw is not None else 0
+
+    def _close(self) -> None:
+        self._file.close()
+        self._raw.close()
+
+    async def close(self) -> None:
+        if self._file is not None:
+            await asyncio.to_thread(self._close)
+            self._file = None
+
+    async def __aenter__(self) -> "AsyncGzipWriter":
+        return await self.open()
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+def _write_json(path: str, data: dict) -> None:
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+async def write_json(path: str, data: dict) -> None:
+    """
+    This function will atomically replace a JSON file from a worker thread.
+
+    :param path: The path of the file.
+    :param data: The data to serialize.
+    """
+    await asyncio.to_thread(_write_json, path, data)
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+async def read_json(path: str):
+    """
+    This function will read a JSON file from a worker thread.
+
+    :param path: The path of the file.
+    :return: The data, or None if the file doesn't exist.
+    """
+    return await asyncio.to_thread(_read_json, path)
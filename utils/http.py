@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+
+class HTTPClient:
+    """
+    The bot-wide client for outbound HTTP requests.
+
+    Every request goes through one pooled `aiohttp.ClientSession`, so connections (and their TLS
+    sessions) are reused across commands and the number of open connections is bounded, in total and
+    per host. GET requests made with a `ttl` are cached, and concurrent identical requests share a
+    single fetch while it is in flight, so a spammed command hits the API at most once per `ttl`.
+    """
+
+    def __init__(
+        self,
+        *,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        timeout: float = 10.0,
+        max_cached: int = 1024,
+    ) -> None:
+        """
+        :param limit: The maximum number of open connections. Default is 100.
+        :param limit_per_host: The maximum number of open connections to a single host. Default is 10.
+        :param timeout: The total timeout of a request, in seconds. Default is 10.
+        :param max_cached: The maximum number of cached responses. Default is 1024.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 5.0))
+        self.max_cached = max_cached
+        self.requests = 0
+        self.cache_hits = 0
+        self._session = None
+        self._cache = collections.OrderedDict()
+        self._inflight = {}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created on first use, as the session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def get_json(self, url: str, *, params: dict = None, ttl: float = 0) -> tuple:
+        """
+        This function will GET a JSON document.
+
+        :param url: The URL to fetch.
+        :param params: The query string parameters.
+        :param ttl: The number of seconds a successful response is cached. Default is 0, no caching.
+        :return: The status code and the decoded JSON body, None if the request failed.
+        :raises aiohttp.ClientError: The request could not be sent, or the body isn't valid JSON.
+        :raises asyncio.TimeoutError: The server did not answer in time.
+        """
+        if ttl <= 0:
+            return await self._fetch_json(url, params)
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_cached(key, url, params, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A caller giving up must not cancel the fetch the other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _fetch_cached(self, key: tuple, url: str, params: dict, ttl: float) -> tuple:
+        response = await self._fetch_json(url, params)
+        if response[0] == 200:
+            self._cache[key] = (time.monotonic() + ttl, response)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return response
+
+    async def _fetch_json(self, url: str, params: dict) -> tuple:
+        self.requests += 1
+        async with self.session.get(url, params=params) as response:
+            if response.status != 200:
+                return response.status, None
+            # Some APIs answer JSON with a text/* content type
+            try:
+                return response.status, await response.json(content_type=None)
+            except ValueError as e:
+                # A broken body is a failed request for the callers, and is never cached
+                raise aiohttp.ContentTypeError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=f"Invalid JSON body: {e}",
+                    headers=response.headers,
+                ) from e
+
+    async def get_bytes(self, url: str, *, max_bytes: int = 8 * 1024 * 1024) -> tuple:
+        """
+        This function will GET a binary document, such as an attachment, without caching it.
+
+        :param url: The URL to fetch.
+        :param max_bytes: The size above which the body is dropped. Default is 8 MiB.
+        :return: The status code and the body, None if the request failed or the body is too large.
+        :raises aiohttp.ClientError: The request could not be sent.
+        :raises asyncio.TimeoutError: The server did not answer in time.
+        """
+        self.requests += 1
+        async with self.session.get(url) as response:
+            if response.status != 200 or (response.content_length or 0) > max_bytes:
+                return response.status, None
+            body = bytearray()
+            # The announced length can't be trusted, stop reading once past the limit
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body += chunk
+                if len(body) > max_bytes:
+                    return response.status, None
+            return response.status, bytes(body)
+
+    async def close(self) -> None:
+        """
+        This function will close the pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
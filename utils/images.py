@@ -0,0 +1,101 @@
+import io
+
+from PIL import Image
+
+# Larger images are refused before decoding, a small file can hold a huge image
+MAX_PIXELS = 40_000_000
+
+
+def dhash(data: bytes, size: int = 8) -> int:
+    """
+    This function will compute the difference hash of an image.
+
+    The image is shrunk to `size + 1` by `size` pixels in grayscale, and each bit tells whether a
+    pixel is brighter than its right neighbour. Resized, recompressed or slightly edited copies of
+    an image get hashes a few bits apart. It runs in a worker thread, decoding is CPU-bound.
+
+    :param data: The image file.
+    :param size: The side of the hash, which has `size * size` bits. Default is 8, 64 bits.
+    :return: The hash.
+    :raises PIL.UnidentifiedImageError: The data isn't an image Pillow can read.
+    :raises ValueError: The image is larger than `MAX_PIXELS`.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError(f"The image is too large ({image.width}x{image.height})")
+        # JPEG images are decoded at a fraction of their size, which is much faster
+        image.draft("L", (size * 8, size * 8))
+        pixels = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for column in range(offset, offset + size):
+            value = value << 1 | (pixels[column] > pixels[column + 1])
+    return value
+
+
+def hamming(first: int, second: int) -> int:
+    return (first ^ second).bit_count()
+
+
+class BKTree:
+    """
+    An index of hashes answering "which hashes are within some distance of this one".
+
+    Each node has children keyed by their Hamming distance to it. By the triangle inequality, a
+    search for hashes within `d` of `h` only has to visit the children of a node at distance
+    `distance(node, h) - d` to `distance(node, h) + d`, so it skips most of the tree. Items can't
+    be removed, the tree is rebuilt instead.
+    """
+
+    def __init__(self) -> None:
+        # A node is [hash, items, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item) -> None:
+        """
+        This function will add an item under its hash.
+
+        :param value: The hash.
+        :param item: What is returned when the hash matches, several items can share a hash.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """
+        This function will find the items whose hash is within a distance of a hash.
+
+        :param value: The hash.
+        :param max_distance: The maximum Hamming distance.
+        :return: A list of (distance, item) tuples, closest first.
+        """
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,88 @@
+import ast
+import os
+
+import discord
+
+PROFILES = ("full", "minimal")
+
+# Needed by the bot itself whatever the cogs: the guild cache, and prefix commands in guilds and DMs
+BASE_INTENTS = ("guilds", "guild_messages", "dm_messages", "message_content")
+
+
+def read_requirements(path: str) -> tuple:
+    """
+    This function will read the intents and member cache flags a cog declares it needs.
+
+    Cogs declare them as module-level tuples of flag names, `REQUIRED_INTENTS` and
+    `REQUIRED_MEMBER_CACHE`. They are read from the source without importing the cog, since
+    the intents must be known before the bot, and so the cogs, are created.
+
+    :param path: The path of the cog file.
+    :return: A tuple of the set of intent names and the set of member cache flag names.
+    """
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+    requirements = {"REQUIRED_INTENTS": set(), "REQUIRED_MEMBER_CACHE": set()}
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id in requirements:
+                requirements[target.id].update(ast.literal_eval(node.value))
+    return requirements["REQUIRED_INTENTS"], requirements["REQUIRED_MEMBER_CACHE"]
+
+
+def collect_requirements(cogs_path: str) -> tuple:
+    """
+    This function will gather the requirements of every cog the bot loads.
+
+    :param cogs_path: The folder of the cogs.
+    :return: A tuple of the set of intent names and the set of member cache flag names.
+    """
+    intents, member_cache = set(BASE_INTENTS), set()
+    for file in sorted(os.listdir(cogs_path)):
+        if file.endswith(".py"):
+            cog_intents, cog_member_cache = read_requirements(os.path.join(cogs_path, file))
+            intents |= cog_intents
+            member_cache |= cog_member_cache
+    return intents, member_cache
+
+
+def build_profile(profile: str, cogs_path: str) -> tuple:
+    """
+    This function will build the gateway settings of a runtime profile.
+
+    `full` subscribes to every event, caches every member and chunks every guild at startup.
+    `minimal` only subscribes to the intents the cogs declare, caches only the members the cogs
+    declare they need (the bot's own member is always cached) and doesn't chunk guilds at
+    startup, so members are fetched from the API when a command needs them.
+
+    :param profile: The name of the profile, `full` or `minimal`.
+    :param cogs_path: The folder of the cogs.
+    :return: A tuple of the intents, the member cache flags and whether guilds are chunked at startup.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown intents profile {profile!r}, expected one of {PROFILES}")
+    if profile == "full":
+        intents = discord.Intents.all()
+        return intents, discord.MemberCacheFlags.from_intents(intents), True
+    intent_names, member_cache_names = collect_requirements(cogs_path)
+    intents = discord.Intents.none()
+    for name in intent_names:
+        setattr(intents, name, True)
+    member_cache = discord.MemberCacheFlags.none()
+    for name in member_cache_names:
+        setattr(member_cache, name, True)
+    return intents, member_cache, False
+
+
+def missing_intents(intents: discord.Intents, path: str) -> list:
+    """
+    This function will list the intents a cog needs that the running bot doesn't have.
+
+    :param intents: The intents of the bot.
+    :param path: The path of the cog file.
+    :return: The names of the missing intents.
+    """
+    cog_intents, _ = read_requirements(path)
+    return sorted(name for name in cog_intents if not getattr(intents, name))
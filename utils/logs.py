@@ -0,0 +1,147 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+# Loggers whose repetitive records are sampled by default, as {logger name: records per interval}
+DEFAULT_SAMPLING = {"cogs.linkmanager": 30}
+
+
+class LoggingFormatter(logging.Formatter):
+    # Colors
+    black = "\x1b[30m"
+    red = "\x1b[31m"
+    green = "\x1b[32m"
+    yellow = "\x1b[33m"
+    blue = "\x1b[34m"
+    gray = "\x1b[38m"
+    # Styles
+    reset = "\x1b[0m"
+    bold = "\x1b[1m"
+
+    COLORS = {
+        logging.DEBUG: gray + bold,
+        logging.INFO: blue + bold,
+        logging.WARNING: yellow + bold,
+        logging.ERROR: red,
+        logging.CRITICAL: red + bold,
+    }
+
+    def __init__(self) -> None:
+        super().__init__()
+        # One formatter per level, built once instead of for every record
+        self.formatters = {}
+        for level, log_color in self.COLORS.items():
+            format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
+            format = format.replace("(black)", self.black + self.bold)
+            format = format.replace("(reset)", self.reset)
+            format = format.replace("(levelcolor)", log_color)
+            format = format.replace("(green)", self.green + self.bold)
+            self.formatters[level] = logging.Formatter(format, "%Y-%m-%d %H:%M:%S", style="{")
+
+    def format(self, record):
+        formatter = self.formatters.get(record.levelno, self.formatters[logging.INFO])
+        return formatter.format(record)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through at most `rate` records of the same message per `interval` seconds.
+
+    Records are grouped by level and message template, which only works with lazy %-style calls:
+    `logger.info("Deleted %s", domain)` is one message whatever the domain, an f-string is a new one
+    every time. The first record let through after a suppressed streak tells how many were dropped.
+    Errors are never sampled.
+    """
+
+    def __init__(self, rate: int, interval: float = 60.0) -> None:
+        """
+        :param rate: The number of records of a message let through per interval.
+        :param interval: The length of an interval, in seconds. Default is 60.
+        """
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self.suppressed = 0
+        # {(level, template): [interval start, records let through, records suppressed]}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.levelno, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.rate:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                self.suppressed += 1
+                return False
+        if dropped:
+            # Appended as plain text, it holds no placeholder that would clash with the arguments
+            record.msg = f"{record.msg} ({dropped} similar messages suppressed)"
+        return True
+
+
+def setup_logging(
+    filename: str,
+    *,
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    sampling: dict = None,
+    sampling_interval: float = 60.0,
+) -> logging.handlers.QueueListener:
+    """
+    This function will route every log record through a queue to a background thread.
+
+    The root logger only gets a `QueueHandler`, so logging from the event loop costs a queue put,
+    while the console and file writes happen in the listener thread. The file rotates once it
+    reaches `max_bytes`, instead of being truncated on every start. The listener is stopped, and
+    the queue flushed, when the process exits.
+
+    :param filename: The log file.
+    :param level: The level of the root logger. Default is INFO.
+    :param max_bytes: The size at which the log file is rotated. Default is 10 MiB.
+    :param backup_count: The number of rotated files kept. Default is 5.
+    :param sampling: The loggers to sample, as {logger name: records per interval}. Default is `DEFAULT_SAMPLING`.
+    :param sampling_interval: The sampling interval, in seconds. Default is 60.
+    :return: The started listener.
+    """
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(LoggingFormatter())
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename=filename,
+        encoding="utf-8",
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+    )
+    file_handler.setFormatter(
+        logging.Formatter(
+            "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
+        )
+    )
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(records))
+
+    for name, rate in (DEFAULT_SAMPLING if sampling is None else sampling).items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate, sampling_interval))
+    return listener
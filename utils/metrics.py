@@ -0,0 +1,246 @@
+import bisect
+import math
+
+from aiohttp import web
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeValue:
+    __slots__ = ("value", "function")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set_function(self, function) -> None:
+        """
+        This function will make the gauge read its value from a callable when collected, so
+        values the bot already tracks cost nothing until they are scraped.
+
+        :param function: A callable without arguments returning the value.
+        """
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        # One slot per bucket plus +Inf, not cumulative, they are summed up when collected
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        This function will estimate a quantile from the buckets, the way Prometheus'
+        `histogram_quantile` does: linearly within the bucket the quantile falls in.
+
+        :param q: The quantile, between 0 and 1.
+        :return: The estimate, NaN without observations.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the last bucket, the last bound is the best known value
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    @property
+    def average(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+
+class Metric:
+    """
+    A named metric and its values, one per combination of label values.
+
+    A metric without labels can be used directly, e.g. `metric.inc()`. Otherwise, `labels`
+    returns the value of some label values, which hot paths should keep instead of looking it up
+    every time.
+    """
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: tuple, factory) -> None:
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.values = {}
+
+    def labels(self, *values):
+        key = tuple(map(str, values))
+        value = self.values.get(key)
+        if value is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {key}")
+            value = self.values[key] = self.factory()
+        return value
+
+    def __getattr__(self, attribute: str):
+        # inc, set, observe... of the metrics without labels
+        if attribute.startswith("__") or self.labelnames:
+            raise AttributeError(attribute)
+        return getattr(self.labels(), attribute)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    The metrics of the process: counters, gauges and fixed-bucket histograms.
+
+    Recording a value is a few attribute updates, with no lock and no allocation, so metrics can
+    sit on the message path. Everything runs on the event loop, except the chat completions which
+    may be timed from a worker thread, where a lost update is an acceptable price.
+    """
+
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def _register(self, kind: str, name: str, documentation: str, labelnames: tuple, factory) -> Metric:
+        # Registering again returns the existing metric, so cogs can be reloaded
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric(kind, name, documentation, labelnames, factory)
+        elif metric.kind != kind:
+            raise ValueError(f"{name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register("counter", name, documentation, labelnames, CounterValue)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register("gauge", name, documentation, labelnames, GaugeValue)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Metric:
+        buckets = tuple(sorted(buckets))
+        return self._register(
+            "histogram", name, documentation, labelnames, lambda: HistogramValue(buckets)
+        )
+
+    def render(self) -> str:
+        """
+        This function will render every metric in the Prometheus text exposition format.
+
+        :return: The metrics, as text.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in list(metric.values.items()):
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (math.inf,), value.counts):
+                        cumulative += count
+                        labels = _format_labels(metric.labelnames, key, f'le="{_format_value(bound)}"')
+                        lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(metric.labelnames, key)
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(value.sum)}")
+                    lines.append(f"{metric.name}_count{labels} {value.count}")
+                    continue
+                try:
+                    sample = value.get() if metric.kind == "gauge" else value.value
+                except Exception:
+                    # A gauge reading from something that is gone, e.g. an unloaded cog
+                    continue
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(sample)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """
+    Serves the registry on `/metrics`, for a local Prometheus to scrape.
+    """
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9108) -> None:
+        """
+        :param registry: The registry to serve.
+        :param host: The address to listen on. Default is 127.0.0.1, local scrapers only.
+        :param port: The port to listen on. Default is 9108.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
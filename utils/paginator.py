@@ -0,0 +1,97 @@
+import abc
+
+import discord
+from discord.ext.commands import Context
+
+
+class Paginator(discord.ui.View, metaclass=abc.ABCMeta):
+    """
+    A view flipping through embeds that are only built when their page is shown.
+
+    Subclasses implement `get_page`, which returns the embed of a page and whether a next page exists.
+    """
+
+    def __init__(self, author_id: int, *, timeout: float = 180) -> None:
+        """
+        :param author_id: The ID of the only user allowed to use the buttons.
+        :param timeout: Seconds of inactivity before the buttons are disabled. Default is 180.
+        """
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.index = 0
+        self.message = None
+
+    @abc.abstractmethod
+    async def get_page(self, index: int) -> tuple:
+        """
+        This function will build a page.
+
+        :param index: The index of the page, starting at 0.
+        :return: The embed of the page and whether there is a page after it.
+        """
+
+    async def start(self, context: Context) -> None:
+        """
+        This function will send the first page, with buttons only if there is more than one page.
+
+        :param context: The context to reply to.
+        """
+        embed, has_next = await self.get_page(0)
+        self._update_buttons(has_next)
+        if has_next:
+            self.message = await context.send(embed=embed, view=self)
+        else:
+            self.stop()
+            await context.send(embed=embed)
+
+    def _update_buttons(self, has_next: bool) -> None:
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = not has_next
+
+    async def _show(self, interaction: discord.Interaction, index: int) -> None:
+        embed, has_next = await self.get_page(index)
+        self.index = index
+        self._update_buttons(has_next)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def on_timeout(self) -> None:
+        self.previous_page.disabled = True
+        self.next_page.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.blurple)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self._show(interaction, max(0, self.index - 1))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.blurple)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self._show(interaction, self.index + 1)
+
+
+class StaticPaginator(Paginator):
+    """
+    A paginator over embeds that are already built.
+    """
+
+    def __init__(self, pages: list, author_id: int, *, timeout: float = 180) -> None:
+        """
+        :param pages: The embeds of the pages, at least one.
+        :param author_id: The ID of the only user allowed to use the buttons.
+        :param timeout: Seconds of inactivity before the buttons are disabled. Default is 180.
+        """
+        super().__init__(author_id, timeout=timeout)
+        self.pages = pages
+
+    async def get_page(self, index: int) -> tuple:
+        return self.pages[index], index + 1 < len(self.pages)
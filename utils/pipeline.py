@@ -0,0 +1,160 @@
+import bisect
+import time
+from functools import cached_property
+
+import discord
+
+from utils.metrics import REGISTRY
+from utils.purge import URL_REGEX
+
+# Stage orders, a message goes through the stages from the lowest order to the highest
+CHEAP_FILTERS = 0
+LINK_SCAN = 100
+COMMANDS = 150
+SPAM_DETECTION = 200
+LLM = 300
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "bot_message_stage_seconds", "Time spent by messages in each stage of the pipeline.", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "bot_message_stage_errors_total", "Exceptions raised by the stages of the pipeline.", ("stage",)
+)
+MESSAGES = REGISTRY.counter(
+    "bot_messages_total", "Messages processed, by the verdict of the stage that stopped them.", ("verdict",)
+)
+
+
+class MessageContext:
+    """
+    A message going through the pipeline, with what the stages share parsed once.
+    """
+
+    def __init__(self, message: discord.Message) -> None:
+        self.message = message
+        self.content = message.content or ""
+        self.author_id = message.author.id
+        self.guild_id = message.guild.id if message.guild is not None else None
+        self.channel_id = message.channel.id
+        self.is_thread = isinstance(message.channel, discord.Thread)
+        self.verdict = None
+        self.stopped_by = None
+
+    @cached_property
+    def normalized(self) -> str:
+        return self.content.casefold()
+
+    @cached_property
+    def urls(self) -> list:
+        return URL_REGEX.findall(self.content)
+
+    def stop(self, verdict: str) -> None:
+        """
+        This function will stop the message from going through the next stages.
+
+        :param verdict: Why the message was stopped, e.g. `deleted` or `command`.
+        """
+        self.verdict = verdict
+
+
+class StageStats:
+    __slots__ = ("calls", "total", "max", "stops", "errors")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.stops = 0
+        self.errors = 0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class Stage:
+    __slots__ = ("name", "order", "callback", "stats", "histogram")
+
+    def __init__(self, name: str, order: int, callback) -> None:
+        self.name = name
+        self.order = order
+        self.callback = callback
+        self.stats = StageStats()
+        # Looked up once, not for every message
+        self.histogram = STAGE_SECONDS.labels(name)
+
+
+class MessagePipeline:
+    """
+    Runs every message through ordered stages instead of independent `on_message` listeners.
+
+    Stages are coroutine functions taking a `MessageContext`, registered by the bot and the cogs
+    with an order: cheap filters first, then the link scan, commands, spam detection and finally
+    the LLM. A stage calling `context.stop` short-circuits the remaining stages, so a deleted scam
+    message never reaches the costly ones. A failing stage is logged and the next stages still run.
+    Each stage records its calls, wall time and stops.
+    """
+
+    def __init__(self, logger) -> None:
+        """
+        :param logger: The logger the stage errors are reported to.
+        """
+        self.logger = logger
+        self.stages = []
+        self.processed = 0
+        self.verdicts = {}
+
+    def add_stage(self, name: str, callback, *, order: int) -> None:
+        """
+        This function will add a stage, replacing the stage of the same name if there is one.
+
+        :param name: The name of the stage.
+        :param callback: A coroutine function taking the message context.
+        :param order: The position of the stage, stages with the same order run in insertion order.
+        """
+        self.remove_stage(name)
+        stage = Stage(name, order, callback)
+        orders = [existing.order for existing in self.stages]
+        self.stages.insert(bisect.bisect_right(orders, order), stage)
+
+    def remove_stage(self, name: str) -> None:
+        self.stages = [stage for stage in self.stages if stage.name != name]
+
+    async def process(self, message: discord.Message) -> MessageContext:
+        """
+        This function will run a message through the stages.
+
+        :param message: The message.
+        :return: The context of the message, with the verdict of the stage that stopped it, if any.
+        """
+        context = MessageContext(message)
+        self.processed += 1
+        # Iterate over a snapshot, cogs may be unloaded while a message is in flight
+        for stage in tuple(self.stages):
+            stats = stage.stats
+            started = time.perf_counter()
+            try:
+                await stage.callback(context)
+            except Exception:
+                stats.errors += 1
+                STAGE_ERRORS.labels(stage.name).inc()
+                self.logger.exception("Message pipeline stage %s failed", stage.name)
+            elapsed = time.perf_counter() - started
+            stats.calls += 1
+            stats.total += elapsed
+            stage.histogram.observe(elapsed)
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if context.verdict is not None:
+                stats.stops += 1
+                context.stopped_by = stage.name
+                self.verdicts[context.verdict] = self.verdicts.get(context.verdict, 0) + 1
+                break
+        MESSAGES.labels(context.verdict or "passed").inc()
+        return context
+
+    def report(self) -> list:
+        """
+        :return: A list of (stage name, order, stage stats) tuples, in stage order.
+        """
+        return [(stage.name, stage.order, stage.stats) for stage in self.stages]
@@ -0,0 +1,208 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+# Containers `deep_size` walks into, anything else is counted with its own size only
+CONTAINERS = (dict, list, tuple, set, frozenset, collections.deque)
+
+# Where the event loop waits for I/O, a sample stopped there is an idle loop
+IDLE_FUNCTIONS = {("selectors.py", "select"), ("selectors.py", "_select")}
+
+PREFIXES = sorted({os.getcwd(), sys.prefix, sys.base_prefix, *sys.path[1:]}, key=len, reverse=True)
+
+
+def short_path(path: str) -> str:
+    for prefix in PREFIXES:
+        if prefix and path.startswith(prefix + os.sep):
+            return path[len(prefix) + 1 :]
+    return path
+
+
+def deep_size(obj, limit: int = 1_000_000) -> tuple:
+    """
+    This function will measure the memory held by a container and everything in it.
+
+    Only the builtin containers are walked into, so a structure referencing the bot or a Discord
+    object isn't accounted for the whole cache. Objects shared between entries are counted once.
+
+    :param obj: The structure to measure.
+    :param limit: The maximum number of objects visited. Default is 1,000,000.
+    :return: A tuple of the size in bytes, the number of objects visited and whether the limit was reached.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        if len(seen) >= limit:
+            return size, len(seen), True
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, CONTAINERS):
+            stack.extend(current)
+    return size, len(seen), False
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the event loop at a fixed interval, to tell where its time goes.
+
+    Unlike cProfile, the profiled code isn't slowed down: the cost is one stack walk per interval.
+    On the main thread, samples are taken by a `SIGALRM` interval timer, whose handler runs
+    between two bytecodes of the loop itself. Elsewhere (or without `setitimer`), a background
+    thread samples the loop's thread instead, but it can only run when the loop releases the GIL,
+    so steps shorter than the switch interval are under-counted there. The report is in the
+    collapsed stack format flame graph tools read, and tells how often the loop was idle.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """
+        :param interval: The time between two samples, in seconds. Default is 5ms.
+        """
+        self.interval = interval
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self.method = None
+        self._previous_handler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        This function will start sampling the thread calling it.
+        """
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            self.method = "signal"
+            self._previous_handler = signal.signal(signal.SIGALRM, self._on_signal)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+            return
+        self.method = "thread"
+        self._thread = threading.Thread(
+            target=self._run, args=(threading.get_ident(),), name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.method == "signal":
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler)
+        elif self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+    def _on_signal(self, signum: int, frame) -> None:
+        self._record(frame)
+
+    def _run(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        self.samples += 1
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def report(self, limit: int = 40) -> str:
+        """
+        This function will format the samples.
+
+        :param limit: The number of functions listed. Default is 40.
+        :return: The report: the busiest functions, then every stack in the collapsed format.
+        """
+        idle = 0
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            filename, name, _ = stack[-1]
+            if (os.path.basename(filename), name) in IDLE_FUNCTIONS:
+                idle += count
+                continue
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+        busy = self.samples - idle
+
+        def describe(function: tuple) -> str:
+            filename, name, line = function
+            return f"{name} ({short_path(filename)}:{line})"
+
+        lines = [
+            f"{self.samples} samples every {self.interval * 1000:g}ms ({self.method}), "
+            f"event loop busy in {busy / self.samples if self.samples else 0:.1%} of them",
+            "",
+            f"{'own':>7} {'total':>7}  function (% of the busy samples)",
+        ]
+        for function, _ in inclusive.most_common(limit):
+            lines.append(
+                f"{own[function] / busy if busy else 0:>7.1%} {inclusive[function] / busy if busy else 0:>7.1%}  {describe(function)}"
+            )
+        lines += ["", "Collapsed stacks:"]
+        for stack, count in self.stacks.most_common():
+            lines.append(f"{';'.join(describe(function) for function in stack)} {count}")
+        return "\n".join(lines)
+
+
+def cprofile_report(profiler: cProfile.Profile, limit: int = 60) -> str:
+    """
+    This function will format the statistics of a cProfile session.
+
+    :param profiler: The profiler, disabled.
+    :param limit: The number of functions listed per ordering. Default is 60.
+    :return: The functions with the most cumulative time, then the most own time.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+    return output.getvalue()
+
+
+def snapshot_report(snapshot: tracemalloc.Snapshot, previous: tracemalloc.Snapshot = None, limit: int = 40) -> str:
+    """
+    This function will format a tracemalloc snapshot, and what changed since the previous one.
+
+    :param snapshot: The snapshot.
+    :param previous: The previous snapshot. Default is None, no diff.
+    :param limit: The number of lines listed per section. Default is 40.
+    :return: The report.
+    """
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+    snapshot = snapshot.filter_traces(filters)
+    statistics = snapshot.statistics("lineno")
+    total = sum(statistic.size for statistic in statistics)
+    lines = [
+        f"Snapshot taken at {time.strftime('%Y-%m-%d %H:%M:%S')}: "
+        f"{total / 1024 / 1024:.1f} MiB traced in {sum(statistic.count for statistic in statistics)} blocks",
+        "",
+        f"Top {limit} lines:",
+    ]
+    lines += [str(statistic) for statistic in statistics[:limit]]
+    if previous is not None:
+        differences = snapshot.compare_to(previous.filter_traces(filters), "lineno")
+        growth = sum(difference.size_diff for difference in differences)
+        lines += ["", f"Since the previous snapshot: {growth / 1024:+.1f} KiB", f"Top {limit} differences:"]
+        lines += [str(difference) for difference in differences[:limit]]
+    return "\n".join(lines)
@@ -0,0 +1,289 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+URL_REGEX = re.compile(r"https?://\S+|www\.\S+")
+
+# Discord refuses to bulk delete messages older than 14 days, keep a margin for clock skew
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_DELETE_SIZE = 100
+
+
+class PurgeFilter:
+    """
+    The conditions a message must meet to be purged. Every condition that is set must match.
+    """
+
+    def __init__(
+        self,
+        *,
+        authors: set = None,
+        pattern: re.Pattern = None,
+        has_link: bool = False,
+        forbidden_matcher=None,
+        exclude: set = None,
+    ) -> None:
+        """
+        :param authors: The IDs of the authors whose messages should be purged.
+        :param pattern: A compiled regex the content must match.
+        :param has_link: Whether only messages containing a link should be purged.
+        :param forbidden_matcher: A callable returning the forbidden domain linked in a content, or None.
+        :param exclude: The IDs of messages that must never be purged.
+        """
+        self.authors = authors or set()
+        self.pattern = pattern
+        self.has_link = has_link
+        self.forbidden_matcher = forbidden_matcher
+        self.exclude = exclude or set()
+
+    def is_empty(self) -> bool:
+        return not (
+            self.authors or self.pattern or self.has_link or self.forbidden_matcher
+        )
+
+    def matches(self, message: discord.Message) -> bool:
+        # Cheapest checks first
+        if message.id in self.exclude:
+            return False
+        if self.authors and message.author.id not in self.authors:
+            return False
+        if self.has_link and URL_REGEX.search(message.content) is None:
+            return False
+        if self.pattern is not None and self.pattern.search(message.content) is None:
+            return False
+        if (
+            self.forbidden_matcher is not None
+            and self.forbidden_matcher(message.content) is None
+        ):
+            return False
+        return True
+
+
+class PurgeEngine:
+    """
+    Scans the history of several channels with bounded concurrency and deletes the matching messages.
+
+    Recent matches are deleted with `delete_messages` in chunks of up to 100 messages; matches older
+    than 14 days, which Discord can't bulk delete, are deleted one by one.
+    """
+
+    def __init__(
+        self,
+        channels: list,
+        message_filter: PurgeFilter,
+        *,
+        after: datetime = None,
+        before: datetime = None,
+        scan_limit: int = None,
+        concurrency: int = 4,
+    ) -> None:
+        """
+        :param channels: The channels to scan.
+        :param message_filter: The filter deciding which messages are deleted.
+        :param after: Only messages sent after this time are scanned.
+        :param before: Only messages sent before this time are scanned.
+        :param scan_limit: The maximum number of messages scanned per channel. Default is None, no limit.
+        :param concurrency: The number of channels scanned at the same time. Default is 4.
+        """
+        self.channels = channels
+        self.filter = message_filter
+        self.after = after
+        self.before = before
+        self.scan_limit = scan_limit
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.channels_done = 0
+        self.started = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def throughput(self) -> tuple:
+        """
+        :return: The scanned and deleted messages per second.
+        """
+        elapsed = self.elapsed or 1.0
+        return self.scanned / elapsed, self.deleted / elapsed
+
+    async def run(self) -> None:
+        self.started = time.monotonic()
+        await asyncio.gather(*(self._run_channel(channel) for channel in self.channels))
+
+    async def _run_channel(self, channel: discord.TextChannel) -> None:
+        async with self.semaphore:
+            try:
+                await self.purge_channel(channel)
+            except discord.HTTPException:
+                # Missing access to the channel history, skip it
+                self.failed += 1
+            self.channels_done += 1
+
+    async def purge_channel(self, channel: discord.TextChannel) -> None:
+        cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        batch = []
+        async for message in channel.history(
+            limit=self.scan_limit, after=self.after, before=self.before, oldest_first=False
+        ):
+            self.scanned += 1
+            if not self.filter.matches(message):
+                continue
+            self.matched += 1
+            if message.created_at > cutoff:
+                batch.append(message)
+                if len(batch) >= BULK_DELETE_SIZE:
+                    await self._bulk_delete(channel, batch)
+                    batch = []
+            else:
+                await self._single_delete(message)
+        if batch:
+            await self._bulk_delete(channel, batch)
+
+    async def _bulk_delete(self, channel: discord.TextChannel, batch: list) -> None:
+        try:
+            await channel.delete_messages(batch)
+            self.deleted += len(batch)
+        except discord.NotFound:
+            # Some were already deleted, fall back to deleting them one by one
+            for message in batch:
+                await self._single_delete(message)
+        except discord.HTTPException:
+            self.failed += len(batch)
+
+    async def _single_delete(self, message: discord.Message) -> None:
+        try:
+            await message.delete()
+            self.deleted += 1
+        except discord.NotFound:
+            pass
+        except discord.HTTPException:
+            self.failed += 1
+
+
+class BackfillEngine(PurgeEngine):
+    """
+    Scans the whole history of channels for messages linking forbidden domains, resumably.
+
+    Channels are scanned from the newest message back, with the batching of `PurgeEngine`. Every
+    `checkpoint_every` messages, the pending deletions are flushed and the oldest message scanned
+    is stored in the database, so an interrupted backfill resumes where it stopped instead of
+    scanning again. A checkpoint is only reused by a run looking for the same domains: a channel
+    is skipped when it was completed over at least the requested range, and a run going further
+    back than a completed one resumes from its oldest message. A dry run deletes nothing and
+    neither reads nor stores checkpoints.
+    """
+
+    def __init__(
+        self,
+        channels: list,
+        matcher,
+        *,
+        database,
+        server_id: int,
+        scope: str,
+        domains: str = "",
+        checkpoints: dict = None,
+        after: datetime = None,
+        dry_run: bool = False,
+        concurrency: int = 4,
+        checkpoint_every: int = 1000,
+        max_hits: int = 5000,
+    ) -> None:
+        """
+        :param channels: The channels to scan.
+        :param matcher: A callable returning the forbidden domain linked in a content, or None.
+        :param database: The database manager storing the checkpoints.
+        :param server_id: The ID of the server the channels belong to.
+        :param scope: The domain looked for, or '*' for every forbidden domain, which keys the checkpoints.
+        :param domains: The key of the forbidden domains looked for, a checkpoint stored for other domains is ignored. Default is "".
+        :param checkpoints: The checkpoints of a previous run, from `get_backfill_checkpoints`. Default is None.
+        :param after: Only messages sent after this time are scanned. Default is None, the whole history.
+        :param dry_run: Whether to only list the matches. Default is False.
+        :param concurrency: The number of channels scanned at the same time. Default is 4.
+        :param checkpoint_every: The number of messages scanned in a channel between two checkpoints. Default is 1000.
+        :param max_hits: The number of matches kept for the report. Default is 5000.
+        """
+        super().__init__(
+            channels, PurgeFilter(forbidden_matcher=matcher), after=after, concurrency=concurrency
+        )
+        self.matcher = matcher
+        self.database = database
+        self.server_id = server_id
+        self.scope = scope
+        self.domains = domains
+        self.after_id = discord.utils.time_snowflake(after) if after is not None else None
+        self.checkpoints = {} if dry_run else (checkpoints or {})
+        self.dry_run = dry_run
+        self.checkpoint_every = checkpoint_every
+        self.max_hits = max_hits
+        self.skipped = 0
+        # (channel, message ID, author, domain, sent at) of the matches, up to `max_hits`
+        self.hits = []
+
+    async def _save(self, channel, before_id: int, scanned: int, matched: int, completed: bool) -> None:
+        if not self.dry_run:
+            await self.database.save_backfill_checkpoint(
+                self.server_id,
+                self.scope,
+                channel.id,
+                before_id,
+                scanned,
+                matched,
+                completed,
+                self.after_id,
+                self.domains,
+            )
+
+    async def purge_channel(self, channel: discord.TextChannel) -> None:
+        before_id, scanned, matched = None, 0, 0
+        checkpoint = self.checkpoints.get(channel.id)
+        if checkpoint is not None and checkpoint[5] == self.domains:
+            completed, after_id = checkpoint[3], checkpoint[4]
+            if completed and (after_id is None or (self.after_id is not None and after_id <= self.after_id)):
+                self.skipped += 1
+                return
+            # Every message newer than the oldest one scanned was checked for the same domains
+            before_id, scanned, matched = checkpoint[:3]
+        cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        batch = []
+        unsaved = 0
+        async for message in channel.history(
+            limit=None,
+            after=self.after,
+            before=discord.Object(before_id) if before_id else None,
+            oldest_first=False,
+        ):
+            self.scanned += 1
+            scanned += 1
+            unsaved += 1
+            before_id = message.id
+            domain = self.matcher(message.content) if message.content else None
+            if domain is not None and message.id not in self.filter.exclude:
+                self.matched += 1
+                matched += 1
+                if len(self.hits) < self.max_hits:
+                    self.hits.append((channel, message.id, message.author, domain, message.created_at))
+                if not self.dry_run:
+                    if message.created_at > cutoff:
+                        batch.append(message)
+                        if len(batch) >= BULK_DELETE_SIZE:
+                            await self._bulk_delete(channel, batch)
+                            batch = []
+                    else:
+                        await self._single_delete(message)
+            if unsaved >= self.checkpoint_every:
+                # Deleted before the checkpoint moves past them, or a resumed run would miss them
+                if batch:
+                    await self._bulk_delete(channel, batch)
+                    batch = []
+                await self._save(channel, before_id, scanned, matched, False)
+                unsaved = 0
+        if batch:
+            await self._bulk_delete(channel, batch)
+        await self._save(channel, before_id, scanned, matched, True)
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from utils.files import AsyncGzipWriter
+from utils.purge import URL_REGEX
+
+RECORDINGS_ROOT = os.path.join(tempfile.gettempdir(), "mod-radar-recordings")
+
+# The dispatches the cogs listen to, recorded with the raw payload the gateway sent
+RECORDED_EVENTS = (
+    "MESSAGE_CREATE",
+    "MESSAGE_UPDATE",
+    "MESSAGE_DELETE",
+    "MESSAGE_DELETE_BULK",
+    "GUILD_MEMBER_ADD",
+    "GUILD_MEMBER_UPDATE",
+    "GUILD_MEMBER_REMOVE",
+    "GUILD_BAN_ADD",
+    "GUILD_BAN_REMOVE",
+    "THREAD_CREATE",
+)
+# Not a gateway event: the guilds as they were cached when the recording started, so a replay
+# resolves the channels, threads and roles the events refer to
+GUILD_SNAPSHOT = "GUILD_SNAPSHOT"
+
+# Keys anonymized when they hold snowflakes, besides `id` and any `*_id`
+SNOWFLAKE_LIST_KEYS = {"ids", "roles", "mention_roles"}
+NAME_KEYS = {"username", "global_name", "nick", "name"}
+TEXT_KEYS = {"content", "topic"}
+URL_KEYS = {"url", "proxy_url"}
+# Images and free text nothing in the bot reads
+CLEARED_KEYS = {"avatar", "banner", "icon", "splash", "avatar_decoration_data", "email"}
+EMPTIED_KEYS = {"embeds", "components", "sticker_items"}
+
+SNOWFLAKE_REGEX = re.compile(r"^\d+$")
+WORD_REGEX = re.compile(r"\w")
+
+
+class Anonymizer:
+    """
+    Replaces what identifies people in gateway payloads, consistently within a recording.
+
+    Snowflakes are hashed with a random key that is never written, keeping their timestamp bits so
+    creation dates and message ordering survive: the same user is the same ID in every event, but
+    the real ID can't be recovered. Names become pseudonyms, avatars are dropped and message texts
+    keep their shape and links but not their words. Links keep their domain, which the link scanner
+    matches, and lose their path.
+    """
+
+    def __init__(self, key: bytes = None) -> None:
+        """
+        :param key: The key of the hashes. Default is None, a random one.
+        """
+        self.key = key or secrets.token_bytes(16)
+        self.names = {}
+
+    def _digest(self, value: str) -> bytes:
+        return hmac.new(self.key, value.encode("utf-8"), hashlib.sha256).digest()
+
+    def snowflake(self, value):
+        if not isinstance(value, str) or not SNOWFLAKE_REGEX.match(value):
+            return value
+        snowflake = int(value)
+        # The 42 timestamp bits are kept, the 22 worker, process and increment bits are hashed
+        low = int.from_bytes(self._digest(value)[:4], "big") & 0x3FFFFF
+        return str((snowflake >> 22 << 22) | low)
+
+    def name(self, value):
+        if not isinstance(value, str):
+            return value
+        pseudonym = self.names.get(value)
+        if pseudonym is None:
+            pseudonym = self.names[value] = f"name-{len(self.names) + 1}"
+        return pseudonym
+
+    def url(self, value: str) -> str:
+        parts = urlsplit(value if "://" in value else f"http://{value}")
+        path = os.path.splitext(parts.path)[1]
+        if parts.path.strip("/"):
+            path = "/" + self._digest(parts.path).hex()[:16] + path
+        return f"{parts.scheme}://{parts.netloc}{path}"
+
+    def text(self, value):
+        if not isinstance(value, str):
+            return value
+        pieces = []
+        position = 0
+        for match in URL_REGEX.finditer(value):
+            pieces.append(WORD_REGEX.sub("x", value[position : match.start()]))
+            pieces.append(self.url(match.group()))
+            position = match.end()
+        pieces.append(WORD_REGEX.sub("x", value[position:]))
+        return "".join(pieces)
+
+    def scrub(self, value, key: str = None):
+        """
+        This function will anonymize a payload, returning a copy and leaving the original untouched.
+
+        :param value: The payload, or a value in it.
+        :param key: The key of the value in its parent object. Default is None.
+        :return: The anonymized copy.
+        """
+        if isinstance(value, dict):
+            return {name: self.scrub(item, name) for name, item in value.items()}
+        if isinstance(value, list):
+            if key in SNOWFLAKE_LIST_KEYS:
+                # Role IDs in members, role objects in guilds
+                return [self.snowflake(item) if isinstance(item, str) else self.scrub(item) for item in value]
+            if key in EMPTIED_KEYS:
+                return []
+            return [self.scrub(item) for item in value]
+        if key is None or value is None:
+            return value
+        if key == "id" or key.endswith("_id"):
+            return self.snowflake(value)
+        if key in CLEARED_KEYS:
+            return None
+        if key in NAME_KEYS:
+            return self.name(value)
+        if key in TEXT_KEYS:
+            return self.text(value)
+        if key in URL_KEYS and isinstance(value, str):
+            return self.url(value)
+        if key == "filename" and isinstance(value, str):
+            return self.name(value) + os.path.splitext(value)[1]
+        return value
+
+
+def guild_snapshot(guild) -> dict:
+    """
+    This function will describe a cached guild with the fields a replay needs to rebuild it.
+
+    :param guild: The guild.
+    :return: The guild, in the shape of a gateway guild payload.
+    """
+    return {
+        "id": str(guild.id),
+        "name": guild.name,
+        "owner_id": str(guild.owner_id) if guild.owner_id else None,
+        "member_count": guild.member_count,
+        "roles": [
+            {
+                "id": str(role.id),
+                "name": role.name,
+                "permissions": str(role.permissions.value),
+                "position": role.position,
+                "color": 0,
+                "hoist": False,
+                "managed": role.managed,
+                "mentionable": False,
+            }
+            for role in guild.roles
+        ],
+        "channels": [
+            {
+                "id": str(channel.id),
+                "type": channel.type.value,
+                "name": channel.name,
+                "position": channel.position,
+                "parent_id": str(channel.category_id) if channel.category_id else None,
+            }
+            for channel in guild.channels
+        ],
+        "threads": [
+            {
+                "id": str(thread.id),
+                "type": thread.type.value,
+                "name": thread.name,
+                "parent_id": str(thread.parent_id),
+                "owner_id": str(thread.owner_id) if thread.owner_id else None,
+                "thread_metadata": {
+                    "archived": thread.archived,
+                    "auto_archive_duration": thread.auto_archive_duration,
+                    "archive_timestamp": thread.archive_timestamp.isoformat(),
+                    "locked": thread.locked,
+                },
+            }
+            for thread in guild.threads
+        ],
+    }
+
+
+class GatewayRecorder:
+    """
+    Records the gateway events the cogs listen to in a gzip-compressed NDJSON file, for replays.
+
+    The parsers of the connection state are wrapped, so each event is captured as Discord sent it,
+    before discord.py builds its objects. A line is `{"t": seconds since the start, "op": event,
+    "d": payload}`, and the first lines snapshot the cached guilds. Capturing an event only
+    encodes it into a buffer, which a task hands to the thread-offloaded gzip writer every
+    `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        anonymize: bool = False,
+        events: tuple = RECORDED_EVENTS,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """
+        :param path: The file to write, conventionally ending in `.ndjson.gz`.
+        :param anonymize: Whether to anonymize the payloads with an `Anonymizer`. Default is False.
+        :param events: The gateway events to record. Default is `RECORDED_EVENTS`.
+        :param flush_interval: The time between two writes of the buffered events, in seconds. Default is 1.
+        """
+        self.path = path
+        self.anonymizer = Anonymizer() if anonymize else None
+        self.events = events
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.started = None
+        self._parsers = None
+        self._originals = {}
+        self._buffer = []
+        self._writer = None
+        self._task = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _encode(self, event: str, data) -> str:
+        if self.anonymizer is not None:
+            data = self.anonymizer.scrub(data)
+        return json.dumps(
+            {"t": round(time.monotonic() - self.started, 4), "op": event, "d": data},
+            separators=(",", ":"),
+        ) + "\n"
+
+    def _wrap(self, event: str, parser):
+        def record(data) -> None:
+            try:
+                self._buffer.append(self._encode(event, data))
+                self.recorded += 1
+            except Exception:
+                # A payload that can't be recorded must not keep the bot from handling it
+                pass
+            return parser(data)
+
+        return record
+
+    async def start(self, bot) -> None:
+        """
+        This function will snapshot the guilds of the bot and start recording its events.
+
+        :param bot: The bot.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._writer = await AsyncGzipWriter(self.path).open()
+        self.started = time.monotonic()
+        await self._writer.write_lines([self._encode(GUILD_SNAPSHOT, guild_snapshot(guild)) for guild in bot.guilds])
+        # The gateway looks the parsers up in this same dict, replacing them in place is enough
+        self._parsers = bot._connection.parsers
+        for event in self.events:
+            parser = self._parsers.get(event)
+            if parser is not None:
+                self._originals[event] = parser
+                self._parsers[event] = self._wrap(event, parser)
+        self._task = asyncio.create_task(self._flush_loop(), name="gateway-recorder")
+
+    async def _flush_loop(self) -> None:
+        # Never cancelled in the middle of a write, `stop` lets it write the last events and return
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            lines, self._buffer = self._buffer, []
+            await self._writer.write_lines(lines)
+
+    async def stop(self) -> int:
+        """
+        This function will stop recording and close the file.
+
+        :return: The number of events recorded.
+        """
+        for event, parser in self._originals.items():
+            self._parsers[event] = parser
+        self._originals = {}
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+        return self.recorded
@@ -0,0 +1,172 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+import discord
+from discord.ext import commands
+
+from utils.metrics import REGISTRY
+
+LOOP_LAG = REGISTRY.histogram(
+    "bot_loop_lag_seconds", "How late the event loop ran the watchdog's ticks."
+)
+LOOP_STALLS = REGISTRY.counter(
+    "bot_loop_stalls_total", "Times the event loop was blocked past the threshold.", ("cog", "command")
+)
+
+# The code of the bot, as opposed to the libraries, where the blocking line is looked for
+PROJECT_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class Stall:
+    __slots__ = ("started_at", "duration", "task", "cog", "command", "location", "stack")
+
+    def __init__(self, task: str, cog: str, command: str, location: str, stack: str) -> None:
+        self.started_at = None
+        self.duration = None
+        self.task = task
+        self.cog = cog
+        self.command = command
+        self.location = location
+        self.stack = stack
+
+    def describe(self) -> str:
+        duration = f"{self.duration:.2f}s" if self.duration is not None else "still blocked"
+        return (
+            f"Event loop blocked for {duration} in {self.location or 'unknown code'} "
+            f"(cog: {self.cog or 'none'}, command: {self.command or 'none'}, task: {self.task or 'none'})"
+        )
+
+
+def attribute(frame) -> tuple:
+    """
+    This function will find who is running a stack: the innermost cog, the command being executed
+    and the innermost line of the bot's own code.
+
+    :param frame: The innermost frame of the stack.
+    :return: A tuple of the cog name, the command name and the location, each None if not found.
+    """
+    cog = command = location = None
+    while frame is not None:
+        if location is None and frame.f_code.co_filename.startswith(PROJECT_PATH):
+            location = (
+                f"{os.path.relpath(frame.f_code.co_filename, PROJECT_PATH)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        if cog is None or command is None:
+            frame_locals = frame.f_locals
+            if cog is None and isinstance(frame_locals.get("self"), commands.Cog):
+                cog = frame_locals["self"].qualified_name
+            if command is None:
+                for name in ("context", "ctx", "interaction"):
+                    value = frame_locals.get(name)
+                    if isinstance(value, (commands.Context, discord.Interaction)) and value.command:
+                        command = value.command.qualified_name
+                        break
+        frame = frame.f_back
+    return cog, command, location
+
+
+class LoopWatchdog:
+    """
+    Measures the scheduling lag of the event loop and reports what blocks it.
+
+    A task ticks every `interval` and records how late it woke up. A thread checks that the ticks
+    keep coming: once the loop has been silent for `threshold`, the loop is blocked, and the thread
+    captures its stack right then, while the offending code is still running, so the report names
+    the blocking line, the cog and the command. The stall is logged with its duration once the
+    loop runs again.
+    """
+
+    def __init__(self, logger, *, interval: float = 0.1, threshold: float = 0.5, max_stalls: int = 20) -> None:
+        """
+        :param logger: The logger the stalls are reported to.
+        :param interval: The time between two ticks, in seconds. Default is 0.1.
+        :param threshold: The lag from which the loop is considered blocked, in seconds. Default is 0.5.
+        :param max_stalls: The number of recent stalls kept. Default is 20.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = collections.deque(maxlen=max_stalls)
+        self.max_lag = 0.0
+        self._last_tick = time.monotonic()
+        self._pending = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, *, slow_callback_duration: float = None) -> None:
+        """
+        This function will start watching the running loop.
+
+        :param slow_callback_duration: When set, asyncio's debug mode is enabled and logs every callback running longer, in seconds. It slows the loop down. Default is None.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if slow_callback_duration is not None:
+            self._loop.slow_callback_duration = slow_callback_duration
+            self._loop.set_debug(True)
+        self._last_tick = time.monotonic()
+        self._task = self._loop.create_task(self._tick(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _tick(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_tick = now
+            lag = max(now - before - self.interval, 0.0)
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _report(self, lag: float) -> None:
+        stall, self._pending = self._pending, None
+        if stall is None:
+            # Too short for the thread to see it, only its length is known
+            stall = Stall(None, None, None, None, None)
+        stall.duration = lag
+        stall.started_at = time.time() - lag
+        self.stalls.append(stall)
+        LOOP_STALLS.labels(stall.cog or "none", stall.command or "none").inc()
+        if stall.stack:
+            self.logger.warning("%s\n%s", stall.describe(), stall.stack)
+        else:
+            self.logger.warning("%s", stall.describe())
+
+    def _watch(self) -> None:
+        reported_tick = None
+        while not self._stop.wait(self.interval / 2):
+            last_tick = self._last_tick
+            if last_tick == reported_tick or time.monotonic() - last_tick < self.interval + self.threshold:
+                continue
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            cog, command, location = attribute(frame)
+            self._pending = Stall(
+                task.get_name() if task is not None else None,
+                cog,
+                command,
+                location,
+                "".join(traceback.format_stack(frame)),
+            )
+            del frame